@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# pylint: disable=C0103
+'''
+    __  __ _____  _      ______ _____ _______
+   |  \/  |  __ \| |    |  ____|_   _|__   __|
+   | \  / | |  | | |    | |__    | |    | |
+   | |\/| | |  | | |    |  __|   | |    | |
+   | |  | | |__| | |____| |     _| |_   | |
+   |_|  |_|_____/|______|_|    |_____|  |_|
+
+ music encodind using minimum description length
+
+
+Compute the cross-validated description length of all the models (leave-one-out, or k-fold)
+and compare its time with fitting the models again for some folds, checking that the code
+lengths of these folds are the same.
+
+'''
+
+import sys
+import time
+import argparse
+import numpy as np
+import mdlfit as mf
+from synthetic_datasets import synthetic_dataset
+
+# models to cross-validate
+MODEL_NAMES = ['Bernoulli', 'Position', 'RefinedPosition', 'Hierarchical', 'RefinedHierarchical']
+
+
+def refit_code_lengths(dataset, signature, beat_subdivisions, folds, fold, smoothing):
+    """Code length of the pieces of a fold with each model fitted from the rest of the pieces.
+
+    Parameters
+    ----------
+    dataset : EncodedDataset
+        the encoded dataset
+    signature : str
+        time signature of the dataset
+    beat_subdivisions : int
+        number of (equal) subdivisions of each beat
+    folds : np.ndarray
+        fold of each piece
+    fold : int
+        fold of the held-out pieces
+    smoothing : float
+        number of onsets and of locations with no onset added to each parameter
+
+    Returns
+    -------
+    code_lengths : np.ndarray
+        code length in bits of the held-out pieces for each model
+    """
+
+    code_lengths = []
+    for model_name in MODEL_NAMES:
+        fitted = mf.models.createModel(model_name, dataset.select(np.flatnonzero(folds != fold)),
+                                       signature, beat_subdivisions)
+        held_out = mf.models.createModel(model_name,
+                                         dataset.select(np.flatnonzero(folds == fold)),
+                                         signature, beat_subdivisions)
+        # smoothed parameters of the fitted model, and counts of the held-out pieces
+        onsets, trials = (np.asarray(counts) for counts in fitted._parameters())
+        ratios = (onsets + smoothing) / (trials + 2*smoothing)
+        test_onsets, test_trials = (np.asarray(counts) for counts in held_out._parameters())
+        code_lengths.append(-np.sum(test_onsets * np.log2(ratios) +
+                                    (test_trials - test_onsets) * np.log2(1 - ratios)))
+
+    return np.array(code_lengths)
+
+
+def process_arguments(args):
+    '''Argparse function to get the program parameters'''
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-p', '--num_pieces',
+                        help='number of pieces of the synthetic dataset',
+                        default=6000, type=int, action='store')
+    parser.add_argument('-k', '--folds',
+                        help='number of folds (leave-one-out if not given)',
+                        default=None, type=int, action='store')
+    parser.add_argument('-s', '--signature',
+                        help='string denoting the time signature (e.g. 4/4, 2/4)',
+                        default='4/4', type=str, action='store')
+    parser.add_argument('-b', '--beat_subdivisions',
+                        help='number of (equal) subdivisions of each beat',
+                        default=4, type=int, action='store')
+    parser.add_argument('-a', '--smoothing',
+                        help='number of onsets and of locations with no onset added to each '\
+                        'parameter of the fitted models',
+                        default=0.5, type=float, action='store')
+    parser.add_argument('-r', '--refits',
+                        help='number of folds whose models are fitted again to compare',
+                        default=3, type=int, action='store')
+
+    return vars(parser.parse_args(args))
+
+
+if __name__ == '__main__':
+    # get the parameters
+    parameters = process_arguments(sys.argv[1:])
+
+    print(__doc__)
+    print('-'*80)
+
+    sig, subdivisions = parameters['signature'], parameters['beat_subdivisions']
+    encoded = synthetic_dataset(parameters['num_pieces'] * 32, sig, subdivisions,
+                                piece_measures=32, piece_tempos=True)
+
+    start = time.perf_counter()
+    result = mf.models.cross_validate(encoded, sig, subdivisions, folds=parameters['folds'],
+                                      smoothing=parameters['smoothing'])
+    cv_time = time.perf_counter() - start
+
+    # fit the models again for some folds
+    start = time.perf_counter()
+    checked_folds = np.linspace(0, result.num_folds - 1, parameters['refits']).astype(int)
+    equal = True
+    for ind_fold in checked_folds:
+        code_lengths = refit_code_lengths(encoded, sig, subdivisions, result.folds, ind_fold,
+                                          parameters['smoothing'])
+        equal = equal and np.allclose(code_lengths, result.code_lengths[:, ind_fold],
+                                      rtol=1e-9)
+    refit_time = (time.perf_counter() - start) / len(checked_folds)
+
+    print('%d pieces, %d measures of %d positions' % (encoded.num_pieces, encoded.num_measures,
+                                                      encoded.beats_measure))
+    print()
+    result.show()
+    print()
+    print('cross-validation of %d folds: %.3fs (fitting the models again: %.3fs per fold, '
+          '%.1fs for all the folds)' % (result.num_folds, cv_time, refit_time,
+                                        refit_time * result.num_folds))
+    print('same code lengths as fitting the models again (%d folds): %s'
+          % (len(checked_folds), equal))
+    print('-'*80)
+
+    # fail if the code lengths differ
+    sys.exit(0 if equal else 1)
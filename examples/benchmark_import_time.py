@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# pylint: disable=C0103
+'''
+    __  __ _____  _      ______ _____ _______
+   |  \/  |  __ \| |    |  ____|_   _|__   __|
+   | \  / | |  | | |    | |__    | |    | |
+   | |\/| | |  | | |    |  __|   | |    | |
+   | |  | | |__| | |____| |     _| |_   | |
+   |_|  |_|_____/|______|_|    |_____|  |_|
+
+ music encodind using minimum description length
+
+
+Measure the time taken to import mdlfit, checking that it is within a budget and that
+music21 is not imported (it is only needed to parse music files).
+
+'''
+
+import sys
+import subprocess
+import argparse
+import statistics
+
+# packages that should not be imported with mdlfit
+HEAVY_PACKAGES = ('music21',)
+
+
+def benchmark_import_time(module='mdlfit', repetitions=5):
+    """Measure the time taken to import a module in a new interpreter (with python -X
+    importtime), and the heavy packages it imports.
+
+    Parameters
+    ----------
+    module : str
+        name of the module to import (e.g. mdlfit, mdlfit.models)
+    repetitions : int
+        number of times the module is imported (the median time is given)
+
+    Returns
+    -------
+    import_time : float
+        median of the times taken to import the module, in seconds
+    heavy_packages : list
+        heavy packages (from HEAVY_PACKAGES) imported with the module
+    """
+
+    times = []
+    imported = set()
+
+    for _ in range(repetitions):
+        # import the module in a new interpreter (with no modules imported)
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                                stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+        # cumulative time (in microseconds) of each imported module
+        cumulative = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:'):
+                continue
+            fields = line[len('import time:'):].split('|')
+            try:
+                cumulative[fields[2].strip()] = int(fields[1])
+            except (IndexError, ValueError):
+                # header of the table
+                continue
+
+        times.append(cumulative[module] / 1e6)
+        imported.update(cumulative)
+
+    heavy_packages = sorted(set(name.split('.')[0] for name in imported) &
+                            set(HEAVY_PACKAGES))
+
+    return statistics.median(times), heavy_packages
+
+
+def process_arguments(args):
+    '''Argparse function to get the program parameters'''
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('modules',
+                        nargs='*', default=['mdlfit', 'mdlfit.models', 'mdlfit.util'],
+                        action='store',
+                        help='modules to import (by default mdlfit, mdlfit.models and mdlfit.util)')
+    parser.add_argument('-t', '--budget',
+                        help='maximum time to import each module (in seconds)',
+                        default=0.3, type=float, action='store')
+    parser.add_argument('-r', '--repetitions',
+                        help='number of times each module is imported',
+                        default=5, type=int, action='store')
+
+    return vars(parser.parse_args(args))
+
+
+if __name__ == '__main__':
+    # get the parameters
+    parameters = process_arguments(sys.argv[1:])
+
+    print(__doc__)
+    print('-'*80)
+
+    # measure the import time of each module
+    passed = True
+    for module_name in parameters['modules']:
+        import_time, heavy = benchmark_import_time(module_name, parameters['repetitions'])
+        within_budget = import_time <= parameters['budget'] and not heavy
+        passed = passed and within_budget
+        print('%s: %.3fs (budget %.3fs)%s%s'
+              % (module_name, import_time, parameters['budget'],
+                 ', imports ' + ', '.join(heavy) if heavy else '',
+                 '' if within_budget else ' FAILED'))
+
+    print('-'*80)
+
+    # fail if some module is not within the budget
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# pylint: disable=C0103
+'''
+    __  __ _____  _      ______ _____ _______
+   |  \/  |  __ \| |    |  ____|_   _|__   __|
+   | \  / | |  | | |    | |__    | |    | |
+   | |\/| | |  | | |    |  __|   | |    | |
+   | |  | | |__| | |____| |     _| |_   | |
+   |_|  |_|_____/|______|_|    |_____|  |_|
+
+ music encodind using minimum description length
+
+
+Compare the time taken to update fitted models with some new pieces (add_pieces) and to fit
+them again from the whole dataset, and to remove the pieces (remove_pieces), checking that the
+updated models are the same as the ones fitted from scratch.
+
+'''
+
+import sys
+import time
+import argparse
+import numpy as np
+import mdlfit as mf
+from synthetic_datasets import synthetic_dataset
+
+# models to update
+MODEL_NAMES = ['Bernoulli', 'Position', 'RefinedPosition', 'Hierarchical', 'RefinedHierarchical']
+
+
+def same_model(model, other):
+    """Whether two models have the same counts, parameters and description length"""
+
+    return (model.statistics().counts.tolist() == other.statistics().counts.tolist() and
+            getattr(model, 'ratios', None) == getattr(other, 'ratios', None) and
+            getattr(model, 'p', None) == getattr(other, 'p', None) and model.dl == other.dl)
+
+
+def process_arguments(args):
+    '''Argparse function to get the program parameters'''
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--num_measures',
+                        help='number of measures of the synthetic dataset',
+                        default=1000000, type=int, action='store')
+    parser.add_argument('-a', '--num_added',
+                        help='number of new pieces (at the end of the dataset)',
+                        default=20, type=int, action='store')
+    parser.add_argument('-s', '--signature',
+                        help='string denoting the time signature (e.g. 4/4, 2/4)',
+                        default='4/4', type=str, action='store')
+    parser.add_argument('-b', '--beat_subdivisions',
+                        help='number of (equal) subdivisions of each beat',
+                        default=4, type=int, action='store')
+    parser.add_argument('-d', '--precision',
+                        help='precision parameter of the models (default sqrt(n))',
+                        default=None, type=int, action='store')
+
+    return vars(parser.parse_args(args))
+
+
+if __name__ == '__main__':
+    # get the parameters
+    parameters = process_arguments(sys.argv[1:])
+
+    print(__doc__)
+    print('-'*80)
+
+    sig, subdivisions = parameters['signature'], parameters['beat_subdivisions']
+    encoded = synthetic_dataset(parameters['num_measures'], sig, subdivisions)
+    # the dataset before and after adding the new pieces
+    old = encoded.select(np.arange(encoded.num_pieces - parameters['num_added']))
+    new = encoded.select(np.arange(old.num_pieces, encoded.num_pieces))
+
+    print('%d pieces, %d new pieces, %d measures of %d positions'
+          % (old.num_pieces, new.num_pieces, encoded.num_measures, encoded.beats_measure))
+
+    equal = True
+    for model_name in MODEL_NAMES:
+        model = mf.models.createModel(model_name, old, sig, subdivisions,
+                                      d=parameters['precision'])
+
+        # add the new pieces, and fit the whole dataset again
+        start = time.perf_counter()
+        model.add_pieces(new)
+        add_time = time.perf_counter() - start
+        start = time.perf_counter()
+        refit = mf.models.createModel(model_name, encoded, sig, subdivisions,
+                                      d=parameters['precision'])
+        refit_time = time.perf_counter() - start
+        equal = equal and same_model(model, refit)
+
+        # remove the new pieces
+        start = time.perf_counter()
+        model.remove_pieces(new)
+        remove_time = time.perf_counter() - start
+        equal = equal and same_model(model, mf.models.createModel(model_name, old, sig,
+                                                                  subdivisions,
+                                                                  d=parameters['precision']))
+
+        print('%-20s add %.4fs, remove %.4fs, refit %.4fs (%.0fx)'
+              % (model_name, add_time, remove_time, refit_time, refit_time / add_time))
+
+    print('same models as fitted from scratch: %s' % equal)
+    print('-'*80)
+
+    # fail if the models differ
+    sys.exit(0 if equal else 1)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# pylint: disable=C0103
+'''
+    __  __ _____  _      ______ _____ _______
+   |  \/  |  __ \| |    |  ____|_   _|__   __|
+   | \  / | |  | | |    | |__    | |    | |
+   | |\/| | |  | | |    |  __|   | |    | |
+   | |  | | |__| | |____| |     _| |_   | |
+   |_|  |_|_____/|______|_|    |_____|  |_|
+
+ music encodind using minimum description length
+
+
+Compare the time and memory taken to fit all the models from the measures of a dataset and
+from its packed measures (one uint64 per measure), checking that they give the same result.
+
+'''
+
+import sys
+import time
+import argparse
+import numpy as np
+import mdlfit as mf
+from synthetic_datasets import synthetic_dataset
+
+
+def benchmark_packed_fit(dataset, signature, beat_subdivisions, repetitions=3):
+    """Time to fit all the models from the measures and from the packed measures.
+
+    Parameters
+    ----------
+    dataset : EncodedDataset
+        the encoded dataset
+    signature : str
+        time signature of the dataset
+    beat_subdivisions : int
+        number of (equal) subdivisions of each beat
+    repetitions : int
+        number of times the models are fitted (the minimum time is given)
+
+    Returns
+    -------
+    dense_time : float
+        time to fit the models from the measures, in seconds
+    packed_time : float
+        time to fit the models from the packed measures, in seconds
+    pack_time : float
+        time to pack the measures, in seconds
+    same : bool
+        whether both fits give the same description lengths
+    """
+
+    start = time.perf_counter()
+    packed = dataset.pack()
+    pack_time = time.perf_counter() - start
+
+    times = {}
+    results = {}
+    for name, data in (('dense', dataset), ('packed', packed)):
+        times[name] = []
+        for _ in range(repetitions):
+            start = time.perf_counter()
+            results[name] = mf.models.fit_all(data, signature, beat_subdivisions)
+            times[name].append(time.perf_counter() - start)
+
+    same = np.array_equal(results['dense'].dls, results['packed'].dls)
+
+    return min(times['dense']), min(times['packed']), pack_time, same
+
+
+def process_arguments(args):
+    '''Argparse function to get the program parameters'''
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-f', '--filename',
+                        help='encoded dataset (pickle file or memory-mapped directory), '\
+                        'a synthetic dataset is used if not given',
+                        action='store')
+    parser.add_argument('-n', '--num_measures',
+                        help='number of measures of the synthetic dataset',
+                        default=1000000, type=int, action='store')
+    parser.add_argument('-s', '--signature',
+                        help='string denoting the time signature (e.g. 4/4, 2/4)',
+                        default='4/4', type=str, action='store')
+    parser.add_argument('-b', '--beat_subdivisions',
+                        help='number of (equal) subdivisions of each beat',
+                        default=4, type=int, action='store')
+    parser.add_argument('-r', '--repetitions',
+                        help='number of times the models are fitted',
+                        default=3, type=int, action='store')
+
+    return vars(parser.parse_args(args))
+
+
+if __name__ == '__main__':
+    # get the parameters
+    parameters = process_arguments(sys.argv[1:])
+
+    print(__doc__)
+    print('-'*80)
+
+    # load (or generate) the dataset
+    if parameters['filename'] is not None:
+        encoded = mf.dataio.load_encoded_dataset(parameters['filename'], mmap_mode=None)
+        if not isinstance(encoded, mf.dataset.EncodedDataset):
+            encoded = mf.dataset.EncodedDataset.from_pieces(encoded)
+    else:
+        encoded = synthetic_dataset(parameters['num_measures'], parameters['signature'],
+                                    parameters['beat_subdivisions'])
+
+    dense, packed_fit, packing, equal = benchmark_packed_fit(encoded, parameters['signature'],
+                                                             parameters['beat_subdivisions'],
+                                                             parameters['repetitions'])
+
+    print('%d measures of %d positions' % (encoded.num_measures, encoded.beats_measure))
+    print('memory: %.1f MB dense (uint8), %.1f MB packed'
+          % (encoded.measures.nbytes / 2**20, encoded.num_measures * 8 / 2**20))
+    print('fit all the models: %.3fs dense, %.3fs packed (%.1fx), packing %.3fs'
+          % (dense, packed_fit, dense / packed_fit, packing))
+    print('same description lengths: %s' % equal)
+    print('-'*80)
+
+    # fail if the fits differ
+    sys.exit(0 if equal else 1)
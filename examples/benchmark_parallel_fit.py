@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# pylint: disable=C0103
+'''
+    __  __ _____  _      ______ _____ _______
+   |  \/  |  __ \| |    |  ____|_   _|__   __|
+   | \  / | |  | | |    | |__    | |    | |
+   | |\/| | |  | | |    |  __|   | |    | |
+   | |  | | |__| | |____| |     _| |_   | |
+   |_|  |_|_____/|______|_|    |_____|  |_|
+
+ music encodind using minimum description length
+
+
+Compare the time taken to fit all the models in a single process and in several processes
+(fit_parallel), and merge the statistics of shards of the dataset saved to files (as written
+by separate machines), checking that they all give the same result.
+
+'''
+
+import os
+import sys
+import time
+import tempfile
+import argparse
+import numpy as np
+import mdlfit as mf
+from synthetic_datasets import synthetic_dataset
+
+
+def merge_shard_files(dataset, signature, beat_subdivisions, num_shards, directory):
+    """Fit each shard of a dataset, save the statistics of each model to a file, and merge
+    the statistics read from the files.
+
+    Parameters
+    ----------
+    dataset : EncodedDataset
+        the encoded dataset
+    signature : str
+        time signature of the dataset
+    beat_subdivisions : int
+        number of (equal) subdivisions of each beat
+    num_shards : int
+        number of shards of consecutive pieces
+    directory : str
+        directory of the files of statistics
+
+    Returns
+    -------
+    result : FitResult
+        fit result from the merged statistics
+    """
+
+    # fit each shard (as a separate machine would) and save its statistics
+    bounds = np.linspace(0, dataset.num_pieces, num_shards + 1).round().astype(int)
+    for ind_shard, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+        result = mf.models.fit_all(dataset.select(np.arange(start, stop)), signature,
+                                   beat_subdivisions, precisions=[])
+        for model_name, statistics in result.statistics.items():
+            statistics.save(os.path.join(directory, '%s_%d.npz' % (model_name, ind_shard)))
+
+    # merge the statistics of each model from the files
+    statistics = {}
+    for model_name in result.model_names:
+        statistics[model_name] = mf.models.Statistics.merge(
+            mf.models.Statistics.load(os.path.join(directory, '%s_%d.npz' % (model_name, ind)))
+            for ind in range(num_shards))
+
+    return mf.models.FitResult.from_statistics(statistics)
+
+
+def process_arguments(args):
+    '''Argparse function to get the program parameters'''
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-f', '--filename',
+                        help='encoded dataset (pickle file or memory-mapped directory), '\
+                        'a synthetic dataset is used if not given',
+                        action='store')
+    parser.add_argument('-n', '--num_measures',
+                        help='number of measures of the synthetic dataset',
+                        default=2000000, type=int, action='store')
+    parser.add_argument('-s', '--signature',
+                        help='string denoting the time signature (e.g. 4/4, 2/4)',
+                        default='4/4', type=str, action='store')
+    parser.add_argument('-b', '--beat_subdivisions',
+                        help='number of (equal) subdivisions of each beat',
+                        default=4, type=int, action='store')
+    parser.add_argument('-j', '--n_jobs',
+                        help='number of worker processes (-1 to use all the CPUs)',
+                        default=-1, type=int, action='store')
+    parser.add_argument('-k', '--num_shards',
+                        help='number of shards saved to files and merged',
+                        default=4, type=int, action='store')
+
+    return vars(parser.parse_args(args))
+
+
+if __name__ == '__main__':
+    # get the parameters
+    parameters = process_arguments(sys.argv[1:])
+
+    print(__doc__)
+    print('-'*80)
+
+    # load (or generate) the dataset
+    if parameters['filename'] is not None:
+        encoded = mf.dataio.load_encoded_dataset(parameters['filename'], mmap_mode=None)
+        if not isinstance(encoded, mf.dataset.EncodedDataset):
+            encoded = mf.dataset.EncodedDataset.from_pieces(encoded)
+    else:
+        encoded = synthetic_dataset(parameters['num_measures'], parameters['signature'],
+                                    parameters['beat_subdivisions'])
+    sig, subdivisions = parameters['signature'], parameters['beat_subdivisions']
+
+    start = time.perf_counter()
+    serial = mf.models.fit_all(encoded, sig, subdivisions)
+    serial_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parallel = mf.models.fit_parallel(encoded, sig, subdivisions, n_jobs=parameters['n_jobs'])
+    parallel_time = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        merged = merge_shard_files(encoded, sig, subdivisions, parameters['num_shards'],
+                                   temp_dir)
+
+    equal = (np.array_equal(serial.dls, parallel.dls) and
+             np.array_equal(serial.dls, merged.dls))
+
+    print('%d pieces, %d measures of %d positions' % (encoded.num_pieces, encoded.num_measures,
+                                                      encoded.beats_measure))
+    print('fit all the models: %.3fs in a process, %.3fs in %d processes (%.1fx)'
+          % (serial_time, parallel_time,
+             parameters['n_jobs'] if parameters['n_jobs'] > 0 else os.cpu_count(),
+             serial_time / parallel_time))
+    print('same description lengths (parallel and %d merged files): %s'
+          % (parameters['num_shards'], equal))
+    print('-'*80)
+
+    # fail if the fits differ
+    sys.exit(0 if equal else 1)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# pylint: disable=C0103
+'''
+    __  __ _____  _      ______ _____ _______
+   |  \/  |  __ \| |    |  ____|_   _|__   __|
+   | \  / | |  | | |    | |__    | |    | |
+   | |\/| | |  | | |    |  __|   | |    | |
+   | |  | | |__| | |____| |     _| |_   | |
+   |_|  |_|_____/|______|_|    |_____|  |_|
+
+ music encodind using minimum description length
+
+
+Compare the time and memory taken to fit all the models from the measures of a dataset and
+from the positions of its onsets (sparse dataset), for grids of high resolution, checking that
+they give the same result.
+
+'''
+
+import sys
+import time
+import argparse
+import numpy as np
+import mdlfit as mf
+from synthetic_datasets import synthetic_dataset
+
+
+def benchmark_sparse_fit(dataset, signature, beat_subdivisions, repetitions=3):
+    """Time to fit all the models from the measures and from the positions of the onsets.
+
+    Parameters
+    ----------
+    dataset : EncodedDataset
+        the encoded dataset
+    signature : str
+        time signature of the dataset
+    beat_subdivisions : int
+        number of (equal) subdivisions of each beat
+    repetitions : int
+        number of times the models are fitted (the minimum time is given)
+
+    Returns
+    -------
+    dense_time : float
+        time to fit the models from the measures, in seconds
+    sparse_time : float
+        time to fit the models from the positions of the onsets, in seconds
+    sparse : SparseDataset
+        the sparse dataset
+    same : bool
+        whether both fits give the same description lengths
+    """
+
+    sparse = dataset.to_sparse()
+
+    times = {}
+    results = {}
+    for name, data in (('dense', dataset), ('sparse', sparse)):
+        times[name] = []
+        for _ in range(repetitions):
+            start = time.perf_counter()
+            results[name] = mf.models.fit_all(data, signature, beat_subdivisions)
+            times[name].append(time.perf_counter() - start)
+
+    same = np.array_equal(results['dense'].dls, results['sparse'].dls)
+
+    return min(times['dense']), min(times['sparse']), sparse, same
+
+
+def process_arguments(args):
+    '''Argparse function to get the program parameters'''
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-f', '--filename',
+                        help='encoded dataset (pickle file or memory-mapped directory), '\
+                        'a synthetic dataset is used if not given',
+                        action='store')
+    parser.add_argument('-n', '--num_measures',
+                        help='number of measures of the synthetic dataset',
+                        default=200000, type=int, action='store')
+    parser.add_argument('-o', '--onsets_measure',
+                        help='mean number of onsets per measure of the synthetic dataset',
+                        default=6, type=float, action='store')
+    parser.add_argument('-s', '--signature',
+                        help='string denoting the time signature (e.g. 4/4, 2/4)',
+                        default='4/4', type=str, action='store')
+    parser.add_argument('-b', '--beat_subdivisions',
+                        help='number of (equal) subdivisions of each beat',
+                        default=16, type=int, action='store')
+    parser.add_argument('-r', '--repetitions',
+                        help='number of times the models are fitted',
+                        default=3, type=int, action='store')
+
+    return vars(parser.parse_args(args))
+
+
+if __name__ == '__main__':
+    # get the parameters
+    parameters = process_arguments(sys.argv[1:])
+
+    print(__doc__)
+    print('-'*80)
+
+    # load (or generate) the dataset
+    if parameters['filename'] is not None:
+        encoded = mf.dataio.load_encoded_dataset(parameters['filename'], mmap_mode=None)
+        if not isinstance(encoded, mf.dataset.EncodedDataset):
+            encoded = mf.dataset.EncodedDataset.from_pieces(encoded)
+    else:
+        encoded = synthetic_dataset(parameters['num_measures'], parameters['signature'],
+                                    parameters['beat_subdivisions'],
+                                    onsets_measure=parameters['onsets_measure'])
+
+    dense, sparse_fit, sparse_data, equal = benchmark_sparse_fit(encoded,
+                                                                 parameters['signature'],
+                                                                 parameters['beat_subdivisions'],
+                                                                 parameters['repetitions'])
+
+    print('%d measures of %d positions, %d onsets' % (encoded.num_measures, encoded.beats_measure,
+                                                      sparse_data.num_onsets))
+    print('memory: %.1f MB dense (uint8), %.1f MB sparse'
+          % (encoded.measures.nbytes / 2**20,
+             (sparse_data.positions.nbytes + sparse_data.measure_offsets.nbytes) / 2**20))
+    print('fit all the models: %.3fs dense, %.3fs sparse (%.1fx)'
+          % (dense, sparse_fit, dense / sparse_fit))
+    print('same description lengths: %s' % equal)
+    print('-'*80)
+
+    # fail if the fits differ
+    sys.exit(0 if equal else 1)
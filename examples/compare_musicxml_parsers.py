@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# pylint: disable=C0103
+'''
+    __  __ _____  _      ______ _____ _______
+   |  \/  |  __ \| |    |  ____|_   _|__   __|
+   | \  / | |  | | |    | |__    | |    | |
+   | |\/| | |  | | |    |  __|   | |    | |
+   | |  | | |__| | |____| |     _| |_   | |
+   |_|  |_|_____/|______|_|    |_____|  |_|
+
+ music encodind using minimum description length
+
+
+Compare the native MusicXML reader with music21 on the files in a given directory.
+
+'''
+
+import sys
+import time
+import argparse
+from mdlfit.dataio import encode_dataset
+
+
+def compare_musicxml_parsers(dataset_string, signature='4/4', beat_subdivisions=2,
+                             file_ext='xml', speedup=20):
+    """Encode a dataset with music21 and with the native MusicXML reader, checking that both
+    give the same encoding, and compare the time they take.
+
+    Parameters
+    ----------
+    dataset_string : str
+        complete path to the dataset folder containing the MusicXML files
+    signature : str
+        string denoting the time signature (e.g. 4/4, 2/4).
+    beat_subdivisions : int
+        number of (equal) subdivisions of each beat.
+    file_ext : str
+        file extension of the dataset's files
+    speedup : float
+        expected speedup of the native reader
+
+    Returns
+    -------
+    measured_speedup : float
+        time taken by music21 divided by the time taken by the native reader
+    """
+
+    # encode the dataset with both parsers (fails if the encodings are different), keeping
+    # the event of each file, with the time taken by each parser
+    events = []
+    dataset = encode_dataset(dataset_string, signature=signature,
+                             beat_subdivisions=beat_subdivisions, file_ext=file_ext,
+                             parser='compare', callback=events.append)
+
+    # encode the dataset with the native reader only
+    start = time.perf_counter()
+    native_dataset = encode_dataset(dataset_string, signature=signature,
+                                    beat_subdivisions=beat_subdivisions, file_ext=file_ext,
+                                    parser='native', verbose=False)
+    native_time = time.perf_counter() - start
+
+    # time taken by music21 to read the files
+    music21_time = sum(event.get('music21_time', 0.0) for event in events)
+    measured_speedup = music21_time / native_time if native_time > 0 else float('inf')
+
+    print(__doc__)
+    print('-'*80)
+    print('Number of encoded pieces: ', len(dataset), len(native_dataset))
+    print('Time with music21: %.2fs' % music21_time)
+    print('Time with the native reader: %.2fs' % native_time)
+    print('Speedup: %.1fx (expected at least %.1fx)' % (measured_speedup, speedup))
+    print('-'*80)
+
+    return measured_speedup
+
+
+def process_arguments(args):
+    '''Argparse function to get the program parameters'''
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dataset_string',
+                        nargs='?', default='../data/tango_songbook/', action='store',
+                        help='complete path to the dataset folder containing the MusicXML files')
+    parser.add_argument('-s', '--signature',
+                        help='string denoting the time signature (e.g. 4/4, 2/4)',
+                        default='4/4', type=str, action='store')
+    parser.add_argument('-b', '--beat_subdivisions',
+                        help='number of (equal) subdivisions of each beat',
+                        default='2', type=int, action='store')
+    parser.add_argument('-e', '--file_ext',
+                        help='string denoting the extension of the music files',
+                        default='xml', type=str, action='store')
+    parser.add_argument('-x', '--speedup',
+                        help='expected speedup of the native reader',
+                        default=20, type=float, action='store')
+
+    return vars(parser.parse_args(args))
+
+
+if __name__ == '__main__':
+    # get the parameters
+    parameters = process_arguments(sys.argv[1:])
+
+    # compare the parsers
+    measured = compare_musicxml_parsers(parameters['dataset_string'],
+                                        parameters['signature'],
+                                        parameters['beat_subdivisions'],
+                                        parameters['file_ext'],
+                                        parameters['speedup'])
+
+    # fail if the native reader is not fast enough
+    sys.exit(0 if measured >= parameters['speedup'] else 1)
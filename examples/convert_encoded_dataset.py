@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# pylint: disable=C0103
+'''
+    __  __ _____  _      ______ _____ _______
+   |  \/  |  __ \| |    |  ____|_   _|__   __|
+   | \  / | |  | | |    | |__    | |    | |
+   | |\/| | |  | | |    |  __|   | |    | |
+   | |  | | |__| | |____| |     _| |_   | |
+   |_|  |_|_____/|______|_|    |_____|  |_|
+
+ music encodind using minimum description length
+
+
+Convert an encoded dataset from a pickle file to the memory-mapped format
+
+'''
+
+import os
+import sys
+import argparse
+from mdlfit.dataio import convert_encoded_dataset
+
+
+def convert_encoded_dataset_from_pkl(dataset_string, signature='4/4', beat_subdivisions=2,
+                                     data_folder='../data/encoded/'):
+    """Convert an encoded dataset saved as a pickle file to a directory with the measures as
+    a .npy file (memory-mapped on load) and the metadata as a json file.
+
+    Parameters
+    ----------
+    dataset_string : str
+        the name of the dataset as used in the encoding, for instance, as defined in music21
+        (e.g. 'airdsAirs', 'oneills1850', 'EssenFolksong')
+    signature : str
+        string denoting the time signature (e.g. 4/4, 2/4).
+    beat_subdivisions : int
+        number of (equal) subdivisions of each beat.
+    data_folder : str
+        name of the folder containing the data, i.e. the pickle files
+
+    Returns
+    -------
+    dataset : EncodedDataset
+        the converted dataset
+    """
+
+    # strings for the signature and beat_subdivision
+    signature_subdivisions = signature.replace('/', '') + "_" + str(beat_subdivisions)
+    # dataset filename (the directory has the same name without the extension)
+    dataset_filename = os.path.join(data_folder, dataset_string + "_" + signature_subdivisions)
+
+    # convert the dataset
+    dataset = convert_encoded_dataset(dataset_filename + ".pkl", dataset_filename,
+                                      signature=signature, beat_subdivisions=beat_subdivisions)
+
+    print('Converted ' + dataset_filename + '.pkl: ' + str(dataset))
+
+    return dataset
+
+
+def process_arguments(args):
+    '''Argparse function to get the program parameters'''
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dataset_string',
+                        action='store',
+                        help='the name of the dataset as used in the encoding, for instance, as'\
+                        ' defined in music21 (e.g. airdsAirs, oneills1850, EssenFolksong)')
+    parser.add_argument('-s', '--signature',
+                        help='string denoting the time signature (e.g. 4/4, 2/4)',
+                        default='4/4', type=str, action='store')
+    parser.add_argument('-b', '--beat_subdivisions',
+                        help='number of (equal) subdivisions of each beat',
+                        default='2', type=int, action='store')
+    parser.add_argument('-d', '--data_folder',
+                        help='name of the folder containing the data, i.e. the pickle files',
+                        default='../data/encoded/', action='store')
+
+    return vars(parser.parse_args(args))
+
+
+if __name__ == '__main__':
+    # get the parameters
+    parameters = process_arguments(sys.argv[1:])
+
+    # convert the dataset
+    convert_encoded_dataset_from_pkl(parameters['dataset_string'],
+                                     parameters['signature'],
+                                     parameters['beat_subdivisions'],
+                                     parameters['data_folder'])
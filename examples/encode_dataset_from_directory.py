@@ -23,7 +23,7 @@ from mdlfit.dataio import save_encoded_dataset
 
 
 def encode_dataset_from_string(dataset_string, signature='4/4', beat_subdivisions=2,
-                               file_ext='xml', output_file=None):
+                               file_ext='xml', output_file=None, n_jobs=1, cache=None):
     """Load and encode a symbolic music dataset from the files in a given directory.
 
     Parameters
@@ -38,8 +38,14 @@ def encode_dataset_from_string(dataset_string, signature='4/4', beat_subdivision
     file_ext : str
         file extension of the dataset's files
     output_file : str
-        name of the output file to save the encoded dataset (as a pickle dump).
+        name of the output directory to save the encoded dataset (memory-mapped on load).
         If not given nothing is saved.
+    n_jobs : int
+        number of worker processes used to parse and encode the files
+        (1 to process them serially, -1 to use all the available CPUs).
+    cache : str
+        directory of the cache of parsed files (files already parsed are not parsed again).
+        If not given no cache is used.
 
     Returns
     -------
@@ -51,7 +57,9 @@ def encode_dataset_from_string(dataset_string, signature='4/4', beat_subdivision
     dataset = encode_dataset(dataset_string,
                              signature=signature,
                              beat_subdivisions=beat_subdivisions,
-                             file_ext=file_ext)
+                             file_ext=file_ext,
+                             n_jobs=n_jobs,
+                             cache=cache)
 
     # show some information about the encoded dataset
     print(__doc__)
@@ -73,9 +81,9 @@ def encode_dataset_from_string(dataset_string, signature='4/4', beat_subdivision
               ' Title: ' + dataset[ind]["title"])
 
     if output_file is not None:
-        # save encoded dataset to pickle file
+        # save encoded dataset to a directory
         save_encoded_dataset(dataset, output_file + "_" + signature.replace('/', '') +
-                             "_" + str(beat_subdivisions) + ".pkl")
+                             "_" + str(beat_subdivisions))
 
 
 
@@ -97,7 +105,13 @@ def process_arguments(args):
                         help='string denoting the extension of the music files',
                         default='xml', type=str, action='store')
     parser.add_argument('-o', '--output_file',
-                        help='output file to save the encoded dataset (optional)',
+                        help='output directory to save the encoded dataset (optional)',
+                        action='store')
+    parser.add_argument('-j', '--n_jobs',
+                        help='number of worker processes (-1 to use all the available CPUs)',
+                        default=1, type=int, action='store')
+    parser.add_argument('-c', '--cache',
+                        help='directory of the cache of parsed files (optional)',
                         action='store')
 
     return vars(parser.parse_args(args))
@@ -112,4 +126,6 @@ if __name__ == '__main__':
                                parameters['signature'],
                                parameters['beat_subdivisions'],
                                parameters['file_ext'],
-                               parameters['output_file'])
+                               parameters['output_file'],
+                               parameters['n_jobs'],
+                               parameters['cache'])
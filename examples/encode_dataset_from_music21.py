@@ -20,10 +20,14 @@ import sys
 import argparse
 from mdlfit.dataio import encode_dataset
 from mdlfit.dataio import save_encoded_dataset
+from mdlfit.ingest import IngestStats
+from mdlfit.ingest import Quarantine
 
 
 def encode_dataset_from_string(dataset_string, signature='4/4', beat_subdivisions=2,
-                               output_file=None):
+                               output_file=None, n_jobs=1, cache=None, parser='music21',
+                               timeout=None, max_memory=None, quarantine=None, retry=False,
+                               quiet=False):
     """Load and encode a symbolic music dataset from a corpus provided by music21.
 
     Parameters
@@ -37,8 +41,28 @@ def encode_dataset_from_string(dataset_string, signature='4/4', beat_subdivision
     beat_subdivisions : int
         number of (equal) subdivisions of each beat.
     output_file : str
-        name of the output file to save the encoded dataset (as a pickle dump).
+        name of the output directory to save the encoded dataset (memory-mapped on load).
         If not given nothing is saved.
+    n_jobs : int
+        number of worker processes used to parse and encode the files
+        (1 to process them serially, -1 to use all the available CPUs).
+    cache : str
+        directory of the cache of parsed files (files already parsed are not parsed again).
+        If not given no cache is used.
+    parser : str
+        parser of the music files ('music21', or 'native' to read the ABC files with the
+        much faster native reader).
+    timeout : float
+        maximum time (in seconds) to parse each file. If not given there is no limit.
+    max_memory : int
+        maximum memory (in MB) to parse each file. If not given there is no limit.
+    quarantine : str
+        manifest of the files that could not be parsed (they are skipped in later runs).
+        If not given the failures are not recorded.
+    retry : bool
+        whether to parse again the files in the quarantine manifest.
+    quiet : bool
+        whether to show only the statistics of the files (with no output for each file).
 
     Returns
     -------
@@ -46,10 +70,26 @@ def encode_dataset_from_string(dataset_string, signature='4/4', beat_subdivision
         list of dictionaries, each one corresponds to a piece
     """
 
+    # manifest of the files that could not be parsed
+    if quarantine is not None:
+        quarantine = Quarantine(quarantine, retry=retry)
+
+    # statistics of the files
+    stats = IngestStats()
+
     # encode the dataset
     dataset = encode_dataset(dataset_string,
                              signature=signature,
-                             beat_subdivisions=beat_subdivisions)
+                             beat_subdivisions=beat_subdivisions,
+                             n_jobs=n_jobs,
+                             cache=cache,
+                             parser=parser,
+                             timeout=timeout,
+                             max_memory=max_memory * 2**20 if max_memory else None,
+                             quarantine=quarantine,
+                             callback=stats.add,
+                             verbose=not quiet)
+    stats.stop()
 
     # show some information about the encoded dataset
     print(__doc__)
@@ -60,6 +100,8 @@ def encode_dataset_from_string(dataset_string, signature='4/4', beat_subdivision
     print('Number of encoded pieces: ', len(dataset))
     print('Total number of measures: ', sum([len(dataset[indi]["measures"]) for indi in range(len(dataset)) ]))
     print('-'*80)
+    print(stats.report())
+    print('-'*80)
 
     # number of elements to show
     N = min(10, len(dataset))
@@ -71,9 +113,9 @@ def encode_dataset_from_string(dataset_string, signature='4/4', beat_subdivision
               ' Title: ' + dataset[ind]["title"])
 
     if output_file is not None:
-        # save encoded dataset to pickle file
+        # save encoded dataset to a directory
         save_encoded_dataset(dataset, output_file + "_" + signature.replace('/', '') +
-                             "_" + str(beat_subdivisions) + ".pkl")
+                             "_" + str(beat_subdivisions))
 
 
 
@@ -93,8 +135,32 @@ def process_arguments(args):
                         help='number of (equal) subdivisions of each beat',
                         default='2', type=int, action='store')
     parser.add_argument('-o', '--output_file',
-                        help='output file to save the encoded dataset (optional)',
+                        help='output directory to save the encoded dataset (optional)',
+                        action='store')
+    parser.add_argument('-j', '--n_jobs',
+                        help='number of worker processes (-1 to use all the available CPUs)',
+                        default=1, type=int, action='store')
+    parser.add_argument('-c', '--cache',
+                        help='directory of the cache of parsed files (optional)',
+                        action='store')
+    parser.add_argument('-p', '--parser',
+                        help='parser of the music files (music21 or native)',
+                        default='music21', type=str, action='store')
+    parser.add_argument('-t', '--timeout',
+                        help='maximum time to parse each file in seconds (optional)',
+                        type=float, action='store')
+    parser.add_argument('-m', '--max_memory',
+                        help='maximum memory to parse each file in MB (optional)',
+                        type=int, action='store')
+    parser.add_argument('-q', '--quarantine',
+                        help='manifest of the files that could not be parsed (optional)',
                         action='store')
+    parser.add_argument('-r', '--retry',
+                        help='parse again the files in the quarantine manifest',
+                        action='store_true')
+    parser.add_argument('--quiet',
+                        help='show only the statistics of the files',
+                        action='store_true')
 
     return vars(parser.parse_args(args))
 
@@ -107,4 +173,12 @@ if __name__ == '__main__':
     encode_dataset_from_string(parameters['dataset_string'],
                                parameters['signature'],
                                parameters['beat_subdivisions'],
-                               parameters['output_file'])
+                               parameters['output_file'],
+                               parameters['n_jobs'],
+                               parameters['cache'],
+                               parameters['parser'],
+                               parameters['timeout'],
+                               parameters['max_memory'],
+                               parameters['quarantine'],
+                               parameters['retry'],
+                               parameters['quiet'])
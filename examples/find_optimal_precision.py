@@ -57,22 +57,15 @@ def fit_all_precisions(dataset_string, model_name, signature='4/4', beat_subdivi
     # load encoded the dataset
     dataset = mf.dataio.load_encoded_dataset(data_folder + dataset_filename)
 
-    ## resulting model (parameters may vary) for the given precisions
-    models = []
+    # fit the model only once (the counts do not depend on the precision)
+    model = mf.models.createModel(model_name, dataset, signature, beat_subdivisions)
 
     # precision grid of values
     precision_grid = [2**k for k in range(min_val, max_val+1)]
 
-    for precision in precision_grid:
-        # create model
-        model = mf.models.createModel(model_name, dataset, signature, beat_subdivisions,
-                                      d=precision)
-        # save model
-        models.append(model)
-
-    # description lenght for each model
-    description_lengths = np.array([model.dl for model in models])
-    # find index of the model with the minunim description length
+    # description lenght for each precision value
+    description_lengths = model.dl_for(precision_grid)
+    # find index of the precision with the minunim description length
     argmin = np.argmin(description_lengths)
     # optimal precision value
     optimal_precision = precision_grid[argmin]
@@ -98,7 +91,7 @@ def fit_all_precisions(dataset_string, model_name, signature='4/4', beat_subdivi
     print('Minimum description length: '.ljust(colwidth - len("{:4.6f}".format(mdl))) +
           "{:4.6f}".format(mdl))
     print()
-    models[argmin].show(colwidth=colwidth)
+    model.with_precision(optimal_precision).show(colwidth=colwidth)
     print('='*colwidth)
 
 
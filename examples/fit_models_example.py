@@ -50,16 +50,15 @@ def fit_all_models(dataset_string, signature='4/4', beat_subdivisions=2,
     # load encoded the dataset
     dataset = mf.dataio.load_encoded_dataset(data_folder + dataset_filename)
 
-    # model names
-    model_names = ['Bernoulli', 'Position', 'RefinedPosition',
-                   'Hierarchical', 'RefinedHierarchical']
+    # fit all the models at once
+    result = mf.models.fit_all(dataset, signature, beat_subdivisions, precisions=[])
 
     # models
     models = []
 
-    for name in model_names:
-        # create model
-        model = mf.models.createModel(name, dataset, signature, beat_subdivisions, d=precision)
+    for name in result.model_names:
+        # create model from its statistics
+        model = result.model(name, d=precision)
         # save model
         models.append(model)
 
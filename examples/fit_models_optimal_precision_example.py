@@ -53,45 +53,20 @@ def fit_all_models_and_precisions(dataset_string, signature='4/4', beat_subdivis
     # load encoded the dataset
     dataset = mf.dataio.load_encoded_dataset(data_folder + dataset_filename)
 
-    # model names
-    model_names = ['Bernoulli', 'Position', 'RefinedPosition',
-                   'Hierarchical', 'RefinedHierarchical']
-
-    # optimal models
-    optimal_models = []
-
     # precision grid of values
     precision_grid = [2**k for k in range(min_val, max_val+1)]
 
-    # for each model
-    for model_name in model_names:
-        ## resulting model (parameters may vary) for the given precisions
-        models = []
-
-        # for each precision
-        for precision in precision_grid:
-            # create model
-            model = mf.models.createModel(model_name, dataset, signature, beat_subdivisions,
-                                          d=precision)
-            # save model
-            models.append(model)
-
-        # description length for each model
-        dls = np.array([model.dl for model in models])
-
-        # create dictionary corresponding to current piece
-        dict_models = {"model": model_name, "description lengths": dls}
-
-        optimal_models.append(dict_models)
-
+    # fit all the models at once (the counts do not depend on the precision)
+    # and compute the description length for each precision
+    result = mf.models.fit_all(dataset, signature, beat_subdivisions, precisions=precision_grid)
 
     # plot the results
     plt.figure()
     grid_exp = range(min_val, max_val+1)
-    for ind, model_name in enumerate(model_names):
+    for ind, model_name in enumerate(result.model_names):
 
         # description lengths for model
-        description_lengths = optimal_models[ind]['description lengths']
+        description_lengths = result.dls[ind]
         # find index of the model with the minunim description length
         argmin = np.argmin(description_lengths)
 
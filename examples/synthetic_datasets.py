@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# pylint: disable=C0103
+'''
+    __  __ _____  _      ______ _____ _______
+   |  \/  |  __ \| |    |  ____|_   _|__   __|
+   | \  / | |  | | |    | |__    | |    | |
+   | |\/| | |  | | |    |  __|   | |    | |
+   | |  | | |__| | |____| |     _| |_   | |
+   |_|  |_|_____/|______|_|    |_____|  |_|
+
+ music encodind using minimum description length
+
+
+Synthetic datasets of random pieces, shared by the benchmarks.
+
+'''
+
+import numpy as np
+import mdlfit as mf
+
+
+def synthetic_dataset(num_measures, signature='4/4', beat_subdivisions=4, piece_measures=32,
+                      onsets_measure=None, piece_tempos=False, seed=0):
+    """Encoded dataset of random pieces, with an onset probability for each metric level.
+
+    Parameters
+    ----------
+    num_measures : int
+        total number of measures
+    signature : str
+        string denoting the time signature (e.g. 4/4, 2/4)
+    beat_subdivisions : int
+        number of (equal) subdivisions of each beat
+    piece_measures : int
+        number of measures of each piece (the last piece may be shorter)
+    onsets_measure : float or None
+        mean number of onsets per measure (whatever the resolution of the grid), if None the
+        probability of each level is proportional to the level
+    piece_tempos : bool
+        whether each piece has a random tempo, halving the probabilities below a random level
+    seed : int
+        seed of the random generator
+
+    Returns
+    -------
+    dataset : EncodedDataset
+        the encoded dataset
+    """
+
+    rng = np.random.default_rng(seed)
+    grid = mf.util.metric_grid(signature, beat_subdivisions)
+    levels = np.asarray(grid.levels)
+
+    # the higher the metric level, the more likely the onset
+    if onsets_measure is None:
+        probabilities = levels / (grid.num_levels + 1)
+    else:
+        # each level twice as likely, scaled to the mean number of onsets
+        weights = 2.0 ** levels
+        probabilities = np.minimum(onsets_measure * weights / np.sum(weights), 1)
+
+    # pieces of the same number of measures
+    offsets = np.append(np.arange(0, num_measures, piece_measures), num_measures)
+    num_pieces = offsets.shape[0] - 1
+
+    if piece_tempos:
+        # lower probabilities below a random level of each piece
+        lowest = rng.integers(1, grid.num_levels + 1, num_pieces)
+        piece_probabilities = np.where(levels < lowest[:, np.newaxis],
+                                       probabilities / 2, probabilities)
+        probabilities = np.repeat(piece_probabilities, np.diff(offsets), axis=0)
+    measures = (rng.random((num_measures, grid.beats_measure)) < probabilities).astype(np.uint8)
+
+    return mf.dataset.EncodedDataset(measures, offsets, ['synthetic'] * num_pieces,
+                                     [''] * num_pieces, [''] * num_pieces,
+                                     np.arange(num_pieces), np.zeros(num_pieces),
+                                     signature=signature, beat_subdivisions=beat_subdivisions)
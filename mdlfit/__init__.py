@@ -9,8 +9,13 @@ from .version import show_versions
 
 # And all the mdlfit sub-modules
 #from ._cache import cache
+from . import abcnotation
+from . import cache
 from . import dataio
+from . import dataset
+from . import ingest
 from . import models
+from . import musicxml
 from . import util
 
 # Exporting exception classes at the top level
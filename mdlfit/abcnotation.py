@@ -0,0 +1,1439 @@
+# encoding: utf-8
+# pylint: disable=C0103
+"""
+ABC notation
+============
+
+Native reader of ABC files
+--------------------------
+
+.. autosummary::
+    :toctree: generated/
+
+    read_tunes
+    split_tunes
+
+"""
+
+import math
+import re
+from fractions import Fraction
+
+__all__ = ['read_tunes', 'split_tunes']
+
+# kinds of tokens
+_METADATA = 'metadata'
+_BAR = 'bar'
+_TUPLET = 'tuplet'
+_BROKEN_RHYTHM = 'broken rhythm'
+_NOTE = 'note'
+_CHORD = 'chord'
+_GRACE_START = 'grace start'
+_GRACE_STOP = 'grace stop'
+_OTHER = 'other'
+
+# bar lines, in the order they are matched (as music21 does)
+_BARS = (':|1', ':|2', '|]', '||', '[|', '[1', '[2', '|1', '|2', ':|', '|:', '::', '|', ':')
+
+# bar lines replaced by two bar lines (the end and start of repeats or the start of an ending)
+_SPLIT_BARS = {'::': (':|', '|:'), '|1': ('|', '[1'), '|2': ('|', '[2'),
+               ':|1': (':|', '[1'), ':|2': (':|', '[2')}
+
+# regular bar lines (the ones that define measures)
+_REGULAR_BARS = ('|', '[1', '[2')
+
+# decorations and accidentals that may precede the pitch of a note
+_DECORATIONS = '.~^=_HLMOPSTuv'
+_ACCIDENTALS = '^=_'
+# letters that are not taken as the pitch of a note
+_NOT_PITCHES = '~wuvhHLTSN'
+
+# tokens that look like notes but are skipped (decorations and unsupported symbols)
+_SKIPPED_NOTES = frozenset(('w', 'u', 'v', 'v.', 'h', 'H', 'vk', 'uk', 'U', '~', '.', '=', 'V',
+                            'S', 's', 'i', 'I', 'ui', 'u.', 'Q', 'Hy', 'Hx', 'r', 'm', 'M',
+                            'n', 'N', 'o', 'O', 'P', 'l', 'L', 'R', 'y', 'T', 't', 'x', 'Z'))
+
+# dynamics that start or stop a spanner (the other ones are skipped)
+_DYNAMICS = ('!crescendo(!', '!crescendo)!', '!diminuendo(!', '!diminuendo)!')
+
+# pitch names, chord symbols, version and directives
+_PITCH_NAME = re.compile('[a-gA-Gz]')
+_CHORD_SYMBOL = re.compile('"[^"]*"')
+_VERSION = re.compile(r'^%abc-((\d+)\.(\d+)\.?(\d+)?)')
+_DIRECTIVE = re.compile(r'^%%([a-z\-]+)\s+([^\s]+)(.*)')
+
+# semitones of each step above C
+_STEP_SEMITONES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+
+# names and alterations of the accidentals (as music21 names them)
+_ACCIDENTAL_NAMES = {'': (None, 0), '#': ('sharp', 1), '##': ('double-sharp', 2),
+                     '###': ('triple-sharp', 3), '-': ('flat', -1), '--': ('double-flat', -2),
+                     '---': ('triple-flat', -3), 'n': ('natural', 0)}
+
+# pitch of the notes whose pitch cannot be read (music21 takes them as a C with no octave)
+_DEFAULT_PITCH = ('C', None, None, 60.0)
+
+# tonics of the keys (the longest ones first) and sharps added by each mode
+_KEY_NAMES = ('f#', 'g#', 'a#', 'bb', 'eb', 'd#', 'ab', 'e#', 'db', 'c#', 'gb', 'cb', 'hp',
+              'c', 'g', 'd', 'a', 'e', 'b', 'f')
+_MODES = (('dor', 'dorian'), ('phr', 'phrygian'), ('lyd', 'lydian'), ('mix', 'mixolydian'),
+          ('maj', 'major'), ('ion', 'ionian'), ('aeo', 'aeolian'), ('m', 'minor'))
+_MODE_SHARPS = {'major': 0, 'ionian': 0, 'minor': -3, 'aeolian': -3, 'dorian': -2,
+                'phrygian': -4, 'lydian': 1, 'mixolydian': -1, 'locrian': -5}
+_FIFTHS = ('F', 'C', 'G', 'D', 'A', 'E', 'B')
+# major keys of each number of sharps (to write the key of a tune)
+_MAJOR_KEYS = {-7: 'Cb', -6: 'Gb', -5: 'Db', -4: 'Ab', -3: 'Eb', -2: 'Bb', -1: 'F', 0: 'C',
+               1: 'G', 2: 'D', 3: 'A', 4: 'E', 5: 'B', 6: 'F#', 7: 'C#'}
+
+# actual and normal notes of each tuplet (None is the normal notes given by the meter)
+_TUPLETS = {'(1': (1, 1), '(2': (2, 3), '(3': (3, 2), '(4': (4, 3), '(5': (5, None),
+            '(6': (6, 2), '(7': (7, None), '(8': (8, 3), '(9': (9, None)}
+
+# meters tried by music21 for a measure split in 3/4 or 6/4 (in order of preference), and
+# the span and accents of the first level of each one
+_BEAT_CANDIDATES = {(3, 4): ((6, 8), (3, 4)), (6, 4): ((6, 4), (3, 2), (12, 8))}
+_ACCENTS = {
+    (3, 4): (Fraction(1, 4), tuple(Fraction(n, 8) for n in (8, 1, 2, 1, 4, 1, 2, 1, 4, 1, 2, 1))),
+    (6, 8): (Fraction(1, 4), tuple(Fraction(n, 8) for n in (8, 1, 2, 1, 2, 1, 4, 1, 2, 1, 2, 1))),
+    (6, 4): (Fraction(1, 2), tuple(Fraction(n, 8) for n in (8, 1, 2, 1, 2, 1, 4, 1, 2, 1, 2, 1))),
+    (12, 8): (Fraction(1, 2), tuple(Fraction(n, 8) for n in (8, 1, 1, 2, 1, 1, 4, 1, 1, 2, 1, 1))),
+    (3, 2): (Fraction(1, 2), tuple(Fraction(n, 8) for n in (8, 1, 2, 1, 4, 1, 2, 1, 4, 1, 2, 1))),
+}
+
+# broken rhythms, as the factors of the durations of the notes before and after the marker
+_BROKEN_RHYTHMS = {'>': (Fraction(3, 2), Fraction(1, 2)), '<': (Fraction(1, 2), Fraction(3, 2)),
+                   '>>': (Fraction(7, 4), Fraction(1, 4)), '<<': (Fraction(1, 4), Fraction(7, 4)),
+                   '>>>': (Fraction(15, 8), Fraction(1, 8)),
+                   '<<<': (Fraction(1, 8), Fraction(15, 8))}
+
+# durations that music21 can put in a tuplet (plain and dotted note types)
+_TUPLET_DURATIONS = frozenset(Fraction(2) ** power * dots for power in range(-10, 6)
+                              for dots in (1, Fraction(3, 2)))
+
+
+def read_tunes(filename):
+    """Read the title, measures and notes of the tunes of an ABC file, computing the offsets
+    of the notes as music21 does when it parses the file.
+
+    Parameters
+    ----------
+    filename : str
+        path of the ABC file (a single tune, or several tunes with reference numbers)
+
+    Returns
+    -------
+    tunes : list
+        list with a dictionary per tune, in the order of the reference numbers (as music21
+        gives them in an opus). Each dictionary has the title (None if not given) and time
+        signatures (sorted list of str) of the tune, the offset and duration of each measure,
+        and the measure, offset in the measure (including the padding of an incomplete
+        measure), duration and pitch of each note that is not in a chord (as Fractions and
+        floats), and the note sequence of the first voice (as given by dataio.note_sequence).
+        The tunes with features not handled by the reader are given instead as a dictionary
+        with the error and the source of the tune, to be parsed by music21 (None if the tune
+        cannot be parsed on its own, and music21 has to parse the whole file).
+
+    Raises
+    ------
+    ValueError
+        If the file has features not handled by the reader that concern all its tunes (or
+        that make music21 fail), and music21 has to be used to read it
+
+    Notes
+    -----
+    The file is tokenized as a whole (as music21 does), so the default note length, the key,
+    the meter and the pending tuplets carry over from one tune to the next. The notes take
+    the broken rhythms, tuplets and grace notes (with no duration) into account, the
+    incomplete first measure is padded as anacrusis if it has its own meter, and the
+    measures longer than the meter are split in two (the second one taking the meter that
+    fits it best, as music21 chooses it from the durations and beat strengths of its notes).
+    Tunes with several voices, clefs that transpose the notes, or measures split in a meter
+    with tuplets are given with an error.
+    """
+
+    with open(filename, encoding='utf-8') as file:
+        text = file.read()
+
+    # tokens of the file, with their context
+    tokenizer = _Tokenizer()
+    tokens = tokenizer.tokenize(text)
+    if not tokens:
+        raise ValueError("The file has no tokens.")
+    _process_tokens(tokens)
+    for token in tokens:
+        if token.kind is _NOTE or token.kind is _CHORD:
+            _parse_note(token)
+
+    # a single tune (it is not an opus)
+    first, bounds = _tune_bounds(tokens)
+    if bounds is None:
+        try:
+            return [_read_tune(tokens)]
+        except _SkippedTune:
+            raise ValueError("The tune cannot be read.")
+        except _TuneError as error:
+            return [{'error': str(error), 'source': None}]
+
+    header = tokens[:first]
+    tunes = []
+    for start, end in bounds:
+        try:
+            tunes.append(_read_tune(header + tokens[start:end]))
+        except _SkippedTune:
+            # music21 leaves out the tune
+            continue
+        except _TuneError as error:
+            tunes.append({'error': str(error),
+                          'source': tokenizer.source(tokens, first, start, end)})
+
+    return tunes
+
+
+def split_tunes(filename):
+    """Split an ABC file in tunes, reading their meters from their meter fields, with no need
+    to read their notes (e.g. to leave out the tunes not in a given meter).
+
+    Parameters
+    ----------
+    filename : str
+        path of the ABC file
+
+    Returns
+    -------
+    tunes : list
+        list with a dictionary per tune, in the same order as given by read_tunes, with the
+        meters of the tune (sorted list of str) and its source, that gives the same tune when
+        music21 parses it on its own (None if the tune cannot be parsed on its own). The time
+        signatures of a tune include its meters (music21 may add others, e.g. to split a
+        measure).
+
+    Raises
+    ------
+    ValueError
+        If the file has features not handled by the reader (as in read_tunes)
+    """
+
+    with open(filename, encoding='utf-8') as file:
+        text = file.read()
+
+    # tokens of the file (the notes are not read)
+    tokenizer = _Tokenizer()
+    tokens = tokenizer.tokenize(text)
+    if not tokens:
+        raise ValueError("The file has no tokens.")
+    _process_tokens(tokens)
+
+    # a single tune (it is not an opus)
+    first, bounds = _tune_bounds(tokens)
+    if bounds is None:
+        if any(token.kind is _METADATA and token.tag == 'V' and not token.data
+               for token in tokens):
+            raise ValueError("The tune cannot be read.")
+        return [{'meters': _tune_meters(tokens), 'source': None}]
+
+    header = tokens[:first]
+    tunes = []
+    for start, end in bounds:
+        tune = header + tokens[start:end]
+        # music21 leaves out the tune
+        if any(token.kind is _METADATA and token.tag == 'V' and not token.data
+               for token in tune):
+            continue
+        tunes.append({'meters': _tune_meters(tune),
+                      'source': tokenizer.source(tokens, first, start, end)})
+
+    return tunes
+
+
+def _tune_meters(tokens):
+    """Meters of a tune (sorted list of str), as music21 keeps them in its part (a measure only
+    keeps its last meter)."""
+
+    # measures, as in _read_tune
+    regular_bars = sum(1 for token in tokens
+                       if token.kind is _BAR and token.src in _REGULAR_BARS)
+    if regular_bars >= 2:
+        handlers = _merge_leading_metadata(_split_by_measure(tokens))
+    else:
+        handlers = [tokens]
+    use_measures = len(handlers) > 1
+
+    meters = set()
+    for handler in handlers:
+        in_measure = use_measures and any(token.kind is _NOTE or token.kind is _CHORD
+                                          for token in handler)
+        handler_meters = [_meter(token.data) for token in handler
+                          if token.kind is _METADATA and token.tag == 'M']
+        handler_meters = [meter for meter in handler_meters if meter is not None]
+        if in_measure:
+            handler_meters = handler_meters[-1:]
+        meters.update('%d/%d' % meter for meter in handler_meters)
+
+    return sorted(meters)
+
+
+def _tune_bounds(tokens):
+    """Position of the first reference number, and bounds (start, end) of the tokens of each
+    tune in the order of the reference numbers (None for a single tune, with no opus)."""
+
+    # reference numbers
+    references = [ind for ind, token in enumerate(tokens)
+                  if token.kind is _METADATA and token.tag == 'X']
+    if len(references) <= 1:
+        return None, None
+
+    # a repeated reference number replaces the previous tune
+    bounds = {}
+    for start, end in zip(references, references[1:] + [len(tokens)]):
+        bounds[int(tokens[start].data)] = (start, end)
+
+    return references[0], [bounds[number] for number in sorted(bounds)]
+
+
+class _TuneError(ValueError):
+    """A tune has features not handled by the reader (music21 has to parse it)."""
+
+
+class _SkippedTune(Exception):
+    """A tune is left out of the opus by music21."""
+
+
+class _Token:
+    """Token of an ABC file, with its kind, source and position in the file, and the
+    context of the notes and chords."""
+
+    def __init__(self, kind, src, start):
+
+        self.kind = kind
+        self.src = src
+        self.start = start
+        # tag and data of a metadata token
+        self.tag = None
+        self.data = None
+        # accidental carried in the measure (for notes)
+        self.carried = None
+        # context of the notes: default length, altered steps of the key, tuplet (actual and
+        # normal notes), whether it is a grace note and broken rhythm (marker, side)
+        self.default_length = None
+        self.key = None
+        self.tuplet = None
+        self.grace = False
+        self.broken = None
+        # parsed note: pitch (None for a rest), duration, chord symbols and inner notes of a
+        # chord, and the reason why its tune cannot be read
+        self.pitch = None
+        self.duration = None
+        self.chord_notes = False
+        self.error = None
+        # state of the tokenizer and context of the notes at a reference number, and whether
+        # its tune has tuplets before its meter
+        self.state = None
+        self.context = None
+        self.early_tuplet = False
+
+
+class _Tokenizer:
+    """Class to split an ABC file in tokens, as music21 does, keeping the state needed to
+    reproduce the context of a tune on its own (version, directives and pending symbols)."""
+
+    def __init__(self):
+
+        # version of the file (from its first comment) and directives
+        self.version = None
+        self.first_comment = None
+        self.directives = []
+        self.propagate = 'pitch'
+        # how accidentals are carried in a measure
+        self.propagation = 'not'
+        self.text = ''
+
+
+    def tokenize(self, text):
+        """Split a text in tokens.
+
+        Parameters
+        ----------
+        text : str
+            text to split
+
+        Returns
+        -------
+        tokens : list
+            list of tokens (_Token)
+        """
+
+        self.text = text
+        length = len(text)
+        tokens = []
+
+        # pending chord symbols and accidentals, pitch of the last note and accidentals
+        # carried in the measure
+        chord_symbol = ''
+        accidental = None
+        pitch = None
+        carried = {}
+        # last reference number (and whether its tune has set the pitch)
+        reference = None
+
+        pos = -1
+        skip = 0
+        while pos < length - 1:
+            pos += 1 + skip
+            skip = 0
+            if pos > length - 1:
+                break
+
+            c = text[pos]
+            c_next = text[pos + 1] if pos < length - 1 else None
+            c_next_next = text[pos + 2] if pos < length - 2 else None
+
+            # comments (and version and directives)
+            if c == '%':
+                end = _line_break(text, pos)
+                skip = end - (pos + 1)
+                self._comment(text[pos:end], pos)
+                continue
+
+            # metadata, until the end of the line
+            if (c_next == ':' and c_next_next is not None and c_next_next != '|' and
+                    (c == 'w' or (c.isalpha() and c.isupper()))):
+                end = _line_break(text, pos)
+                skip = end - (pos + 1)
+                token = _metadata_token(text[pos:end].strip(), pos)
+                if token.tag == 'X':
+                    token.state = [chord_symbol, accidental, pitch, dict(carried), False, True]
+                    reference = token
+                tokens.append(token)
+                continue
+
+            # bar lines
+            if not c.isspace() and not c.isalnum() and c not in '~(':
+                bar = None
+                for candidate in _BARS:
+                    if len(candidate) == 3:
+                        if c_next_next is not None and c + c_next + c_next_next == candidate:
+                            bar = candidate
+                            break
+                    elif c_next is not None and len(candidate) == 2:
+                        if c + c_next == candidate:
+                            bar = candidate
+                            break
+                    elif len(candidate) == 1 and c == candidate:
+                        bar = candidate
+                        break
+                if bar is not None:
+                    carried = {}
+                    accidental = None
+                    skip = len(bar) - 1
+                    for src in _SPLIT_BARS.get(bar, (bar,)):
+                        tokens.append(_Token(_BAR, src, pos))
+                    continue
+
+            # tuplets: (p, (p:q or (p:q:r
+            if c == '(' and c_next is not None and c_next.isdigit():
+                skip = 1
+                end = pos + 2
+                if end >= length:
+                    raise ValueError("Tuplet at the end of the file.")
+                if text[end] == ':':
+                    q_char = text[end + 1] if end + 1 < length else None
+                    end += 1
+                    skip += 1
+                    if q_char is not None and q_char.isdigit():
+                        end += 1
+                        skip += 1
+                    if end >= length:
+                        raise ValueError("Tuplet at the end of the file.")
+                    if text[end] == ':':
+                        r_char = text[end + 1] if end + 1 < length else None
+                        end += 1
+                        skip += 1
+                        if r_char is not None and r_char.isdigit():
+                            end += 1
+                            skip += 1
+                tokens.append(_Token(_TUPLET, text[pos:end], pos))
+                continue
+
+            # broken rhythms
+            if c in '<>':
+                end = pos + 1
+                while end < length - 1 and text[end] in '<>':
+                    end += 1
+                tokens.append(_Token(_BROKEN_RHYTHM, text[pos:end], pos))
+                skip = end - (pos + 1)
+                continue
+
+            # dynamics (only crescendos and diminuendos give tokens)
+            if c == '!':
+                end = pos + 1
+                while end < pos + 20 and end < length:
+                    if text[end] == '!':
+                        if text[pos:end + 1] in _DYNAMICS:
+                            tokens.append(_Token(_OTHER, c, pos))
+                        skip = end - pos
+                        break
+                    end += 1
+                continue
+
+            # slurs, ends of slurs and tuplets, and ties
+            if (c == '(' and c_next is not None) or c in ')-':
+                tokens.append(_Token(_OTHER, c, pos))
+                continue
+
+            # chord symbols (added to the next note or chord)
+            if c == '"':
+                end = pos + 1
+                while end < length - 1 and text[end] != '"':
+                    end += 1
+                end += 1
+                chord_symbol += text[pos:end]
+                skip = end - (pos + 1)
+                continue
+
+            # chords, with their length
+            if c == '[':
+                end = pos + 1
+                while end < length - 1 and text[end] != ']':
+                    end += 1
+                end += 1
+                while end < length and (text[end].isdigit() or text[end] == '/'):
+                    end += 1
+                tokens.append(_Token(_CHORD, chord_symbol + text[pos:end], pos))
+                chord_symbol = ''
+                skip = end - (pos + 1)
+                continue
+
+            # articulations and grace notes
+            if c in '.uvKkM':
+                tokens.append(_Token(_OTHER, c, pos))
+                continue
+            if c == '{':
+                tokens.append(_Token(_GRACE_START, c, pos))
+                continue
+            if c == '}':
+                tokens.append(_Token(_GRACE_STOP, c, pos))
+                continue
+
+            # notes: decorations, accidentals, pitch, octave and length
+            if c.isalpha() or c in '~^=_':
+                found_pitch = c.isalpha() and c not in _DECORATIONS
+                if found_pitch:
+                    pitch = c
+                    if reference is not None:
+                        reference.state[5] = False
+                if c in _ACCIDENTALS:
+                    accidental = c
+                end = pos + 1
+                try:
+                    while end <= length - 1:
+                        char = text[end]
+                        if not found_pitch and char in _DECORATIONS:
+                            end += 1
+                            if text[end] in _ACCIDENTALS:
+                                accidental += text[end]
+                            continue
+                        elif not found_pitch and char.isalpha() and char not in _NOT_PITCHES:
+                            found_pitch = True
+                            pitch = char
+                            if reference is not None:
+                                reference.state[5] = False
+                            end += 1
+                            continue
+                        elif char.isdigit() or char in ",/'":
+                            if char in ",'":
+                                if not found_pitch and reference is not None:
+                                    reference.state[4] = reference.state[4] or reference.state[5]
+                                pitch += char
+                            end += 1
+                            continue
+                        else:
+                            break
+                except (IndexError, TypeError):
+                    raise ValueError("Note not valid.")
+
+                src = chord_symbol + text[pos:end]
+                chord_symbol = ''
+                skip = end - (pos + 1)
+
+                if (src in _SKIPPED_NOTES or
+                        (src.startswith('"') and (src[-1] in 'uvkKQ.yTwhx' or
+                                                  src.endswith('v.'))) or
+                        src[0] in 'xHZ' or
+                        (len(src) > 1 and src[0] == '=' and src[1].isdigit())):
+                    continue
+
+                token = _Token(_NOTE, src, pos)
+                if pitch:
+                    if not found_pitch and reference is not None:
+                        # the pitch of a previous note is used
+                        reference.state[4] = reference.state[4] or reference.state[5]
+                    step = pitch[0].upper()
+                    if accidental:
+                        # remember the accidentals of the measure
+                        if self.propagation == 'octave':
+                            carried[pitch] = accidental
+                        elif self.propagation == 'pitch':
+                            carried[step] = accidental
+                        accidental = None
+                    elif self.propagation == 'pitch' and step in carried:
+                        token.carried = carried[step]
+                    elif self.propagation == 'octave' and pitch in carried:
+                        token.carried = carried[pitch]
+                tokens.append(token)
+                continue
+
+        return tokens
+
+
+    def _comment(self, line, pos):
+        """Read the version (in the first comment) and the directives of a comment."""
+
+        if self.first_comment is None:
+            self.first_comment = (pos, line)
+            match = _VERSION.match(line)
+            if match:
+                self.version = (int(match.group(2)), int(match.group(3)),
+                                int(match.group(4)) if match.group(4) else 0)
+
+        match = _DIRECTIVE.match(line)
+        if match:
+            self.directives.append((pos, line))
+            if match.group(1) == 'propagate-accidentals':
+                self.propagate = match.group(2)
+
+        # accidentals are carried in the measure from version 2.0 (by pitch by default)
+        if self.version is None or self.version < (2, 0, 0):
+            self.propagation = 'not'
+        else:
+            self.propagation = self.propagate
+
+
+    def source(self, tokens, first, start, end):
+        """Source of a tune that gives the same tune when music21 parses it on its own.
+
+        Parameters
+        ----------
+        tokens : list
+            tokens of the file
+        first : int
+            index of the first reference number
+        start : int
+            index of the reference number of the tune
+        end : int
+            index of the end of the tune
+
+        Returns
+        -------
+        source : str
+            source of the tune (with the header, version, directives, default length and key
+            of the file at the tune), None if the context of the tune cannot be reproduced
+        """
+
+        header = tokens[first]
+        tune = tokens[start]
+
+        # pending symbols of the tokenizer (the pitch only matters if the tune uses it)
+        if (tune.state[:2] != header.state[:2] or tune.state[3] != header.state[3] or
+                (tune.state[4] and tune.state[2] != header.state[2])):
+            return None
+        # pending tuplets and grace notes, or tuplets that take the meter of a previous tune
+        default_length, sharps, meter, pending = tune.context
+        if pending or header.context[3]:
+            return None
+        if tune.early_tuplet and meter != header.context[2]:
+            return None
+
+        text = self.text
+        header_end = header.start
+        tune_start = tune.start
+        tune_end = tokens[end].start if end < len(tokens) else len(text)
+
+        lines = []
+        # first comment (it gives the version) if it is not in the header
+        if self.first_comment is not None and header_end <= self.first_comment[0] < tune_start:
+            lines.append(self.first_comment[1])
+        lines.append(text[:header_end])
+        # directives of the previous tunes
+        lines.extend(line for pos, line in self.directives if header_end <= pos < tune_start)
+        # default length and key of the previous tunes
+        if default_length is not None:
+            length = default_length / 4
+            lines.append('L:%d/%d' % (length.numerator, length.denominator))
+        if sharps is not None:
+            lines.append('K:' + _MAJOR_KEYS[max(-7, min(7, sharps))])
+        lines.append(text[tune_start:tune_end])
+
+        return '\n'.join(lines)
+
+
+def _line_break(text, pos):
+    """Position of the next line break after a position (the end of the text if none)."""
+
+    end = text.find('\n', pos + 1)
+
+    return len(text) if end == -1 else end
+
+
+def _metadata_token(src, pos):
+    """Metadata token, with its tag and data (without comments)."""
+
+    token = _Token(_METADATA, src, pos)
+    stripped = src.split('%')[0] if '%' in src else src
+    token.tag = stripped[:1]
+    token.data = stripped[2:].strip()
+
+    return token
+
+
+def _process_tokens(tokens):
+    """Give the notes and chords their context (default length, key, tuplets, grace notes and
+    broken rhythms), as music21 does, and keep the context at each reference number."""
+
+    default_length = None
+    key = None
+    sharps = None
+    meter = None
+    # last tuplet [actual notes, normal notes, notes left]
+    tuplet = None
+    grace = False
+    # last reference number (and whether its tune has a meter)
+    reference = None
+    meter_read = False
+
+    key_cache = {}
+
+    for ind, token in enumerate(tokens):
+        kind = token.kind
+
+        if kind is _METADATA:
+            tag = token.tag
+            if tag == 'M':
+                meter = _meter(token.data)
+                meter_read = True
+            if tag == 'L' or (tag == 'M' and default_length is None):
+                default_length = _default_length(token)
+            elif tag == 'K':
+                if token.data not in key_cache:
+                    key_cache[token.data] = _key(token.data)
+                sharps, key = key_cache[token.data]
+            elif tag == 'Q':
+                _check_tempo(token.data)
+            if tag == 'X':
+                token.context = (default_length, sharps, meter,
+                                 tuplet is not None and tuplet[2] > 0 or grace)
+                token.early_tuplet = False
+                reference = token
+                meter_read = False
+            continue
+
+        if kind is _BROKEN_RHYTHM:
+            before = tokens[ind - 1] if ind > 0 else None
+            after = tokens[ind + 1] if ind < len(tokens) - 1 else None
+            if (before is not None and after is not None and
+                    (before.kind is _NOTE or before.kind is _CHORD) and
+                    (after.kind is _NOTE or after.kind is _CHORD)):
+                before.broken = (token.src.strip(), 0)
+                after.broken = (token.src.strip(), 1)
+
+        elif kind is _TUPLET:
+            tuplet = _tuplet(token.src, meter)
+            if reference is not None and not meter_read:
+                reference.early_tuplet = True
+
+        elif kind is _GRACE_START:
+            grace = True
+
+        elif kind is _GRACE_STOP:
+            grace = False
+
+        elif kind is _NOTE or kind is _CHORD:
+            if default_length is None:
+                raise ValueError("No default note length.")
+            token.default_length = default_length
+            token.key = key
+            token.grace = grace
+            if tuplet is not None:
+                if tuplet[2] == 0:
+                    tuplet = None
+                else:
+                    tuplet[2] -= 1
+                    token.tuplet = (tuplet[0], tuplet[1])
+
+
+def _meter(data):
+    """Meter (beats, beat type) of a meter field (None for no meter)."""
+
+    if data.lower() == 'none':
+        return None
+    if data == 'C':
+        return (4, 4)
+    if data == 'C|':
+        return (2, 2)
+
+    numerator, denominator = data.split('/')
+    numerator = int(''.join(char for char in numerator if char in '0123456789'))
+    denominator = int(''.join(char for char in denominator if char in '0123456789'))
+    if numerator < 1 or denominator not in (1, 2, 4, 8, 16, 32, 64, 128):
+        raise ValueError("Meter not supported.")
+
+    return (numerator, denominator)
+
+
+def _default_length(token):
+    """Default note length of a length or meter field (in quarter notes)."""
+
+    if token.tag == 'L' and '/' in token.data:
+        numerator, denominator = token.data.split('/')
+        numerator = int(numerator.strip())
+        # the length 1/G is found in some Essen files (music21 takes it as 1/4)
+        denominator = 4 if denominator == 'G' else int(denominator.strip())
+        if denominator == 0:
+            raise ValueError("Default note length not valid.")
+        return Fraction(4 * numerator, denominator)
+
+    if token.tag == 'M':
+        meter = _meter(token.data)
+        if meter is None:
+            return Fraction(1, 2)
+        # sixteenth notes for meters shorter than 3/4, eighth notes for the others
+        return Fraction(1, 4) if Fraction(*meter) < Fraction(3, 4) else Fraction(1, 2)
+
+    raise ValueError("Default note length not valid.")
+
+
+def _key(data):
+    """Sharps and altered steps (as a dictionary of accidentals) of a key field."""
+
+    tonic = 'C'
+    remain = ''
+    for name in _KEY_NAMES:
+        if name == data[:len(name)].lower():
+            tonic = data[:len(name)]
+            remain = data[len(name):]
+            break
+    # b is a flat in the tonic
+    if len(tonic) > 1 and tonic[1] == 'b':
+        tonic = tonic[0] + '-'
+
+    remain = remain.strip()
+    if remain == '':
+        mode = 'major'
+    else:
+        mode = None
+        for prefix, name in _MODES:
+            if remain.lower().startswith(prefix):
+                mode = name
+                break
+
+    # highland pipes
+    if tonic == 'HP':
+        tonic, mode = 'C', None
+    elif tonic == 'Hp':
+        tonic, mode = 'D', None
+
+    if tonic[0].upper() not in _FIFTHS or tonic[1:] not in ('', '#', '-'):
+        raise ValueError("Key not supported.")
+
+    sharps = _FIFTHS.index(tonic[0].upper()) - 1
+    sharps += {'': 0, '#': 7, '-': -7}[tonic[1:]]
+    sharps += _MODE_SHARPS.get(mode, 0)
+
+    # each altered step takes a single accidental (as music21 finds it in the key)
+    if sharps >= 0:
+        key = {step: '#' for step in _FIFTHS[:sharps]}
+    else:
+        key = {step: '-' for step in _FIFTHS[::-1][:-sharps]}
+
+    return sharps, key
+
+
+def _normal_notes(meter):
+    """Normal notes of the tuplets of 5, 7 and 9 notes in a meter (3 in compound meters)."""
+
+    if meter is None:
+        return 2
+    if meter[0] == 1:
+        raise ValueError("Tuplets in a meter of one beat are not supported.")
+
+    return 3 if meter[0] in (6, 9, 12, 15, 18) else 2
+
+
+def _tuplet(src, meter):
+    """Actual notes, normal notes and number of notes of a tuplet."""
+
+    parts = src.strip().split(':')
+
+    try:
+        actual, normal = _TUPLETS[parts[0]]
+    except KeyError:
+        raise ValueError("Tuplet not supported.")
+    if normal is None:
+        normal = _normal_notes(meter)
+    else:
+        # the meter is checked for every tuplet (as music21 does)
+        _normal_notes(meter)
+
+    if len(parts) >= 2 and parts[1] != '':
+        normal = int(parts[1])
+    count = int(parts[2]) if len(parts) >= 3 and parts[2] != '' else actual
+    if normal == 0:
+        raise ValueError("Tuplet not supported.")
+
+    return [actual, normal, count]
+
+
+def _check_tempo(data):
+    """Check that music21 can read a tempo field (it fails on the file otherwise)."""
+
+    text = None
+    if '"' in data:
+        text = []
+        other = []
+        is_open = False
+        for char in data:
+            if char == '"':
+                is_open = not is_open
+            elif is_open:
+                text.append(char)
+            else:
+                other.append(char)
+        other = ''.join(other).strip()
+    else:
+        other = data.strip()
+
+    number = None
+    if other:
+        try:
+            if '=' in other:
+                durations, number = other.split('=')
+                number = float(number)
+                for duration in durations.split(' '):
+                    if '/' in duration:
+                        numerator, denominator = duration.split('/')
+                        _ = float(numerator) / float(denominator)
+            else:
+                number = float(other)
+        except (ValueError, ZeroDivisionError):
+            raise ValueError("Tempo not valid.")
+
+    if text is None and number is None:
+        raise ValueError("Tempo not valid.")
+
+
+def _parse_note(token):
+    """Read the pitch and duration of a note, or the duration of a chord."""
+
+    src = token.src
+
+    # chord symbols
+    if '"' in src:
+        symbols = list(_CHORD_SYMBOL.finditer(src))
+        if not symbols:
+            raise ValueError("Chord symbol not valid.")
+        src = src[symbols[-1].end():]
+
+    if token.kind is _NOTE:
+        token.pitch = _pitch(src, token.carried, token.key)
+        token.duration = _duration(src, token.default_length, token.broken)
+        if token.pitch is not None and token.pitch is not _DEFAULT_PITCH:
+            octave = token.pitch[2]
+            if octave < 0 or octave > 9:
+                token.error = "Octave not supported."
+    else:
+        # length of the chord, and notes in the chord (on their own, with no context)
+        try:
+            end = src.index(']')
+        except ValueError:
+            raise ValueError("Chord not valid.")
+        outer = _duration(src[end + 1:], Fraction(1), token.broken)
+        inner = None
+        for note in _Tokenizer().tokenize(src[1:end]):
+            if note.kind is _CHORD:
+                raise ValueError("Chord not valid.")
+            if note.kind is not _NOTE:
+                continue
+            note_src = note.src
+            if '"' in note_src:
+                symbols = list(_CHORD_SYMBOL.finditer(note_src))
+                if not symbols:
+                    raise ValueError("Chord symbol not valid.")
+                note_src = note_src[symbols[-1].end():]
+            if _pitch(note_src, None, token.key) is None:
+                continue
+            # the length of the chord is the one of its first note
+            duration = _duration(note_src, token.default_length, None)
+            token.chord_notes = True
+            if not inner:
+                inner = duration
+        token.duration = outer * (inner or 0)
+
+    # music21 only puts plain and dotted durations in a tuplet
+    if token.tuplet is not None:
+        if token.duration not in _TUPLET_DURATIONS:
+            token.error = "Tuplet duration not supported."
+        else:
+            token.duration = token.duration * token.tuplet[1] / token.tuplet[0]
+    elif token.kind is _NOTE and token.duration == 0 and not token.grace:
+        token.error = "Notes with no duration are not supported."
+
+
+def _pitch(src, carried, key):
+    """Pitch of a note (step, accidental name, octave and pitch space value), None for a rest."""
+
+    # articulations that may be read with the pitch
+    if len(src) > 1 and src[0] in 'uT':
+        src = src[1:]
+    src = src.replace('T', '')
+
+    match = _PITCH_NAME.search(src)
+    if match is None:
+        return _DEFAULT_PITCH
+    name = match.group()
+    if name == 'z':
+        return None
+
+    octave = (5 if name.islower() else 4) - src.count(',') + src.count("'")
+    accidental = '-' * src.count('_') + '#' * src.count('^') + 'n' * src.count('=')
+    step = name.upper()
+
+    if carried:
+        if accidental:
+            # music21 cannot read the note (and takes it as a C)
+            return _DEFAULT_PITCH
+        accidental = '-' * carried.count('_') + '#' * carried.count('^') + 'n' * carried.count('=')
+    elif not accidental and key is not None:
+        accidental = key.get(step, '')
+
+    try:
+        accidental_name, alter = _ACCIDENTAL_NAMES[accidental]
+    except KeyError:
+        raise ValueError("Accidental not supported.")
+
+    return (step, accidental_name, octave,
+            float((octave + 1) * 12 + _STEP_SEMITONES[step] + alter))
+
+
+def _duration(src, default_length, broken):
+    """Duration of a note (in quarter notes) from its length and broken rhythm."""
+
+    numbers = ''.join(char for char in src if char.isdigit() or char == '/').strip()
+
+    try:
+        if numbers == '':
+            duration = default_length
+        elif numbers == '/':
+            duration = default_length / 2
+        elif numbers == '//':
+            duration = default_length / 4
+        elif numbers == '///':
+            duration = default_length / 8
+        elif numbers.startswith('/'):
+            duration = default_length / int(numbers.split('/')[1])
+        elif numbers.endswith('/'):
+            duration = default_length * int(numbers.split('/')[0].strip()) / 2
+        elif numbers.count('/') == 2:
+            # music21 takes it as a quarter note
+            duration = Fraction(1)
+        elif '/' in numbers:
+            numerator, denominator = numbers.split('/')
+            duration = default_length * int(numerator.strip()) / int(denominator.strip())
+        else:
+            duration = default_length * int(numbers)
+    except (ValueError, ZeroDivisionError):
+        raise ValueError("Note length not valid.")
+
+    if broken is not None:
+        marker, side = broken
+        if marker in _BROKEN_RHYTHMS:
+            duration = duration * _BROKEN_RHYTHMS[marker][side]
+
+    return duration
+
+
+def _read_tune(tokens):
+    """Read the measures and notes of the first voice of a tune, as music21 builds its part.
+
+    Parameters
+    ----------
+    tokens : list
+        tokens of the tune (with the header of the file)
+
+    Returns
+    -------
+    tune : dict
+        dictionary of the tune (see read_tunes)
+
+    Raises
+    ------
+    _TuneError
+        If the tune has features not handled by the reader
+    _SkippedTune
+        If music21 leaves out the tune
+    """
+
+    # title (the first one)
+    title = None
+    voices = 0
+    for token in tokens:
+        if token.kind is _METADATA:
+            if token.tag == 'T' and title is None:
+                title = token.data
+            elif token.tag == 'V':
+                if not token.data:
+                    raise _SkippedTune()
+                if token.data[0].isdigit():
+                    voices += 1
+    if voices > 1:
+        raise _TuneError("Tunes with several voices are not supported.")
+
+    # measures, defined by (at least two) regular bar lines
+    regular_bars = sum(1 for token in tokens
+                       if token.kind is _BAR and token.src in _REGULAR_BARS)
+    if regular_bars >= 2:
+        handlers = _merge_leading_metadata(_split_by_measure(tokens))
+    else:
+        handlers = [tokens]
+    use_measures = len(handlers) > 1
+
+    time_signatures = set()
+    # measures as [offset, duration, padding, own meter, notes, rhythm], and notes of the part
+    measures = []
+    part_notes = []
+    part_offset = Fraction(0)
+
+    for handler in handlers:
+        in_measure = use_measures and any(token.kind is _NOTE or token.kind is _CHORD
+                                          for token in handler)
+
+        position = Fraction(0)
+        measure_meter = None
+        # notes, and position, duration and kind of the notes, rests and chords (True for
+        # notes and chords, False for rests and None for chord symbols)
+        notes = []
+        rhythm = []
+        for token in handler:
+            kind = token.kind
+            if kind is _METADATA:
+                if token.tag == 'M':
+                    meter = _meter(token.data)
+                    if meter is not None:
+                        if in_measure:
+                            measure_meter = meter
+                        else:
+                            time_signatures.add('%d/%d' % meter)
+                elif token.tag == 'K':
+                    data = token.data.lower()
+                    if '-8va' in data or 'bass' in data:
+                        raise _TuneError("Clefs that transpose the notes are not supported.")
+            elif kind is _NOTE or kind is _CHORD:
+                # chord symbols (that music21 may keep, with no duration)
+                if '"' in token.src:
+                    rhythm.append((position, Fraction(0), None))
+                if kind is _CHORD and not token.chord_notes:
+                    continue
+                if token.error is not None:
+                    raise _TuneError(token.error)
+                duration = Fraction(0) if token.grace else token.duration
+                if kind is _NOTE and token.pitch is not None:
+                    notes.append((position, duration, token.pitch))
+                rhythm.append((position, duration, kind is _CHORD or token.pitch is not None))
+                position += duration
+
+        if in_measure:
+            padding = Fraction(0)
+            if measure_meter is not None:
+                time_signatures.add('%d/%d' % measure_meter)
+                bar = Fraction(4 * measure_meter[0], measure_meter[1])
+                # the first measure is padded as anacrusis
+                if not measures and position < bar:
+                    padding = bar - position
+            measures.append([part_offset, position, padding, measure_meter, notes, rhythm])
+            part_offset += position
+        else:
+            part_notes.extend(notes)
+
+    # measures longer than the meter are split in two
+    if measures and measures[0][3] is not None:
+        measures = _split_measures(measures, time_signatures)
+
+    # summary of the measures and notes
+    measure_offset = []
+    measure_duration = []
+    note_measure = []
+    note_offset = []
+    note_duration = []
+    note_pitch = []
+    note_sequence = []
+
+    for ind_measure, (offset, duration, padding, _, notes, _) in enumerate(measures):
+        measure_offset.append(offset)
+        measure_duration.append(duration)
+        for note_position, note_length, (step, accidental, octave, pitch_space) in notes:
+            note_measure.append(ind_measure)
+            note_offset.append(note_position + padding)
+            note_duration.append(float(note_length))
+            note_pitch.append(pitch_space)
+            note_sequence.append((note_length, step, accidental, octave, 0.0))
+
+    for _, note_length, (step, accidental, octave, _) in part_notes:
+        note_sequence.append((note_length, step, accidental, octave, 0.0))
+
+    return {"title": title,
+            "time_signatures": sorted(time_signatures),
+            "measure_offset": measure_offset,
+            "measure_duration": measure_duration,
+            "note_measure": note_measure,
+            "note_offset": note_offset,
+            "note_duration": note_duration,
+            "note_pitch": note_pitch,
+            "note_sequence": tuple(note_sequence)}
+
+
+def _split_by_measure(tokens):
+    """Split the tokens of a tune in measures (at bar lines, and at the metadata before a note
+    or chord), leaving out the bar lines."""
+
+    last = len(tokens) - 1
+
+    # positions of the bar lines (and of the metadata before notes)
+    positions = [ind for ind, token in enumerate(tokens)
+                 if token.kind is _BAR or
+                 (token.kind is _METADATA and ind < last and
+                  (tokens[ind + 1].kind is _NOTE or tokens[ind + 1].kind is _CHORD))]
+
+    # boundaries of the measures (consecutive positions do not make a measure)
+    bounds = [(0, positions[0])]
+    start = positions[0]
+    for position in positions[1:]:
+        if position == start + 1:
+            start = position
+            continue
+        bounds.append((start, position))
+        start = position
+    if start != last:
+        bounds.append((start, last))
+
+    handlers = []
+    for start, end in bounds:
+        first = start
+        if tokens[start].kind is _BAR or (start != 0 and tokens[start].kind is _METADATA):
+            first = start + 1
+        if tokens[end].kind is _BAR:
+            end -= 1
+        elif tokens[end].kind is not _METADATA and not (
+                (tokens[end].kind is _NOTE or tokens[end].kind is _CHORD) and end == last):
+            end -= 1
+        handler = tokens[first:end + 1]
+        if handler:
+            handlers.append(handler)
+
+    return handlers
+
+
+def _merge_leading_metadata(handlers):
+    """Merge the measures with no notes (only metadata) with the next one."""
+
+    has_notes = [any(token.kind is _NOTE or token.kind is _CHORD for token in handler)
+                 for handler in handlers]
+
+    # a single measure with notes does not make measures
+    if sum(has_notes) <= 1:
+        return [[token for handler in handlers for token in handler]]
+
+    merged = []
+    ind = 0
+    while ind < len(handlers):
+        if not has_notes[ind] and ind != len(handlers) - 1:
+            merged.append(handlers[ind] + handlers[ind + 1])
+            ind += 2
+        else:
+            merged.append(handlers[ind])
+            ind += 1
+
+    return merged
+
+
+def _split_measures(measures, time_signatures):
+    """Split the measures longer than the meter in two (as music21 re-bars a part), adding
+    the meters of the second measures that are not a whole bar."""
+
+    split = []
+    meter = None
+
+    for ind, measure in enumerate(measures):
+        split.append(measure)
+        offset, duration, padding, measure_meter, notes, rhythm = measure
+        if measure_meter is not None:
+            meter = measure_meter
+        bar = Fraction(4 * meter[0], meter[1])
+        if duration <= bar:
+            continue
+
+        # notes (and rests and chords) across the bar line are split in two, the ones after
+        # it are moved to the second measure
+        first_notes, second_notes = _split_notes(notes, bar)
+        first_rhythm, second_rhythm = _split_notes(rhythm, bar)
+
+        # the second measure takes the best fitting meter if it is not a whole bar (and the
+        # next measure takes the meter back)
+        second_meter = None
+        if duration - bar != bar:
+            second_meter = _best_meter(duration - bar, second_rhythm)
+            time_signatures.add('%d/%d' % second_meter)
+            if ind + 1 < len(measures) and measures[ind + 1][3] is None:
+                measures[ind + 1][3] = meter
+
+        split[-1] = [offset, bar, padding, measure_meter, first_notes, first_rhythm]
+        split.append([offset + bar, duration - bar, Fraction(0), second_meter, second_notes,
+                      second_rhythm])
+
+    return split
+
+
+def _split_notes(notes, bar):
+    """Split notes (position, duration, ...) at a bar line, as music21 splits a measure."""
+
+    first = []
+    second = []
+    for note in notes:
+        position, length = note[:2]
+        end = position + length
+        if position < bar < end:
+            first.append((position, bar - position) + note[2:])
+            second.append((Fraction(0), end - bar) + note[2:])
+        elif position > bar or (position == bar and length > 0):
+            second.append((position - bar, length) + note[2:])
+        else:
+            first.append(note)
+
+    return first, second
+
+
+def _best_meter(duration, rhythm):
+    """Meter that music21 gives to a measure (as meter.bestTimeSignature does), from its
+    duration and the positions, durations and kinds of its notes, rests and chords."""
+
+    if not _is_binary(duration):
+        raise _TuneError("Measures split in a meter with tuplets are not supported.")
+
+    # shortest duration (with no tuplets), and its dots
+    shortest = Fraction(4)
+    dots = 0
+    for _, length, _ in rhythm:
+        if length and length < shortest and _is_binary(length):
+            shortest = length
+            dots = _dots(length)
+
+    # shortest duration that divides the measure (at least a 128th note)
+    limit = Fraction(1, 32)
+    count = 10
+    while count > 0:
+        if duration % shortest == 0 or shortest <= limit:
+            break
+        shortest = _divide_dotted(shortest, dots)
+        count -= 1
+    # and that is a note type
+    count = 10
+    while count > 0:
+        if shortest < limit:
+            shortest = limit
+            break
+        if _is_power_of_two(shortest) or shortest < 2 * limit:
+            break
+        shortest = _divide_dotted(shortest, dots)
+        count -= 1
+    if not _is_power_of_two(shortest):
+        raise _TuneError("Measures split in a meter with no note type are not supported.")
+    denominator = int(4 / shortest)
+
+    # numerator as the number of shortest durations (halving them if needed)
+    multiplier = 1
+    numerator = 0
+    while count > 0:
+        numerator = multiplier * duration / shortest
+        if numerator.denominator == 1:
+            break
+        multiplier *= 2
+        count -= 1
+    numerator = int(numerator)
+    denominator *= multiplier
+    if numerator == 0:
+        raise _TuneError("Measures split in an empty meter are not supported.")
+    divisor = math.gcd(numerator, denominator)
+    numerator //= divisor
+    denominator //= divisor
+
+    # simplest terms
+    if numerator == denominator and numerator not in (2, 4):
+        numerator, denominator = 4, 4
+    elif numerator != denominator and denominator == 1:
+        numerator, denominator = numerator * 4, denominator * 4
+    elif numerator != denominator and denominator == 2:
+        numerator, denominator = numerator * 2, denominator * 2
+
+    # music21 chooses between meters of the same duration from the beat strengths of the
+    # notes (keeping the first of the strongest ones)
+    candidates = _BEAT_CANDIDATES.get((numerator, denominator))
+    if candidates is not None:
+        if any(kind is None for _, _, kind in rhythm):
+            raise _TuneError("Measures split in a meter with chord symbols are not supported.")
+        positions = [position for position, _, kind in rhythm if kind]
+        strengths = [_beat_strength(candidate, duration, positions) for candidate in candidates]
+        return candidates[strengths.index(max(strengths))]
+
+    return (numerator, denominator)
+
+
+def _beat_strength(meter, duration, positions):
+    """Average beat strength of notes in a meter (as music21 TimeSignature.averageBeatStrength
+    does, with the accents of the first level of the meter)."""
+
+    if not positions:
+        return Fraction(0)
+
+    # accents of the spans of the first level, and half of the lowest one elsewhere
+    span, accents = _ACCENTS[meter]
+    total = Fraction(0)
+    for position in positions:
+        position = position % duration
+        if position % span:
+            total += Fraction(1, 16)
+        else:
+            total += accents[int(position / span)]
+
+    return total / len(positions)
+
+
+def _is_binary(value):
+    """Whether a duration has no tuplets (its denominator is a power of two)."""
+
+    return value.denominator & (value.denominator - 1) == 0
+
+
+def _is_power_of_two(value):
+    """Whether a duration is a power of two (a note type with no dots)."""
+
+    return (_is_binary(value) and value.numerator & (value.numerator - 1) == 0)
+
+
+def _dots(length):
+    """Number of dots of a duration (None if it is not a dotted note type)."""
+
+    for dots in range(4):
+        base = length / (2 - Fraction(1, 2 ** dots))
+        if base.numerator & (base.numerator - 1) == 0 and _is_binary(base):
+            return dots
+
+    return None
+
+
+def _divide_dotted(length, dots):
+    """Next shorter duration tried by music21 to divide a measure."""
+
+    if dots is None:
+        raise _TuneError("Measures split in a meter with complex durations are not supported.")
+    shorter = length / (2 * (2 - Fraction(1, 2 ** dots)))
+    if not _is_binary(shorter):
+        raise _TuneError("Measures split in a meter with tuplets are not supported.")
+
+    return shorter
@@ -0,0 +1,357 @@
+# encoding: utf-8
+# pylint: disable=C0103
+"""
+Cache
+=====
+
+Persistent cache of parsed music files
+--------------------------------------
+
+.. autosummary::
+    :toctree: generated/
+
+    ParseCache
+
+"""
+
+import os
+import glob
+import json
+import shutil
+import hashlib
+import numpy as np
+
+__all__ = ['ParseCache']
+
+# file of the index of meters of the files
+_METER_INDEX = 'meters.json'
+
+
+class ParseCache:
+    """Class to represent an on-disk cache of parsed music files.
+
+    Each entry holds the summaries of the scores of a file (dictionaries of numpy arrays and
+    plain values) and is addressed by the hash of the content of the file and the version of the
+    parser, so that modified files, or files parsed with another version, are parsed again.
+    The least recently used entries are removed when the cache exceeds its maximum size.
+
+    The cache also keeps an index of the meters (time signatures) of the scores of each file,
+    addressed by the path, size and modification time of the file, so that the files that
+    cannot be encoded with a given time signature are left out without opening them.
+
+    Attributes
+    ----------
+    directory : str
+        path of the directory of the cache
+    max_size : int
+        maximum size of the cache in bytes
+
+    Methods
+    -------
+    key(path, version)
+        Key of the entry of a file
+    get(key)
+        Summaries of the scores of an entry
+    put(key, summaries)
+        Save the summaries of the scores of a file
+    invalidate(path)
+        Remove the entries of a file
+    clear()
+        Remove all the entries
+    evict()
+        Remove the least recently used entries above the maximum size
+    get_meters(path)
+        Meters of the scores of a file kept in the index
+    put_meters(path, meters)
+        Keep the meters of the scores of a file in the index
+    save_meters()
+        Save the index of meters
+
+    """
+
+    def __init__(self, directory, max_size=2**29):
+
+        # directory of the cache
+        self.directory = directory
+        # maximum size in bytes
+        self.max_size = max_size
+        # index of meters of the files (loaded when first used) and whether it has changed
+        self._meters = None
+        self._meters_changed = False
+
+        os.makedirs(directory, exist_ok=True)
+
+
+    def key(self, path, version=''):
+        """Key of the entry of a file, given by its content and the version of the parser.
+
+        Parameters
+        ----------
+        path : str
+            path of the file
+        version : str
+            version of the parser
+
+        Returns
+        -------
+        key : str
+            hexadecimal digests of the content and of the version
+        """
+
+        return (_file_digest(path) + '_' +
+                hashlib.sha256(version.encode('utf-8')).hexdigest()[:16])
+
+
+    def get(self, key):
+        """Summaries of the scores of an entry.
+
+        Parameters
+        ----------
+        key : str
+            key of the entry
+
+        Returns
+        -------
+        summaries : list or None
+            list of dictionaries (one per score), None if the entry is not in the cache
+        """
+
+        filename = self._filename(key)
+
+        try:
+            with open(filename, 'rb') as entry_file:
+                entry = np.load(entry_file, allow_pickle=False)
+                summaries = _unpack(entry)
+        except (OSError, ValueError, KeyError):
+            # missing (or incomplete) entry
+            return None
+
+        # mark the entry as recently used
+        try:
+            os.utime(filename)
+        except OSError:
+            pass
+
+        return summaries
+
+
+    def put(self, key, summaries):
+        """Save the summaries of the scores of a file.
+
+        Parameters
+        ----------
+        key : str
+            key of the entry
+        summaries : list
+            list of dictionaries (one per score) of numpy arrays and plain (json) values
+        """
+
+        filename = self._filename(key)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        # write to a temporary file and rename it, so that entries are complete
+        # even if several processes write them at the same time
+        temp_filename = filename + '.%d.tmp' % os.getpid()
+        with open(temp_filename, 'wb') as entry_file:
+            np.savez(entry_file, **_pack(summaries))
+        os.replace(temp_filename, filename)
+
+
+    def invalidate(self, path):
+        """Remove the entries of a file (for any version of the parser).
+
+        Parameters
+        ----------
+        path : str
+            path of the file
+        """
+
+        digest = _file_digest(path)
+        for filename in glob.glob(os.path.join(self.directory, digest[:2], digest + '_*.npz')):
+            os.remove(filename)
+
+
+    def clear(self):
+        """Remove all the entries.
+        """
+
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+        self._meters = None
+        self._meters_changed = False
+
+
+    def size(self):
+        """Size of the cache in bytes.
+        """
+
+        return sum(os.path.getsize(filename) for filename in self._entries())
+
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is not above its maximum size.
+        """
+
+        # entries sorted from the least to the most recently used
+        entries = sorted((os.stat(filename).st_mtime, os.path.getsize(filename), filename)
+                         for filename in self._entries())
+        size = sum(entry[1] for entry in entries)
+
+        for _, entry_size, filename in entries:
+            if size <= self.max_size:
+                break
+            os.remove(filename)
+            size -= entry_size
+
+
+    def get_meters(self, path):
+        """Meters of the scores of a file kept in the index, if the file has not changed.
+
+        Parameters
+        ----------
+        path : str
+            path of the file
+
+        Returns
+        -------
+        meters : list or None
+            list with the meters (list of str) of each score of the file, None if the file is
+            not in the index or it has changed (its size or modification time)
+        """
+
+        entry = self._meter_index().get(os.path.abspath(path))
+        if entry is None:
+            return None
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime_ns:
+            return None
+
+        return entry['meters']
+
+
+    def put_meters(self, path, meters):
+        """Keep the meters of the scores of a file in the index (saved by save_meters).
+
+        Parameters
+        ----------
+        path : str
+            path of the file
+        meters : list
+            list with the meters (list of str) of each score of the file
+        """
+
+        stat = os.stat(path)
+        self._meter_index()[os.path.abspath(path)] = {'size': stat.st_size,
+                                                      'mtime': stat.st_mtime_ns,
+                                                      'meters': meters}
+        self._meters_changed = True
+
+
+    def save_meters(self):
+        """Save the index of meters (if it has changed).
+        """
+
+        if not self._meters_changed:
+            return
+
+        # write to a temporary file and rename it, so that the index is complete
+        filename = os.path.join(self.directory, _METER_INDEX)
+        temp_filename = filename + '.%d.tmp' % os.getpid()
+        with open(temp_filename, 'w') as index_file:
+            json.dump(self._meters, index_file)
+        os.replace(temp_filename, filename)
+        self._meters_changed = False
+
+
+    def _meter_index(self):
+        """Index of meters by path (loaded from its file when first used)"""
+
+        if self._meters is None:
+            try:
+                with open(os.path.join(self.directory, _METER_INDEX)) as index_file:
+                    self._meters = json.load(index_file)
+            except (OSError, ValueError):
+                # missing (or incomplete) index
+                self._meters = {}
+
+        return self._meters
+
+
+    def __getstate__(self):
+        # the index of meters is only used by the process that reads the files
+        state = self.__dict__.copy()
+        state['_meters'] = None
+        state['_meters_changed'] = False
+        return state
+
+
+    def _filename(self, key):
+        """Path of the file of an entry"""
+        return os.path.join(self.directory, key[:2], key + '.npz')
+
+
+    def _entries(self):
+        """Paths of the files of all the entries"""
+        return glob.glob(os.path.join(self.directory, '*', '*.npz'))
+
+
+    def __repr__(self):
+        return "ParseCache(directory=%r, max_size=%d)" % (self.directory, self.max_size)
+
+
+def _file_digest(path):
+    """Hexadecimal digest of the content of a file"""
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as input_file:
+        for chunk in iter(lambda: input_file.read(1 << 20), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _pack(summaries):
+    """Arrays of a list of summaries, concatenated over the scores, and their metadata as json"""
+
+    # fields given by arrays (the same for all the summaries)
+    fields = sorted(key for key, value in summaries[0].items()
+                    if isinstance(value, np.ndarray)) if summaries else []
+
+    arrays = {}
+    for field in fields:
+        arrays[field] = np.concatenate([summary[field] for summary in summaries])
+        # offsets of each score in the concatenated array
+        arrays[field + '.offsets'] = np.cumsum([0] + [len(summary[field])
+                                                      for summary in summaries])
+
+    # the rest of the fields
+    metadata = [{key: value for key, value in summary.items() if key not in fields}
+                for summary in summaries]
+    arrays['metadata'] = np.array(json.dumps({'fields': fields, 'scores': metadata}))
+
+    return arrays
+
+
+def _unpack(entry):
+    """List of summaries from the arrays saved by _pack"""
+
+    metadata = json.loads(str(entry['metadata']))
+
+    # read each array once (they are read from the file at each access)
+    arrays = {field: (entry[field], entry[field + '.offsets']) for field in metadata['fields']}
+
+    summaries = []
+    for ind, summary in enumerate(metadata['scores']):
+        for field, (array, offsets) in arrays.items():
+            summary[field] = array[offsets[ind]:offsets[ind+1]]
+        summaries.append(summary)
+
+    return summaries
@@ -16,15 +16,66 @@ Reading and writing annotations
 
 import os
 import glob
+import contextlib
+import hashlib
+import json
 import warnings
 import pickle
+import shutil
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+from functools import partial
+from itertools import repeat
 import numpy as np
-import music21
-
-__all__ = ['encode_dataset', 'load_encoded_dataset', 'save_encoded_dataset']
-
-
-def encode_dataset(dataset_string, file_ext='xml', signature='4/4', beat_subdivisions=2):
+# music21 is imported by the functions that parse the files (it takes long to import, and
+# it is not needed to load the encoded datasets)
+from .cache import ParseCache
+from .dataset import EncodedDataset
+from . import abcnotation
+from . import ingest
+from . import musicxml
+from . import util
+
+__all__ = ['encode_dataset', 'iter_encode_dataset', 'load_encoded_dataset',
+           'save_encoded_dataset', 'convert_encoded_dataset', 'DatasetWriter']
+
+# on-disk format of the encoded datasets
+_FORMAT_NAME = 'mdlfit-encoded-dataset'
+_FORMAT_VERSION = 1
+_MEASURES_FILE = 'measures.npy'
+_OFFSETS_FILE = 'offsets.npy'
+_METADATA_FILE = 'metadata.json'
+
+# version of the parsed scores (summaries) kept in the parse cache (with the version of
+# music21, see _summary_version)
+_SUMMARY_VERSION = 'music21 %s, summary 1'
+_NATIVE_SUMMARY_VERSION = 'musicxml reader 1, abc reader 1, ' + _SUMMARY_VERSION
+
+# parsers of the music files
+_PARSERS = ('music21', 'native', 'compare')
+
+# extensions of the files read by the native MusicXML and ABC readers
+_NATIVE_EXTENSIONS = ('.xml', '.musicxml')
+_ABC_EXTENSIONS = ('.abc',)
+
+# articles moved from the end to the front of the titles (those of music21.text, in all its
+# languages, see _prepend_article)
+_TITLE_ARTICLES = frozenset([
+    'al-', 'the', 'a', 'an', 'der', 'die', 'das', 'des', 'dem', 'den', 'ein', 'eine', 'einer',
+    'einem', 'einen', 'de', 'het', "'t", 'een', 'el', 'la', 'los', 'las', 'un', 'una', 'unos',
+    'unas', 'o', 'os', 'as', 'um', 'uma', 'uns', 'umas', 'le', 'les', "l'", 'une', 'du', 'de la',
+    'il', 'lo', 'i', 'gli', "un'", 'uno', 'del', 'dello', 'della', 'dei', 'degli', 'delle'])
+
+# unit of the note offsets computed at once (music21 gives as floats the offsets whose
+# denominator is a power of two, see _offset_fractions)
+_OFFSET_SCALE = 2**20
+
+
+def encode_dataset(dataset_string, file_ext='xml', signature='4/4', beat_subdivisions=2,
+                   n_jobs=1, cache=None, configurations=None, parser='music21', timeout=None,
+                   max_memory=None, quarantine=None, callback=None, verbose=True):
     """Load and encode a symbolic music dataset either from a folder with music files (xml) or from
     the datasets provided by music21. If a valid directory is given as `dataset_string` then the
     dataset is built from the files in the directory. If not `dataset_string` is not valid
@@ -42,19 +93,104 @@ def encode_dataset(dataset_string, file_ext='xml', signature='4/4', beat_subdivi
         Only pieces with that time signature (exclusively) will be encoded.
     beat_subdivisions : int
         number of (equal) subdivisions of each beat.
+    n_jobs : int or None
+        number of worker processes used to parse and encode the files
+        (1 to process them serially, None or -1 to use all the available CPUs).
+    cache : str or ParseCache, optional
+        directory (or cache) where the parsed files are kept, so that unchanged files are
+        not parsed again (e.g. to encode with another signature or beat_subdivisions), with
+        an index of the meters of the files, so that the files with no piece in the given
+        signatures are not opened again
+    configurations : list of tuples, optional
+        list of (signature, beat_subdivisions) to encode the dataset with. Each file is parsed
+        once and encoded with every configuration (signature and beat_subdivisions are ignored).
+    parser : str
+        parser of the music files: 'music21', 'native' to read the MusicXML and ABC files
+        with the (much faster) native readers, falling back to music21 for the files (or
+        tunes) they cannot read, or 'compare' to read them with both and check that they
+        give the same encoding.
+    timeout : float, optional
+        maximum time (in seconds) to parse and encode each file. If given (or max_memory is),
+        each file is processed in an isolated worker process, terminated when it is exceeded.
+    max_memory : int, optional
+        maximum memory (in bytes) of the worker process parsing and encoding each file
+        (only in Unix systems)
+    quarantine : str or Quarantine, optional
+        manifest (or its path) where the files that could not be encoded are recorded, with
+        their error and elapsed time. The files in the manifest are skipped in later runs,
+        unless it is created with retry=True (see mdlfit.ingest.Quarantine).
+    callback : callable, optional
+        function called as callback(event) after each file is processed, with a dictionary
+        with the path of the file, its status, the times to parse and encode it, the outcome
+        of each of its scores (accepted, wrong meter, multiple meters or duplicate) and the
+        number of onsets out of the grid (see mdlfit.ingest.format_event). Use
+        callback=stats.add to gather the statistics of the files in a
+        mdlfit.ingest.IngestStats (totals, percentiles of the times and files per second).
+    verbose : bool
+        whether to print the event of each file and the statistics of the files at the end
+        (False for a quiet mode, with no output)
 
     Returns
     -------
-    dataset : list
-        list of dictionaries, each one corresponds to a piece
+    dataset : EncodedDataset or dict
+        encoded dataset, iterating over it gives a dictionary for each piece.
+        If configurations are given, dictionary of encoded datasets by (signature,
+        beat_subdivisions).
 
     Examples
     --------
 
     Load the tango dataset included in the mdlfit package.
     Load a dataset from the ones included in musi21.
+
+    Encode a dataset with several time signatures and subdivisions from a single parse.
+
+    >>> datasets = encode_dataset('airdsAirs', configurations=[('2/4', 2), ('4/4', 2),
+    ...                                                        ('4/4', 4)])
+    >>> datasets[('4/4', 4)]
+
+    Encode the tango dataset reading the MusicXML files with the native reader.
+
+    >>> dataset = encode_dataset('../data/tango_songbook/', parser='native')
+
+    Encode a folk corpus of music21 reading the ABC files with the native reader.
+
+    >>> dataset = encode_dataset('essenFolksong', parser='native')
+
+    Encode a corpus giving up on the files that take more than a minute (or 2GB) to parse,
+    and skipping them in later runs.
+
+    >>> dataset = encode_dataset('essenFolksong', n_jobs=4, timeout=60, max_memory=2**31,
+    ...                          quarantine='essen_quarantine.json')
+
+    Encode a corpus with no output, gathering the statistics of the files.
+
+    >>> stats = mdlfit.ingest.IngestStats()
+    >>> dataset = encode_dataset('essenFolksong', parser='native', callback=stats.add,
+    ...                          verbose=False)
+    >>> stats.percentiles('parse_time')
+
+    Notes
+    -----
+    The meters of each file are read first (from the meter fields of ABC files and the
+    <time> elements of MusicXML files), and the files (or the ABC tunes, parsed on their own
+    by music21) that cannot have a single time signature of the given signatures are not
+    parsed. This does not change the encoded dataset.
+
+    A file that cannot be encoded (it raises an exception, or exceeds the timeout or the
+    memory limit) gives no pieces and does not stop the encoding of the rest (except with
+    the 'compare' parser, where a difference between the parsers raises an exception).
+    The number of files encoded, skipped and failed, the outcomes of the scores, the
+    percentiles of the times and the throughput are printed at the end (if verbose).
     """
 
+    # several encodings from a single parse of each file
+    if configurations is not None:
+        return _encode_configurations(dataset_string, file_ext, configurations, n_jobs, cache,
+                                      parser, timeout=timeout, max_memory=max_memory,
+                                      quarantine=quarantine,
+                                      callback=callback, verbose=verbose)
+
     # check if dataset_string is a directory
     if os.path.isdir(dataset_string):
 
@@ -62,222 +198,1495 @@ def encode_dataset(dataset_string, file_ext='xml', signature='4/4', beat_subdivi
         dataset = encode_dataset_folder(dataset_string,
                                         file_ext=file_ext,
                                         signature=signature,
-                                        beat_subdivisions=beat_subdivisions)
+                                        beat_subdivisions=beat_subdivisions,
+                                        n_jobs=n_jobs, cache=cache, parser=parser,
+                                        timeout=timeout, max_memory=max_memory,
+                                        quarantine=quarantine,
+                                        callback=callback, verbose=verbose)
     else:
         # if not a folder we assume it is a dataset name as in music21
         dataset = encode_dataset_music21(dataset_string,
                                          signature=signature,
-                                         beat_subdivisions=beat_subdivisions)
+                                         beat_subdivisions=beat_subdivisions,
+                                         n_jobs=n_jobs, cache=cache, parser=parser,
+                                         timeout=timeout, max_memory=max_memory,
+                                         quarantine=quarantine,
+                                         callback=callback, verbose=verbose)
 
 
     return dataset
 
 
-def encode_dataset_music21(dataset_name, signature='4/4', beat_subdivisions=2):
+def encode_dataset_music21(dataset_name, signature='4/4', beat_subdivisions=2, n_jobs=1,
+                           cache=None, parser='music21', timeout=None, max_memory=None,
+                           quarantine=None, callback=None, verbose=True):
     """Load a dataset provided by music21
 
     Parameters
     ----------
     dataset_name : str
         name of the dataset in music21
+    signature : str
+        string denoting the time signature to consider.
+        Only pieces with that time signature (exclusively) will be encoded.
+    beat_subdivisions : int
+        number of (equal) subdivisions of each beat.
+    n_jobs : int or None
+        number of worker processes used to parse and encode the files
+        (1 to process them serially, None or -1 to use all the available CPUs).
+    cache : str or ParseCache, optional
+        directory (or cache) where the parsed files are kept, so that unchanged files are
+        not parsed again
+    parser : str
+        parser of the music files ('music21', 'native' or 'compare', see encode_dataset)
+    timeout : float, optional
+        maximum time (in seconds) to parse and encode each file (see encode_dataset)
+    max_memory : int, optional
+        maximum memory (in bytes) to parse and encode each file (see encode_dataset)
+    quarantine : str or Quarantine, optional
+        manifest (or its path) of the files that could not be encoded (see encode_dataset)
+    callback : callable, optional
+        function called with the event of each file (see encode_dataset)
+    verbose : bool
+        whether to print the event of each file and the statistics at the end
+
+    Returns
+    -------
+    dataset : EncodedDataset
+        encoded dataset, iterating over it gives a dictionary for each piece
+
+    Notes
+    -----
+    The files are parsed and encoded in the worker processes, which only send back the encoded
+    measures (and the fingerprints used to remove duplicates). The resulting dataset is the
+    same regardless of the number of processes.
+    """
+
+    # parse and encode each piece, removing duplicates
+    pieces = (piece for _, piece in
+              _iter_encode_music21(dataset_name, [(signature, beat_subdivisions)], n_jobs,
+                                   cache, parser, timeout=timeout, max_memory=max_memory,
+                                   quarantine=quarantine,
+                                   callback=callback, verbose=verbose))
+
+    # store all the measures in a single matrix
+    dataset = EncodedDataset.from_pieces(pieces, signature=signature,
+                                         beat_subdivisions=beat_subdivisions,
+                                         beats_measure=_beats_measure(signature,
+                                                                      beat_subdivisions))
+
+    return dataset
+
+
+def iter_encode_dataset(dataset_string, file_ext='xml', signature='4/4', beat_subdivisions=2,
+                        n_jobs=1, cache=None, configurations=None, parser='music21',
+                        timeout=None, max_memory=None, quarantine=None,
+                        callback=None, verbose=True):
+    """Encode a symbolic music dataset (as encode_dataset) giving the pieces one by one, as
+    each file is parsed. Only the measures of the pieces are kept, so that the memory used does
+    not grow with the size of the corpus (see DatasetWriter to save the pieces to disk).
+
+    Parameters
+    ----------
+    dataset_string : str
+        name (including path) of the dataset's folder or name of the dataset as defined in music21
     file_ext : str
-        file extension of the dataset's files
+        file extension of the dataset's files (only valid when loading dataset from directory)
     signature : str
         string denoting the time signature to consider.
         Only pieces with that time signature (exclusively) will be encoded.
     beat_subdivisions : int
         number of (equal) subdivisions of each beat.
+    n_jobs : int or None
+        number of worker processes used to parse and encode the files
+        (1 to process them serially, None or -1 to use all the available CPUs).
+    cache : str or ParseCache, optional
+        directory (or cache) where the parsed files are kept
+    configurations : list of tuples, optional
+        list of (signature, beat_subdivisions) to encode the dataset with, parsing each
+        file once (signature and beat_subdivisions are ignored)
+    parser : str
+        parser of the music files ('music21', 'native' or 'compare', see encode_dataset)
+    timeout : float, optional
+        maximum time (in seconds) to parse and encode each file (see encode_dataset)
+    max_memory : int, optional
+        maximum memory (in bytes) to parse and encode each file (see encode_dataset)
+    quarantine : str or Quarantine, optional
+        manifest (or its path) of the files that could not be encoded (see encode_dataset)
+    callback : callable, optional
+        function called with the event of each file (see encode_dataset)
+    verbose : bool
+        whether to print the event of each file and the statistics at the end
+
+    Yields
+    ------
+    piece : dict
+        dictionary of an encoded piece, in the same order as in encode_dataset.
+        If configurations are given, tuples ((signature, beat_subdivisions), piece).
+    """
+
+    # encode with the given signature and subdivisions only
+    if configurations is None:
+        for _, piece in iter_encode_dataset(dataset_string, file_ext, n_jobs=n_jobs, cache=cache,
+                                            configurations=[(signature, beat_subdivisions)],
+                                            parser=parser, timeout=timeout,
+                                            max_memory=max_memory, quarantine=quarantine,
+                                            callback=callback, verbose=verbose):
+            yield piece
+        return
+
+    configurations = _configurations(configurations)
+
+    # check if dataset_string is a directory
+    if os.path.isdir(dataset_string):
+        yield from _iter_encode_folder(dataset_string, file_ext, configurations, n_jobs, cache,
+                                       parser, timeout=timeout, max_memory=max_memory,
+                                       quarantine=quarantine,
+                                       callback=callback, verbose=verbose)
+    else:
+        # if not a folder we assume it is a dataset name as in music21
+        yield from _iter_encode_music21(dataset_string, configurations, n_jobs, cache, parser,
+                                        timeout=timeout, max_memory=max_memory,
+                                        quarantine=quarantine,
+                                        callback=callback, verbose=verbose)
+
+
+def _encode_configurations(dataset_string, file_ext, configurations, n_jobs=1, cache=None,
+                           parser='music21', timeout=None, max_memory=None, quarantine=None,
+                           callback=None, verbose=True):
+    """Encode a symbolic music dataset with several configurations, parsing each file once.
+
+    Parameters
+    ----------
+    dataset_string : str
+        name (including path) of the dataset's folder or name of the dataset as defined in music21
+    file_ext : str
+        file extension of the dataset's files (only valid when loading dataset from directory)
+    configurations : list of tuples
+        list of (signature, beat_subdivisions) to encode the dataset with
+    n_jobs : int or None
+        number of worker processes used to parse and encode the files
+    cache : str or ParseCache, optional
+        directory (or cache) where the parsed files are kept
+    parser : str
+        parser of the music files ('music21', 'native' or 'compare', see encode_dataset)
+    timeout : float, optional
+        maximum time (in seconds) to parse and encode each file (see encode_dataset)
+    max_memory : int, optional
+        maximum memory (in bytes) to parse and encode each file (see encode_dataset)
+    quarantine : str or Quarantine, optional
+        manifest (or its path) of the files that could not be encoded (see encode_dataset)
+    callback : callable, optional
+        function called with the event of each file (see encode_dataset)
+    verbose : bool
+        whether to print the event of each file and the statistics at the end
+
+    Returns
+    -------
+    datasets : dict
+        encoded dataset of each configuration, by (signature, beat_subdivisions)
+    """
+
+    configurations = _configurations(configurations)
+
+    # encoded pieces of each configuration
+    pieces = {configuration: [] for configuration in configurations}
+    for configuration, piece in iter_encode_dataset(dataset_string, file_ext, n_jobs=n_jobs,
+                                                    cache=cache,
+                                                    configurations=configurations,
+                                                    parser=parser, timeout=timeout,
+                                                    max_memory=max_memory,
+                                                    quarantine=quarantine,
+                                                    callback=callback, verbose=verbose):
+        pieces[configuration].append(piece)
+
+    # store the measures of each configuration in a single matrix
+    return {(signature, beat_subdivisions): EncodedDataset.from_pieces(
+                pieces[(signature, beat_subdivisions)], signature=signature,
+                beat_subdivisions=beat_subdivisions,
+                beats_measure=_beats_measure(signature, beat_subdivisions))
+            for signature, beat_subdivisions in configurations}
+
+
+def _iter_encode_music21(dataset_name, configurations, n_jobs=1, cache=None,
+                         parser='music21', timeout=None, max_memory=None, quarantine=None,
+                         callback=None, verbose=True):
+    """Encode the pieces of a dataset provided by music21, one by one, removing duplicates
+    on the fly (the first occurrence of each piece is kept, as in remove_duplicates).
+
+    Parameters
+    ----------
+    dataset_name : str
+        name of the dataset in music21
+    configurations : list of tuples
+        list of (signature, beat_subdivisions) to encode the pieces with
+    n_jobs : int or None
+        number of worker processes used to parse and encode the files
+    cache : str or ParseCache, optional
+        directory (or cache) where the parsed files are kept
+    parser : str
+        parser of the music files ('music21', 'native' or 'compare', see encode_dataset)
+    timeout : float, optional
+        maximum time (in seconds) to parse and encode each file (see encode_dataset)
+    max_memory : int, optional
+        maximum memory (in bytes) to parse and encode each file (see encode_dataset)
+    quarantine : str or Quarantine, optional
+        manifest (or its path) of the files that could not be encoded (see encode_dataset)
+    callback : callable, optional
+        function called with the event of each file (see encode_dataset)
+    verbose : bool
+        whether to print the event of each file and the statistics at the end
+
+    Yields
+    ------
+    configuration : tuple
+        (signature, beat_subdivisions) of the encoded piece
+    piece : dict
+        dictionary of an encoded piece
+    """
+
+    import music21
+
+    # check the parser before parsing any file
+    _check_parser(parser)
+
+    # get muic21 corpus from corpus name
+    corpus = music21.corpus.getComposer(dataset_name)
+
+    # opus paths
+    opus_paths = list(corpus)
+
+    # number of measures and fingerprint of the pieces given so far (to remove duplicates)
+    seen = {configuration: set() for configuration in configurations}
+
+    # index of the piece
+    ind_piece = 0
+
+    # cache of parsed files
+    cache = _parse_cache(cache)
+
+    # statistics of the files
+    stats = ingest.IngestStats()
+
+    # parse and encode each opus (in parallel if n_jobs is not 1), in the order of the corpus
+    encoded_paths = _encode_paths(partial(_encode_path, cache=cache, parser=parser),
+                                  opus_paths, configurations, n_jobs, cache, parser,
+                                  timeout=timeout, max_memory=max_memory, quarantine=quarantine,
+                                  verbose=verbose)
+
+    # we now process each part/piece in the dataset
+    for ind_file, (encoded_scores, event) in enumerate(encoded_paths):
+        path = event['path']
+        # outcome of each score and onsets out of grid
+        event.update(ind_file=ind_file, outcomes=[], off_grid=0)
+
+        # for each score in the opus
+        for ind_score, title, encodings, piece_fingerprint, meters, off_grid in encoded_scores:
+            # whether the score is given in some configuration
+            accepted = False
+            # for each configuration
+            for configuration, piece_measures in zip(configurations, encodings):
+                # check if the piece was encoded (i.e. it has the given time signature)
+                # and it is not a duplicate of a previous one
+                if (piece_measures is not None and
+                        (len(piece_measures), piece_fingerprint) not in seen[configuration]):
+                    seen[configuration].add((len(piece_measures), piece_fingerprint))
+                    accepted = True
+
+                    # dictionary corresponding to current piece
+                    yield configuration, {"dataset": dataset_name, "ind_piece": ind_piece,
+                                          "title": title, "path": path,
+                                          "ind_score": ind_score, "measures": piece_measures}
+
+            event['outcomes'].append(_score_outcome(meters, encodings, accepted))
+            event['off_grid'] += off_grid
+
+            # increment piece index
+            ind_piece += 1
+
+        _report_event(event, stats, callback, verbose)
+
+    # keep the size of the cache bounded
+    if cache is not None:
+        cache.evict()
+
+    # totals, throughput and failures
+    stats.stop()
+    if verbose:
+        print(stats.report())
+
+
+def _map_paths(function, paths, configurations, n_jobs=1, timeout=None, max_memory=None,
+               catch=True):
+    """Apply an encoding function to each path, serially, in a pool of processes, or in
+    isolated worker processes (if a timeout or a memory limit is given).
+    The outcomes are yielded in the same order as the paths.
+
+    Parameters
+    ----------
+    function : callable
+        function called as function(path, configurations)
+    paths : list
+        list of paths of the files to process
+    configurations : list of tuples
+        list of (signature, beat_subdivisions) to encode the files with
+    n_jobs : int or None
+        number of worker processes (1 to process them serially, None or -1 to use all the CPUs).
+    timeout : float, optional
+        maximum time (in seconds) to process each path (see ingest.map_isolated)
+    max_memory : int, optional
+        maximum memory (in bytes) of each worker process (see ingest.map_isolated)
+    catch : bool
+        whether to give the exceptions raised by the function as errors (otherwise they are
+        raised)
+
+    Returns
+    -------
+    outcomes : generator
+        tuple (result, error, elapsed) for each path, with the result of the function (None if
+        it failed), the error (str, None if it did not fail) and the elapsed time (in seconds)
+    """
+
+    # number of processes
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count()
+
+    if timeout is not None or max_memory is not None:
+        # process each path in an isolated worker (terminated if it exceeds the limits)
+        outcomes = ingest.map_isolated(partial(function, configurations=configurations), paths,
+                                       n_jobs, timeout, max_memory)
+        for result, error, elapsed in outcomes:
+            if error is not None and not catch:
+                raise RuntimeError(error)
+            yield result, error, elapsed
+    elif n_jobs == 1:
+        # process the paths serially
+        for path in paths:
+            yield _timed_call(function, path, configurations, catch)
+    else:
+        # process the paths in a pool of processes (outcomes are given in order)
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            yield from executor.map(_timed_call, repeat(function), paths, repeat(configurations),
+                                    repeat(catch))
+
+
+def _timed_call(function, path, configurations, catch=True):
+    """Outcome (result, error, elapsed) of function(path, configurations), see _map_paths"""
+
+    start = time.perf_counter()
+    try:
+        result = function(path, configurations)
+    except Exception as error:  # pylint: disable=broad-except
+        if not catch:
+            raise
+        return None, "%s: %s" % (type(error).__name__, error), time.perf_counter() - start
+
+    return result, None, time.perf_counter() - start
+
+
+def _encode_path(path, configurations, cache=None, parser='music21'):
+    """Parse a music file and encode the first part of each score it contains.
+
+    Parameters
+    ----------
+    path : str
+        path of the file to parse (it can give an Opus or a Score)
+    configurations : list of tuples
+        list of (signature, beat_subdivisions) to encode the scores with.
+        Only pieces with the signature (exclusively) will be encoded.
+    cache : ParseCache, optional
+        cache of parsed files
+    parser : str
+        parser of the music files ('music21', 'native' or 'compare', see encode_dataset)
+
+    Returns
+    -------
+    encoded_scores : list
+        list of tuples (ind_score, title, encodings, fingerprint, meters, off_grid) for each
+        score in the file, encodings is the list of measures of each configuration (None if
+        the piece has not its time signature), fingerprint is None if the piece is not
+        encoded, meters are the time signatures of the piece (list of str) and off_grid is
+        the number of onsets out of the grid
+    times : dict
+        time (in seconds) to read the meters and parse the file (or read it from the cache)
+        as 'parse_time', and to encode the scores as 'encode_time' (with the times of each
+        parser as 'music21_time' and 'native_time' if they are compared)
+    """
+
+    start = time.perf_counter()
+    # times of each parser, if they are compared
+    times = {}
+
+    # meters of the scores, read with no need to parse the file (the comparison of the
+    # parsers reads all the files)
+    meters, sources = _read_meters(path) if parser != 'compare' else (None, None)
+
+    # leave out the file if no score can be encoded
+    skipped_scores = _skipped_scores(meters, configurations)
+    if skipped_scores is not None:
+        return skipped_scores, {'parse_time': time.perf_counter() - start, 'encode_time': 0.0}
+
+    # music21 only parses the tunes that may be encoded (if they can be parsed on their own)
+    tune_sources = None
+    if sources is not None and parser == 'music21':
+        candidates = [ind_score for ind_score, score_meters in enumerate(meters)
+                      if _may_encode(score_meters, configurations)]
+        if (len(candidates) < len(meters) and
+                all(sources[ind_score] is not None for ind_score in candidates)):
+            tune_sources = {ind_score: sources[ind_score] for ind_score in candidates}
+
+    # encoded scores, by their index (the tunes that are not parsed are not encoded)
+    encoded_scores = {}
+    if tune_sources is not None:
+        encoded_scores = {ind_score: (ind_score, None, [None] * len(configurations), None,
+                                      score_meters, 0)
+                          for ind_score, score_meters in enumerate(meters)}
+
+    # scores in the file (parsed or from the cache)
+    summaries = _load_summaries(path, cache, parser, tune_sources, times=times)
+    times['parse_time'] = time.perf_counter() - start
+
+    for summary in summaries:
+        # encode the score and get its fingerprint (to remove duplicates)
+        title, encodings, piece_fingerprint, off_grid = _encode_summary(summary, configurations,
+                                                                        with_fingerprint=True)
+
+        encoded_scores[summary['ind_score']] = (summary['ind_score'], title, encodings,
+                                                piece_fingerprint,
+                                                list(summary['time_signatures']), off_grid)
+
+    times['encode_time'] = time.perf_counter() - start - times['parse_time']
+
+    return [encoded_scores[ind_score] for ind_score in sorted(encoded_scores)], times
+
+
+def _encode_file(filename, configurations, cache=None, parser='music21'):
+    """Parse a music file (with a single score) and encode its first part.
+
+    Parameters
+    ----------
+    filename : str
+        path of the file to parse
+    configurations : list of tuples
+        list of (signature, beat_subdivisions) to encode the score with.
+        Only pieces with the signature (exclusively) will be encoded.
+    cache : ParseCache, optional
+        cache of parsed files
+    parser : str
+        parser of the music files ('music21', 'native' or 'compare', see encode_dataset)
+
+    Returns
+    -------
+    encoded_scores : list
+        list with a tuple (ind_score, title, encodings, fingerprint, meters, off_grid) for the
+        score (as given by _encode_path, with no fingerprint), empty if the file has not given
+        a score
+    times : dict
+        times to parse and encode the file (as given by _encode_path)
+    """
+
+    start = time.perf_counter()
+    # times of each parser, if they are compared
+    times = {}
+
+    # leave out the file (with no need to parse it) if the score cannot be encoded
+    if parser != 'compare':
+        skipped_scores = _skipped_scores(_read_meters(filename)[0], configurations)
+        if skipped_scores is not None:
+            return skipped_scores, {'parse_time': time.perf_counter() - start,
+                                    'encode_time': 0.0}
+
+    # parse the file (or get it from the cache)
+    summaries = _load_summaries(filename, cache, parser, times=times)
+    times['parse_time'] = time.perf_counter() - start
+
+    # nothing to encode if the file has not given a score
+    if not summaries:
+        times['encode_time'] = 0.0
+        return [], times
+
+    # encode the score
+    title, encodings, _, off_grid = _encode_summary(summaries[0], configurations)
+    times['encode_time'] = time.perf_counter() - start - times['parse_time']
+
+    return [(0, title, encodings, None, list(summaries[0]['time_signatures']), off_grid)], times
+
+
+def _encode_paths(function, paths, configurations, n_jobs=1, cache=None, parser='music21',
+                  timeout=None, max_memory=None, quarantine=None, verbose=True):
+    """Encode each path (as _map_paths does), leaving out the files whose scores cannot be
+    encoded as known by the index of meters of the cache, and keeping the meters of the
+    other files in the index. The files that cannot be encoded give no scores, and they are
+    recorded in the quarantine (the quarantined files are left out).
+
+    Parameters
+    ----------
+    function : callable
+        function called as function(path, configurations), giving the encoded scores of the
+        file and the times to parse and encode it (as _encode_path)
+    paths : list
+        list of paths of the files to process
+    configurations : list of tuples
+        list of (signature, beat_subdivisions) to encode the files with
+    n_jobs : int or None
+        number of worker processes (1 to process them serially, None or -1 to use all the CPUs)
+    cache : ParseCache, optional
+        cache of parsed files (with the index of meters)
+    parser : str
+        parser of the music files ('music21', 'native' or 'compare', see encode_dataset)
+    timeout : float, optional
+        maximum time (in seconds) to process each file (see _map_paths)
+    max_memory : int, optional
+        maximum memory (in bytes) to process each file (see _map_paths)
+    quarantine : str or Quarantine, optional
+        manifest (or its path) of the files that could not be encoded
+    verbose : bool
+        whether to show the warnings (and the console messages of music21) given while
+        processing the files
+
+    Returns
+    -------
+    results : generator
+        tuple (encoded_scores, event) for each path, with the encoded scores of the file and
+        its event (see ingest.format_event), with no index, outcomes nor off-grid onsets
+        (they are given by the caller)
+    """
+
+    quarantine = _quarantine(quarantine)
+
+    # the warnings (and console messages) of the workers are not shown in quiet mode
+    if not verbose:
+        function = partial(_quiet_call, function)
+
+    # files left out by the meters of their scores (the comparison reads all the files),
+    # or because they are quarantined
+    skipped = {}
+    for path in paths:
+        if cache is not None and parser != 'compare':
+            encoded_scores = _skipped_scores(cache.get_meters(path), configurations)
+            if encoded_scores is not None:
+                skipped[path] = encoded_scores, 'skipped'
+                continue
+        if quarantine is not None and quarantine.is_quarantined(path):
+            skipped[path] = [], 'quarantined'
+
+    # process the other files (outcomes are given in order)
+    outcomes = _map_paths(function, [path for path in paths if path not in skipped],
+                          configurations, n_jobs, timeout, max_memory,
+                          catch=parser != 'compare')
+
+    for path in paths:
+        # event of the file
+        event = {'path': path, 'status': 'processed', 'error': None, 'parse_time': 0.0,
+                 'encode_time': 0.0, 'elapsed': 0.0}
+
+        if path in skipped:
+            encoded_scores, event['status'] = skipped[path]
+            yield encoded_scores, event
+            continue
+
+        result, event['error'], event['elapsed'] = next(outcomes)
+        if event['error'] is not None:
+            # the file gives no scores, and it is quarantined
+            event['status'] = 'failed'
+            if quarantine is not None:
+                quarantine.add(path, event['error'], event['elapsed'])
+                quarantine.save()
+            yield [], event
+            continue
+
+        encoded_scores, times = result
+        event.update(times)
+        if quarantine is not None and os.path.abspath(path) in quarantine.entries:
+            # the file is encoded on a retry
+            quarantine.remove(path)
+            quarantine.save()
+        if cache is not None:
+            # keep the meters of the scores of the file
+            cache.put_meters(path, [score[4] for score in encoded_scores])
+        yield encoded_scores, event
+
+    # save the index of meters
+    if cache is not None:
+        cache.save_meters()
+
+
+def _quiet_call(function, path, configurations):
+    """Result of function(path, configurations), with no warnings shown, nor the messages
+    that music21 writes to the console (e.g. the warnings of its ABC translator)"""
+
+    with warnings.catch_warnings(), open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        warnings.simplefilter('ignore')
+        return function(path, configurations)
+
+
+def _score_outcome(meters, encodings, accepted):
+    """Outcome of a score (see ingest.OUTCOMES).
+
+    Parameters
+    ----------
+    meters : list
+        time signatures of the score (list of str)
+    encodings : list
+        encoded measures of each configuration (None if the score has not its time signature)
+    accepted : bool
+        whether the score is given in some configuration (it is not a duplicate)
+
+    Returns
+    -------
+    outcome : str
+        'accepted', 'wrong_meter', 'multiple_meters' or 'duplicate'
+    """
+
+    if accepted:
+        return 'accepted'
+    if len(meters) > 1:
+        return 'multiple_meters'
+    if all(piece_measures is None for piece_measures in encodings):
+        return 'wrong_meter'
+
+    return 'duplicate'
+
+
+def _report_event(event, stats, callback=None, verbose=True):
+    """Give the event of a file to the statistics and the callback, and show it.
+
+    Parameters
+    ----------
+    event : dict
+        event of the file (see ingest.format_event)
+    stats : IngestStats
+        statistics of the files of the dataset
+    callback : callable, optional
+        function called as callback(event)
+    verbose : bool
+        whether to print the event
+    """
+
+    stats.add(event)
+    if callback is not None:
+        callback(event)
+    if verbose:
+        print(ingest.format_event(event))
+
+
+def _read_meters(path):
+    """Meters of the scores of a music file, read from the meter fields of an ABC file or
+    the time signatures of a MusicXML file with no need to parse it.
+
+    Parameters
+    ----------
+    path : str
+        path of the file
+
+    Returns
+    -------
+    meters : list or None
+        list with the meters (list of str) of each score of the file (the time signatures of
+        a score include its meters), None if they cannot be read
+    sources : list or None
+        list with the source of each tune of an ABC file, that music21 can parse on its own
+        (None for the tunes that cannot be parsed on their own), None for other files
+    """
+
+    extension = os.path.splitext(path)[1].lower()
+
+    try:
+        if extension in _ABC_EXTENSIONS:
+            tunes = abcnotation.split_tunes(path)
+            return ([tune['meters'] for tune in tunes], [tune['source'] for tune in tunes])
+        if extension in _NATIVE_EXTENSIONS:
+            return [musicxml.read_meters(path)], None
+    except (ValueError, ET.ParseError):
+        return None, None
+
+    # other formats are only read by music21
+    return None, None
+
+
+def _skipped_scores(meters, configurations):
+    """Encoded scores of a file (as given by _encode_path) if none of its scores can be encoded
+    with any configuration, as shown by their meters.
+
+    Parameters
+    ----------
+    meters : list or None
+        list with the meters (list of str) of each score of the file
+    configurations : list of tuples
+        list of (signature, beat_subdivisions) to encode the file with
+
+    Returns
+    -------
+    encoded_scores : list or None
+        list of tuples (ind_score, title, encodings, fingerprint, meters, off_grid) of the
+        scores, with nothing encoded, None if the meters are not known or some score may be
+        encoded
+    """
+
+    if meters is None:
+        return None
+
+    if any(_may_encode(score_meters, configurations) for score_meters in meters):
+        return None
+
+    return [(ind_score, None, [None] * len(configurations), None, score_meters, 0)
+            for ind_score, score_meters in enumerate(meters)]
+
+
+def _may_encode(meters, configurations):
+    """Check if a score may be encoded with some configuration, given its meters.
+
+    Parameters
+    ----------
+    meters : list
+        meters (list of str) of the score (included in its time signatures)
+    configurations : list of tuples
+        list of (signature, beat_subdivisions) to encode the score with
+
+    Returns
+    -------
+    may_encode : bool
+        False if the score has several meters, or a meter different from the signatures of
+        the configurations
+    """
+
+    return len(meters) <= 1 and any(all(_same_meter(signature, meter) for meter in meters)
+                                    for signature, _ in configurations)
+
+
+def _load_summaries(path, cache=None, parser='music21', tune_sources=None, times=None):
+    """Summaries of the scores of a music file, from the cache if the file has not changed.
+
+    Parameters
+    ----------
+    path : str
+        path of the file
+    cache : ParseCache, optional
+        cache of parsed files
+    parser : str
+        parser of the music files ('music21', 'native' or 'compare', see encode_dataset)
+    tune_sources : dict, optional
+        sources of the tunes of an ABC file by their index, to parse only those tunes (on
+        their own) if the file is not in the cache (their summaries are not kept in the cache)
+    times : dict, optional
+        dictionary where the time (in seconds) taken by each parser is kept, as
+        'music21_time' and 'native_time', if they are compared
+
+    Returns
+    -------
+    summaries : list
+        list of dictionaries, one per score (as given by _summarize_score)
+    """
+
+    # the comparison of the parsers always reads the file
+    if parser == 'compare':
+        summaries, music21_time, native_time = _compare_parsers(path)
+        if times is not None:
+            times['music21_time'], times['native_time'] = music21_time, native_time
+        return summaries
+
+    # parser of the file
+    parse = _parse_native if parser == 'native' else _parse_summaries
+
+    # only some tunes are parsed
+    if tune_sources is not None:
+        parse = lambda _: _parse_tunes(tune_sources)
+
+    # parse the file if there is no cache
+    if cache is None:
+        return parse(path)
+
+    # look for the file in the cache (by its content and the version of the parser)
+    key = cache.key(path, _summary_version(parser))
+    summaries = cache.get(key)
+
+    # parse the file (new or modified) and save it in the cache (if it is parsed as a whole)
+    if summaries is None:
+        summaries = parse(path)
+        if tune_sources is None:
+            cache.put(key, summaries)
+
+    return summaries
+
+
+def _summary_version(parser='music21'):
+    """Version of the summaries given by a parser, with the version of music21 (it is read
+    from the metadata of the package, with no need to import it).
+
+    Parameters
+    ----------
+    parser : str
+        parser of the music files ('music21' or 'native')
+
+    Returns
+    -------
+    version : str
+        version of the summaries
+    """
+
+    import importlib.metadata
+
+    try:
+        music21_version = importlib.metadata.version('music21')
+    except importlib.metadata.PackageNotFoundError:
+        import music21
+        music21_version = music21.VERSION_STR
+
+    if parser == 'native':
+        return _NATIVE_SUMMARY_VERSION % music21_version
+
+    return _SUMMARY_VERSION % music21_version
+
+
+def _parse_summaries(path, force_source=False):
+    """Parse a music file and summarize each score it contains.
+
+    Parameters
+    ----------
+    path : str
+        path of the file to parse (it can give an Opus or a Score)
+    force_source : bool
+        whether to parse the file even if music21 has kept it parsed (in its own cache)
+
+    Returns
+    -------
+    summaries : list
+        list of dictionaries, one per score (as given by _summarize_score)
+    """
+
+    import music21
+
+    # convert path to opus or score
+    opus = music21.converter.parse(path, forceSource=force_source)
+
+    # check that we get an opus
+    if isinstance(opus, music21.stream.Opus):
+        scores_list = list(opus)
+    # if not an opus then it can be a score (ex. oneills1850/0731-0731.abc)
+    elif isinstance(opus, music21.stream.Score):
+        scores_list = [opus]
+    else:
+        warnings.warn("The path has not given an Opus nor a Score and is ignored.",
+                      RuntimeWarning)
+        scores_list = []
+
+    # summaries of the scores
+    summaries = []
+
+    # for each score in the opus
+    for ind_score, score in enumerate(scores_list):
+        # check that we get an score
+        if not isinstance(score, music21.stream.Score):
+            warnings.warn("The Opus has not given a Score and is ignored.", RuntimeWarning)
+            continue
+
+        summaries.append(_summarize_score(score, ind_score))
+
+    return summaries
+
+
+def _parse_native(path):
+    """Read a MusicXML or ABC file with the native readers and summarize its scores, using
+    music21 for the other files and for the ones (or the tunes) the readers cannot read.
+
+    Parameters
+    ----------
+    path : str
+        path of the file to read
+
+    Returns
+    -------
+    summaries : list
+        list of dictionaries, one per score (as given by _summarize_score)
+    """
+
+    extension = os.path.splitext(path)[1].lower()
+
+    # ABC files (opus of tunes)
+    if extension in _ABC_EXTENSIONS:
+        return _parse_abc(path)
+
+    # other formats (and compressed MusicXML files) are parsed by music21
+    if extension not in _NATIVE_EXTENSIONS:
+        return _parse_summaries(path)
+
+    try:
+        score = musicxml.read_score(path)
+    except (ValueError, ET.ParseError) as error:
+        warnings.warn("The native reader cannot read %s (%s), music21 is used instead."
+                      % (path, error), RuntimeWarning)
+        return _parse_summaries(path)
+
+    return [_summarize_native(score)]
+
+
+def _parse_abc(path):
+    """Read an ABC file with the native reader and summarize its tunes, parsing with music21
+    the tunes that the reader cannot read (or the whole file if they cannot be parsed on
+    their own).
+
+    Parameters
+    ----------
+    path : str
+        path of the file to read
+
+    Returns
+    -------
+    summaries : list
+        list of dictionaries, one per tune (as given by _summarize_score)
+    """
+
+    try:
+        tunes = abcnotation.read_tunes(path)
+    except ValueError as error:
+        warnings.warn("The native reader cannot read %s (%s), music21 is used instead."
+                      % (path, error), RuntimeWarning)
+        return _parse_summaries(path)
+
+    # summaries of the tunes
+    summaries = []
+
+    for ind_score, tune in enumerate(tunes):
+        # tunes read by the native reader
+        if 'error' not in tune:
+            summaries.append(_summarize_native(tune, ind_score))
+            continue
+
+        # tunes that need the context of the whole file are parsed with it
+        if tune['source'] is None:
+            return _parse_summaries(path)
+
+        # other tunes are parsed on their own by music21 (with the header of the file)
+        summaries.extend(_parse_tunes({ind_score: tune['source']}))
+
+    return summaries
+
+
+def _parse_tunes(tune_sources):
+    """Parse some tunes of an ABC file on their own with music21 and summarize them.
+
+    Parameters
+    ----------
+    tune_sources : dict
+        sources of the tunes (as given by abcnotation.split_tunes) by their index in the file
+
+    Returns
+    -------
+    summaries : list
+        list of dictionaries, one per tune in the order of their index (as given by
+        _summarize_score)
+    """
+
+    import music21
+
+    summaries = []
+
+    for ind_score in sorted(tune_sources):
+        score = music21.converter.parse(tune_sources[ind_score], format='abc')
+        if isinstance(score, music21.stream.Opus):
+            score = score.scores[0]
+        summaries.append(_summarize_score(score, ind_score))
+
+    return summaries
+
+
+def _summarize_native(score, ind_score=0):
+    """Summarize a score read by a native reader (as _summarize_score does).
+
+    Parameters
+    ----------
+    score : dict
+        score as given by musicxml.read_score or abcnotation.read_tunes
+    ind_score : int
+        index of the score in its file (opus)
+
+    Returns
+    -------
+    summary : dict
+        dictionary with the title, time signatures and fingerprint of the piece, and the
+        arrays describing its measures and notes (see _summarize_part)
+    """
+
+    # the title as music21 gives it (e.g. 'Tango, El' is 'El Tango')
+    title = score['title']
+    if title:
+        title = _prepend_article(title)
+
+    return {"ind_score": ind_score, "title": title,
+            "time_signatures": score['time_signatures'],
+            "fingerprint": fingerprint(score['note_sequence']),
+            "measure_offset": np.array(score['measure_offset'], dtype=np.float64),
+            "measure_duration": np.array(score['measure_duration'], dtype=np.float64),
+            "note_measure": np.array(score['note_measure'], dtype=np.int64),
+            "note_offset_num": np.array([offset.numerator for offset in
+                                         score['note_offset']], dtype=np.int64),
+            "note_offset_den": np.array([offset.denominator for offset in
+                                         score['note_offset']], dtype=np.int64),
+            "note_duration": np.array(score['note_duration'], dtype=np.float64),
+            "note_pitch": np.array(score['note_pitch'], dtype=np.float64)}
+
+
+def _prepend_article(title):
+    """Move a trailing article of a title to the front, as music21.text.prependArticle does
+    (without importing music21).
+
+    Parameters
+    ----------
+    title : str
+        title of a score
+
+    Returns
+    -------
+    title : str
+        title with the article in front (the same title if there is no trailing article)
+
+    Examples
+    --------
+    >>> _prepend_article('Tango, El')
+    'El Tango'
+    >>> _prepend_article('Adios, Muchachos')
+    'Adios, Muchachos'
+    """
+
+    # the article is what follows the last comma
+    if ',' not in title:
+        return title
+    rest, article = title.rsplit(',', 1)
+    article = article.strip()
+
+    if article.lower() in _TITLE_ARTICLES:
+        return article + ' ' + rest
+
+    return title
+
+
+def _compare_parsers(path):
+    """Parse a music file with music21 and with the native reader, checking that both give
+    the same summary (and therefore the same encoding and fingerprint).
+
+    Parameters
+    ----------
+    path : str
+        path of the file to parse
+
+    Returns
+    -------
+    summaries : list
+        list of dictionaries, one per score (as given by music21)
+    music21_time : float
+        time (in seconds) taken by music21
+    native_time : float
+        time (in seconds) taken by the native reader
+
+    Raises
+    ------
+    ValueError
+        If the summaries of the parsers are different
+    """
+
+    # parse the file with music21 (not from its own cache) and with the native reader
+    start = time.perf_counter()
+    summaries = _parse_summaries(path, force_source=True)
+    music21_time = time.perf_counter() - start
+    start = time.perf_counter()
+    native_summaries = _parse_native(path)
+    native_time = time.perf_counter() - start
+
+    # compare the summaries
+    if len(summaries) != len(native_summaries):
+        raise ValueError("Different number of scores in " + path)
+    for summary, native_summary in zip(summaries, native_summaries):
+        for key in ('title', 'time_signatures', 'fingerprint'):
+            if summary[key] != native_summary[key]:
+                raise ValueError("Different %s in %s" % (key, path))
+        for key in ('measure_offset', 'measure_duration'):
+            if not np.array_equal(summary[key], native_summary[key]):
+                raise ValueError("Different %s in %s" % (key, path))
+        # the notes of a measure are encoded in any order (compare them sorted)
+        keys = ('note_measure', 'note_offset_num', 'note_offset_den', 'note_duration',
+                'note_pitch')
+        order = np.lexsort([summary[key] for key in keys[::-1]])
+        native_order = np.lexsort([native_summary[key] for key in keys[::-1]])
+        for key in keys:
+            if not np.array_equal(summary[key][order], native_summary[key][native_order],
+                                  equal_nan=True):
+                raise ValueError("Different %s in %s" % (key, path))
+
+    return summaries, music21_time, native_time
+
+
+def _summarize_score(score, ind_score=0):
+    """Summarize the first part of a score, keeping all that is needed to encode it
+    (for any time signature and number of subdivisions) and to remove duplicates.
+
+    Parameters
+    ----------
+    score : music21.stream.Score
+        score to summarize
+    ind_score : int
+        index of the score in its file (opus)
+
+    Returns
+    -------
+    summary : dict
+        dictionary with the title, time signatures and fingerprint of the piece, and the
+        arrays describing its measures and notes (see _summarize_part)
+    """
+
+    # check if there is a title in the metadata
+    if hasattr(score.metadata, 'title'):
+        title = score.metadata.title
+    else:
+        title = 'Empty-Title'
+
+    # get only first part
+    # WARNING: if folksongs are considered then we assume there is only one part (melody)
+    piece = score.parts[0]
+
+    summary = {"ind_score": ind_score, "title": title}
+    summary.update(_summarize_part(piece))
+
+    return summary
+
+
+def _summarize_part(piece):
+    """Summarize the measures and notes of a part.
+
+    Parameters
+    ----------
+    piece : music21.stream
+        part to summarize
+
+    Returns
+    -------
+    summary : dict
+        dictionary with the time signatures (list of str) and fingerprint (str) of the piece,
+        the offset and duration of each measure, and the measure, offset in the measure
+        (as a fraction, including the padding of an incomplete measure), duration and pitch
+        (nan if unpitched) of each note that is not a chord
+    """
+
+    import music21
+
+    # time signatures of the piece
+    time_signatures = sorted(set(ts.ratioString for ts in
+                                 piece.recurse().getElementsByClass(music21.meter.TimeSignature)))
+
+    # get the measures of the piece, and their boundaries
+    measures = list(piece.getElementsByClass('Measure'))
+    measure_offset = np.array([float(m.offset) for m in measures], dtype=np.float64)
+    measure_duration = np.array([float(m.duration.quarterLength) for m in measures],
+                                dtype=np.float64)
+
+    # notes that are not chords (pitched or not), in one pass over the piece each
+    notes, note_measure, offset_num, offset_den = _measure_notes(piece, measures, 'Note')
+    unpitched, unpitched_measure, unpitched_num, unpitched_den = _measure_notes(piece, measures,
+                                                                                'Unpitched')
+
+    return {"time_signatures": time_signatures,
+            "fingerprint": fingerprint(piece),
+            "measure_offset": measure_offset,
+            "measure_duration": measure_duration,
+            "note_measure": np.concatenate([note_measure, unpitched_measure]),
+            "note_offset_num": np.concatenate([offset_num, unpitched_num]),
+            "note_offset_den": np.concatenate([offset_den, unpitched_den]),
+            "note_duration": np.array([note.duration.quarterLength for note in
+                                       notes + unpitched], dtype=np.float64),
+            "note_pitch": np.array([note.pitch.ps for note in notes] + [np.nan] * len(unpitched),
+                                   dtype=np.float64)}
+
+
+def _measure_notes(piece, measures, note_class):
+    """Notes of a class in the measures of a part, with their measure and offset in the measure,
+    gathered in one pass over the part (rather than flattening each measure).
+
+    Parameters
+    ----------
+    piece : music21.stream
+        part with the notes
+    measures : list
+        measures of the part
+    note_class : str
+        class of the notes (e.g. 'Note')
+
+    Returns
+    -------
+    notes : list
+        notes in the measures
+    note_measure : np.ndarray
+        index of the measure of each note
+    offset_num : np.ndarray
+        numerator of the offset of each note in its measure (including the padding of an
+        incomplete measure)
+    offset_den : np.ndarray
+        denominator of the offset of each note in its measure
+    """
+
+    measure_index = {id(m): ind for ind, m in enumerate(measures)}
+
+    # measure of each stream with notes (a measure or a voice in it) and shift from the offsets
+    # in the stream to the offsets in the measure, computed once per stream
+    streams = {}
+    stream_measure = []
+    stream_shift = []
+
+    notes = []
+    note_stream = []
+    note_offset = []
+
+    iterator = piece.recurse().getElementsByClass(note_class)
+    for note in iterator:
+        stream = iterator.activeInformation['stream']
+        ind_stream = streams.get(id(stream))
+        if ind_stream is None:
+            ind_stream = streams[id(stream)] = len(stream_measure)
+            # streams from the measure to the stream of the note
+            stack = [stream_iterator.srcStream for stream_iterator in iterator.iteratorStack()]
+            if len(stack) > 1 and id(stack[1]) in measure_index:
+                stream_measure.append(measure_index[id(stack[1])])
+                stream_shift.append(Fraction(stack[1].paddingLeft) +
+                                    sum(Fraction(parent.elementOffset(child))
+                                        for parent, child in zip(stack[1:], stack[2:])))
+            else:
+                # notes not in a measure are not summarized
+                stream_measure.append(-1)
+                stream_shift.append(Fraction(0))
+        if stream_measure[ind_stream] >= 0:
+            notes.append(note)
+            note_stream.append(ind_stream)
+            note_offset.append(note.offset)
+
+    # offset of each note in its measure, as a fraction
+    note_stream = np.array(note_stream, dtype=np.int64)
+    shift_num, shift_den = _offset_fractions(stream_shift)
+    offset_num, offset_den = _offset_fractions(note_offset)
+    offset_num, offset_den = _add_fractions(offset_num, offset_den, shift_num[note_stream],
+                                            shift_den[note_stream])
+
+    return (notes, np.array(stream_measure, dtype=np.int64)[note_stream], offset_num,
+            offset_den)
+
+
+def _offset_fractions(offsets):
+    """Offsets as reduced fractions, computed at once for the offsets given by music21 as
+    floats (whose denominator is a power of two), and one by one for the rest (e.g. tuplets).
+
+    Parameters
+    ----------
+    offsets : list or np.ndarray
+        offsets in quarter notes, as floats or fractions
+
+    Returns
+    -------
+    offset_num : np.ndarray
+        numerator of each offset
+    offset_den : np.ndarray
+        denominator of each offset (positive)
+    """
+
+    offsets = np.asarray(offsets, dtype=object).reshape(-1)
+
+    # offsets that are exact in units of a power of two
+    scaled = offsets.astype(np.float64) * _OFFSET_SCALE
+    exact = scaled == np.round(scaled)
+    offset_num = np.where(exact, np.round(scaled), 0).astype(np.int64)
+    offset_den = np.full(offsets.shape, _OFFSET_SCALE, dtype=np.int64)
+
+    # other offsets as fractions
+    for ind in np.flatnonzero(~exact):
+        offset = Fraction(offsets[ind])
+        offset_num[ind], offset_den[ind] = offset.numerator, offset.denominator
+
+    # reduce the fractions
+    divisor = np.gcd(offset_num, offset_den)
+
+    return offset_num // divisor, offset_den // divisor
+
+
+def _add_fractions(num1, den1, num2, den2):
+    """Sum of two arrays of fractions, as reduced fractions.
+
+    Parameters
+    ----------
+    num1, den1 : np.ndarray
+        numerators and denominators of the first fractions
+    num2, den2 : np.ndarray
+        numerators and denominators of the second fractions
+
+    Returns
+    -------
+    num : np.ndarray
+        numerator of each sum
+    den : np.ndarray
+        denominator of each sum (positive)
+    """
+
+    den = np.lcm(den1, den2)
+    num = num1 * (den // den1) + num2 * (den // den2)
+    divisor = np.gcd(num, den)
+
+    return num // divisor, den // divisor
+
+
+def _encode_summary(summary, configurations, with_fingerprint=False):
+    """Encode a summarized score with each configuration that has its time signature.
+
+    Parameters
+    ----------
+    summary : dict
+        summary of the score (as given by _summarize_score)
+    configurations : list of tuples
+        list of (signature, beat_subdivisions) to encode the score with.
+        Only pieces with the signature (exclusively) will be encoded.
+    with_fingerprint : bool
+        whether to return the fingerprint of the piece
 
     Returns
     -------
-    dataset : list
-        list of dictionaries, each one corresponds to a piece
+    title : str
+        title of the score
+    encodings : list
+        encoded measures of each configuration, None if the piece has not its time signature
+    fingerprint : str
+        fingerprint of the piece, None if not required or not encoded
+    off_grid : int
+        number of onsets out of the grid (not encoded), over all the configurations
+
+    Notes
+    -----
+    The pieces with several time signatures, or with a time signature different from the
+    signatures, are not encoded (with no warning, the outcome of each piece is given by the
+    events of the encoding functions, see ingest.format_event).
     """
 
-    # get muic21 corpus from corpus name
-    corpus = music21.corpus.getComposer(dataset_name)
+    # encoded measures of each configuration, fingerprint of the piece and onsets out of grid
+    encodings = [None] * len(configurations)
+    piece_fingerprint = None
+    off_grid = 0
 
-    # total number of parts in dataset
-    num_parts = 0
-
-    # save opus to avoid repeating parse
-    opus_list = len(corpus)*[[]]
-
-    # save opus paths
-    opus_paths = len(corpus)*['']
-
-    # in the following we compute the total number of pieces to initialize list
-
-    # for each path int the corpus
-    for ind_path, path in enumerate(corpus):
-        print(path)
-        # save opus path
-        opus_paths[ind_path] = path
-        # convert path to opus
-        opus = music21.converter.parse(path)
-        # check that we get an opus
-        if isinstance(opus, music21.stream.Opus):
-            # list to save scores in opus
-            scores_list = len(opus)*[[]]
-            # for each score in the opus
-            for ind_score, score in enumerate(opus):
-                # check that we get an score
-                if isinstance(score, music21.stream.Score):
-                    # count the number of parts
-                    # WARNING: if folksongs are considered then we assume
-                    # there is only one part (melody)
-                    num_parts += 1
-                    # save score in the scores list
-                    scores_list[ind_score] = score
-                else:
-                    warnings.warn("The Opus has not given a Score and is ignored.", RuntimeWarning)
-            # save list of scores
-            opus_list[ind_path] = scores_list
-        # if not an opus then it can be a score (ex. oneills1850/0731-0731.abc)
-        elif isinstance(opus, music21.stream.Score):
-            scores_list = []
-            scores_list.append(opus)
-            opus_list[ind_path] = scores_list
-            num_parts += 1
-        else:
-            warnings.warn("The path has not given an Opus nor a Score and is ignored.",
-                          RuntimeWarning)
-        #input("Press Enter to continue...")
+    # check time signature (once for all the configurations)
+    time_signatures = summary['time_signatures']
+    time_signature = time_signatures[0] if len(time_signatures) == 1 else None
+    if time_signature is None:
+        return summary['title'], encodings, piece_fingerprint, off_grid
 
-    # dataset as a list of dictionaries, each one corresponds to a piece/part
-    # each dictionary has attributes 'name' (str) and 'measures' (list of numpy arrays of onsets)
-    dataset = num_parts*[[]]
-    # list to save the score of each element in the dataset
-    scores = num_parts*[None]
+    for ind, (signature, beat_subdivisions) in enumerate(configurations):
+        if _same_meter(signature, time_signature):
+            # encode piece
+            encodings[ind], config_off_grid = _encode_measures(summary, signature,
+                                                               beat_subdivisions)
+            off_grid += config_off_grid
 
-    # index of the piece
-    ind_piece = 0
+    if with_fingerprint and any(piece_measures is not None for piece_measures in encodings):
+        # fingerprint (to remove duplicates)
+        piece_fingerprint = summary['fingerprint']
 
-    # we now process each part/piece in the dataset
-    for ind_opus, opus in enumerate(opus_list):
-        # for each score in the opus
-        for ind_score, score in enumerate(opus):
-            # we get the part in the score
-            piece = score.parts[0]
+    return summary['title'], encodings, piece_fingerprint, off_grid
 
-            # check if there is a title in the metadata
-            if hasattr(score.metadata, 'title'):
-                title = score.metadata.title
-            else:
-                title = 'Empty-Title'
 
-            # check time signature
-            if signature == single_time_signature(piece):
+def note_sequence(piece):
+    """Sequence of durations and pitches of the notes of a piece, used to compare pieces.
+
+    Parameters
+    ----------
+    piece : music21.stream
+        piece to describe
 
-                # encode piece
-                piece_measures = encode_piece(piece, signature, beat_subdivisions)
+    Returns
+    -------
+    notes : tuple
+        tuple of (quarterLength, step, accidental, octave, microtone) for each note,
+        two notes are equal if they have the same duration and pitch (as in music21)
+    """
 
-                # create dictionary corresponding to current piece
-                dict_piece = {"dataset": dataset_name, "ind_piece": ind_piece,
-                              "title": title, "path": opus_paths[ind_opus],
-                              "ind_score": ind_score, "measures": piece_measures}
+    return tuple((note.duration.quarterLength, note.pitch.step,
+                  None if note.pitch.accidental is None else note.pitch.accidental.name,
+                  note.pitch.octave, note.pitch.microtone.cents)
+                 for note in piece.flat.getElementsByClass('Note'))
 
-                # save piece in dataset
-                dataset[ind_piece] = dict_piece
-                # save score of the piece
-                scores[ind_piece] = piece
 
-            elif single_time_signature(piece) is None:
-                warnings.warn("Piece with several Time Signatures.", RuntimeWarning)
-            else:
-                warnings.warn("Piece with wrong TimeSignature.", RuntimeWarning)
+def fingerprint(piece):
+    """Canonical fingerprint of a piece, computed as a hash of its note sequence.
 
-            # increment piece index
-            ind_piece += 1
+    Parameters
+    ----------
+    piece : music21.stream or tuple
+        piece to describe, or its note sequence (as given by note_sequence)
 
+    Returns
+    -------
+    fingerprint : str
+        hexadecimal digest, equal for pieces with the same durations and pitches
+    """
 
-    # remove empty elements in list
-    dataset_filtered = list(filter(None, dataset))
-    scores_filtered = list(filter(None, scores))
+    # note sequence of the piece
+    notes = piece if isinstance(piece, tuple) else note_sequence(piece)
 
-    # remove duplicate elements in list
-    dataset, scores = remove_duplicates(dataset_filtered, scores_filtered)
+    # hash the notes using a canonical representation (durations and cents as floats)
+    digest = hashlib.blake2b(digest_size=16)
+    for (duration, step, accidental, octave, cents) in notes:
+        digest.update(repr((float(duration), step, accidental, octave,
+                            float(cents))).encode('utf-8'))
 
-    return dataset
+    return digest.hexdigest()
 
 
-def remove_duplicates(input_dataset, input_scores):
-    """Remove duplicate elements in a dataset
+def remove_duplicates(input_dataset, input_fingerprints, input_sequences=None):
+    """Remove duplicate elements in a dataset, keeping the first occurrence of each piece.
+    Two pieces are duplicates if they have the same number of measures and the same
+    fingerprint (i.e. the same durations and pitches).
 
     Parameters
     -------
     input_dataset : list
         list of dictionaries, each one corresponds to a piece
-    input_scores : list
-        list of scores of each piece
-
+    input_fingerprints : list
+        list of fingerprints of each piece (as given by fingerprint)
+    input_sequences : list, optional
+        list of note sequences of each piece (as given by note_sequence). If given, pieces with
+        the same fingerprint are also compared note by note (to rule out hash collisions).
 
     Returns
     -------
     output_dataset : list
         list of dictionaries, each one corresponds to a piece
+    output_fingerprints : list
+        list of fingerprints of each piece in the output dataset
     """
-    # total number of pieces of the input dataset
-    N = len(input_dataset)
-
-    # copy input list into output list
-    output_dataset = input_dataset[:]
-    # copy input list into output list
-    output_scores = input_scores[:]
 
-    # indexes of the elements to delete
-    del_indexes = []
+    # indexes of the kept pieces for each number of measures and fingerprint
+    kept = {}
 
-    # number of measures of each piece
-    num_measures = N*[0]
+    # output lists
+    output_dataset = []
+    output_fingerprints = []
 
-    # save in advance the number of measures of each piece
+    # for each element in input dataset
     for ind, piece in enumerate(input_dataset):
-        num_measures[ind] = len(piece["measures"])
+        # pieces kept so far with the same number of measures and fingerprint
+        group = kept.setdefault((len(piece["measures"]), input_fingerprints[ind]), [])
 
-    # for each element in input dataset
-    for ind1 in range(len(input_dataset)):
-        # compare to each other element in the dataset
-        for ind2 in range(len(input_dataset)):
-            # avoid self comparison and duplicate comparison
-            if ind1 < ind2:
-                # see if measure length is the same
-                if num_measures[ind1] == num_measures[ind2]:
-                    # if same they have the same number of measures then compare notes
-                    notes1 = input_scores[ind1].flat.getElementsByClass('Note')
-                    notes2 = input_scores[ind2].flat.getElementsByClass('Note')
-                    # check if they have the same number of notes
-                    if len(notes1) == len(notes2):
-                        # flag to indicate they are different
-                        are_different = False
-                        ind = 0
-                        # compare note by note untill they are different
-                        while not are_different and ind < len(notes1):
-                            d1 = notes1[ind].duration.quarterLength
-                            d2 = notes2[ind].duration.quarterLength
-                            f1 = notes1[ind].pitch
-                            f2 = notes2[ind].pitch
-                            # if durations or pitches are different
-                            if (d1 != d2) or (f1 != f2):
-                                are_different = True
-                            ind += 1
-                        # save index if they are different
-                        if not are_different:
-                            del_indexes.append(ind2)
-
-    # set to None the elements we want to remove
-    for ind in del_indexes:
-        output_dataset[ind] = None
-        output_scores[ind] = None
-
-    # remove empty elements in list
-    output_dataset = list(filter(None, output_dataset))
-    output_scores = list(filter(None, output_scores))
-
-    return output_dataset, output_scores
-
-
-def encode_dataset_folder(dataset_folder, file_ext='xml', signature='4/4', beat_subdivisions=2):
+        # check if the piece is a duplicate of a previous one
+        if input_sequences is None:
+            is_duplicate = len(group) > 0
+        else:
+            # exact comparison only inside the group (i.e. hash collisions)
+            is_duplicate = any(input_sequences[ind_kept] == input_sequences[ind]
+                               for ind_kept in group)
+
+        # keep the piece if it is not a duplicate
+        if not is_duplicate:
+            group.append(ind)
+            output_dataset.append(piece)
+            output_fingerprints.append(input_fingerprints[ind])
+
+    return output_dataset, output_fingerprints
+
+
+def encode_dataset_folder(dataset_folder, file_ext='xml', signature='4/4', beat_subdivisions=2,
+                          n_jobs=1, cache=None, parser='music21', timeout=None, max_memory=None,
+                          quarantine=None, callback=None, verbose=True):
     """Load dataset from folder with music xml files.
 
     Parameters
@@ -291,11 +1700,29 @@ def encode_dataset_folder(dataset_folder, file_ext='xml', signature='4/4', beat_
         Only pieces with that time signature (exclusively) will be encoded.
     beat_subdivisions : int
         number of (equal) subdivisions of each beat.
+    n_jobs : int or None
+        number of worker processes used to parse and encode the files
+        (1 to process them serially, None or -1 to use all the available CPUs).
+    cache : str or ParseCache, optional
+        directory (or cache) where the parsed files are kept, so that only new or modified
+        files are parsed again
+    parser : str
+        parser of the music files ('music21', 'native' or 'compare', see encode_dataset)
+    timeout : float, optional
+        maximum time (in seconds) to parse and encode each file (see encode_dataset)
+    max_memory : int, optional
+        maximum memory (in bytes) to parse and encode each file (see encode_dataset)
+    quarantine : str or Quarantine, optional
+        manifest (or its path) of the files that could not be encoded (see encode_dataset)
+    callback : callable, optional
+        function called with the event of each file (see encode_dataset)
+    verbose : bool
+        whether to print the event of each file and the statistics at the end
 
     Returns
     -------
-    dataset : list
-        list of dictionaries, each one corresponds to a piece
+    dataset : EncodedDataset
+        encoded dataset, iterating over it gives a dictionary for each piece
 
     Examples
     --------
@@ -339,59 +1766,116 @@ def encode_dataset_folder(dataset_folder, file_ext='xml', signature='4/4', beat_
     The labels may indicate the beat number within the rhythm cycle (e.g. 1.1, 1.2, or 1, 2).
     """
 
+    # parse and encode each file
+    pieces = (piece for _, piece in
+              _iter_encode_folder(dataset_folder, file_ext, [(signature, beat_subdivisions)],
+                                  n_jobs, cache, parser, timeout=timeout, max_memory=max_memory,
+                                  quarantine=quarantine, callback=callback, verbose=verbose))
+
+    # store all the measures in a single matrix
+    dataset = EncodedDataset.from_pieces(pieces, signature=signature,
+                                         beat_subdivisions=beat_subdivisions,
+                                         beats_measure=_beats_measure(signature,
+                                                                      beat_subdivisions))
+
+    return dataset
+
+
+def _iter_encode_folder(dataset_folder, file_ext, configurations, n_jobs=1, cache=None,
+                        parser='music21', timeout=None, max_memory=None, quarantine=None,
+                        callback=None, verbose=True):
+    """Encode the pieces of a folder with music files, one by one.
+
+    Parameters
+    ----------
+    dataset_folder : str
+        name (including path) of the dataset's folder
+    file_ext : str
+        file extension of the dataset's files
+    configurations : list of tuples
+        list of (signature, beat_subdivisions) to encode the pieces with
+    n_jobs : int or None
+        number of worker processes used to parse and encode the files
+    cache : str or ParseCache, optional
+        directory (or cache) where the parsed files are kept
+    parser : str
+        parser of the music files ('music21', 'native' or 'compare', see encode_dataset)
+    timeout : float, optional
+        maximum time (in seconds) to parse and encode each file (see encode_dataset)
+    max_memory : int, optional
+        maximum memory (in bytes) to parse and encode each file (see encode_dataset)
+    quarantine : str or Quarantine, optional
+        manifest (or its path) of the files that could not be encoded (see encode_dataset)
+    callback : callable, optional
+        function called with the event of each file (see encode_dataset)
+    verbose : bool
+        whether to print the event of each file and the statistics at the end
+
+    Yields
+    ------
+    configuration : tuple
+        (signature, beat_subdivisions) of the encoded piece
+    piece : dict
+        dictionary of an encoded piece
+    """
+
+    # check the parser before parsing any file
+    _check_parser(parser)
+
     # files in folder
     filenames = glob.glob(dataset_folder + "*." + file_ext)
-    # number of files
-    num_files = len(filenames)
     # get the dataset name from the last directory of the path
     dataset_name = os.path.basename(os.path.dirname(dataset_folder))
 
-    # dataset as a list of dictionaries, each one corresponds to a piece
-    # each dictionary has attributes 'name' (str) and 'measures' (list of numpy arrays of onsets)
-    dataset = num_files*[[]]
+    # cache of parsed files
+    cache = _parse_cache(cache)
 
-    # for each file in the dataset
-    for ind_file, filename in enumerate(filenames):
-        print('ind_file: %d, %s' % (ind_file, filename))
-        # open file using music21 parser
-        score = music21.converter.parse(filename)
-
-        # check if there is a title in the metadata
-        if hasattr(score.metadata, 'title'):
-            title = score.metadata.title
-        else:
-            title = 'Empty-Title'
+    # statistics of the files
+    stats = ingest.IngestStats()
 
-        # get only first part
-        piece = score.parts[0]
+    # parse and encode each file (in parallel if n_jobs is not 1), in the order of the filenames
+    encoded_files = _encode_paths(partial(_encode_file, cache=cache, parser=parser),
+                                  filenames, configurations, n_jobs, cache, parser,
+                                  timeout=timeout, max_memory=max_memory, quarantine=quarantine,
+                                  verbose=verbose)
 
-        # check time signature
-        if signature == single_time_signature(piece):
+    # for each file in the dataset
+    for ind_file, (encoded_scores, event) in enumerate(encoded_files):
+        filename = event['path']
+        # outcome of the score and onsets out of grid
+        event.update(ind_file=ind_file, outcomes=[], off_grid=0)
 
-            # encode piece
-            piece_measures = encode_piece(piece, signature, beat_subdivisions)
+        # nothing to encode if the file has not given a score
+        if encoded_scores:
+            _, title, encodings, _, meters, off_grid = encoded_scores[0]
 
-            # create dictionary corresponding to current piece
-            dict_piece = {"dataset": dataset_name, "ind_piece": ind_file,
-                          "title": title, "path": filename,
-                          "ind_score": 0, "measures": piece_measures}
+            # for each configuration
+            for configuration, piece_measures in zip(configurations, encodings):
+                # check if the piece was encoded (i.e. it has the given time signature)
+                if piece_measures is not None:
 
-            # save piece in dataset
-            dataset[ind_file] = dict_piece
+                    # dictionary corresponding to current piece
+                    yield configuration, {"dataset": dataset_name, "ind_piece": ind_file,
+                                          "title": title, "path": filename,
+                                          "ind_score": 0, "measures": piece_measures}
 
-        elif single_time_signature(piece) is None:
-            warnings.warn("Piece with several Time Signatures.", RuntimeWarning)
-        else:
-            warnings.warn("Piece with wrong TimeSignature.", RuntimeWarning)
+            event['outcomes'].append(_score_outcome(meters, encodings, any(
+                piece_measures is not None for piece_measures in encodings)))
+            event['off_grid'] = off_grid
 
-    # remove empty elements in list
-    dataset_filtered = list(filter(None, dataset))
-    dataset = dataset_filtered
+        _report_event(event, stats, callback, verbose)
 
-    return dataset
+    # keep the size of the cache bounded
+    if cache is not None:
+        cache.evict()
+
+    # totals, throughput and failures
+    stats.stop()
+    if verbose:
+        print(stats.report())
 
 
-def encode_piece(piece, signature='4/4', beat_subdivisions=2):
+def encode_piece(piece, signature='4/4', beat_subdivisions=2, sparse=False):
     """Encode the onsets in the given piece as a list, each element being a sequence of 0s and 1s
     corresponding to each measure.
 
@@ -403,54 +1887,156 @@ def encode_piece(piece, signature='4/4', beat_subdivisions=2):
         string that defines the time signature
     beat_subdivisions : int
         number of subdivisions per beat
+    sparse : bool
+        whether to give the positions of the onsets of each measure instead of the matrix
+        (for grids of high resolution, see dataset.SparseDataset)
 
     Returns
     -------
-    piece_measures : list of np.ndarray
-        a list of arrays containing a 1 for a note onset and 0 otherwise
+    piece_measures : np.ndarray or tuple
+        a matrix (num_measures x beats_measure) of uint8, each row corresponds to a measure
+        and contains a 1 for a note onset and 0 otherwise.
+        If sparse, tuple (positions, measure_offsets) such that the positions of the onsets
+        of measure i are positions[measure_offsets[i]:measure_offsets[i+1]]
 
     Notes
     -----
-    The note positions are obtained with note.beat but could be also obtained with note.offset.
+    The note positions are obtained with note.offset (rather than note.beat, whose unit is the
+    dotted note in compound meters). The offsets of all the notes are summarized once and
+    placed in the grid at once, the onsets out of the grid are not encoded (and their number
+    is given in a single warning).
+    """
+
+    summary = _summarize_part(piece)
+    if sparse:
+        positions, measure_offsets, off_grid = _encode_onsets(summary, signature,
+                                                              beat_subdivisions)
+        piece_measures = positions, measure_offsets
+    else:
+        piece_measures, off_grid = _encode_measures(summary, signature, beat_subdivisions)
+    if off_grid:
+        warnings.warn("%d onset positions out of grid." % off_grid, RuntimeWarning)
+
+    return piece_measures
+
+
+def _encode_measures(summary, signature='4/4', beat_subdivisions=2):
+    """Encode the onsets of a summarized piece as a matrix of 0s and 1s.
+
+    Parameters
+    ----------
+    summary : dict
+        summary of the piece (as given by _summarize_part)
+    signature : str
+        string that defines the time signature
+    beat_subdivisions : int
+        number of subdivisions per beat
+
+    Returns
+    -------
+    piece_measures : np.ndarray
+        a matrix (num_measures x beats_measure) of uint8, each row corresponds to a measure
+        and contains a 1 for a note onset and 0 otherwise
+    off_grid : int
+        number of onsets that are not in the grid (they are not encoded)
     """
 
-    # convert time signature into numerator denominator
-    ts_num = int(signature.split('/')[0])
     # beats subdivisions per measure
-    beats_measure = ts_num * beat_subdivisions
+    beats_measure = _beats_measure(signature, beat_subdivisions)
 
-    # get the measures of the piece
-    measures = piece.getElementsByClass('Measure')
     # number of measures
-    num_measures = len(measures)
-    # list of measures in the piece
-    piece_measures = num_measures*[[]]
-
-    # for each measure
-    for ind_m, m in enumerate(measures):
-        # notes in current measure
-        measure_notes = m.flat.notes
-        # positions of all onsets
-        onsets_pos = []
-        # for each note in measure
-        for note in measure_notes:
-            # if not chord
-            if not note.isChord:
-                # compute onset position in grid (Note: this could alse be obtained with offset)
-                ons_pos = float((note.beat-1) * beat_subdivisions)
-                # check if onset is integer
-                if ons_pos.is_integer():
-                    onsets_pos.append(int(ons_pos))
-                else:
-                    warnings.warn("Onset position out of grid.", RuntimeWarning)
-        # encode note positions as 0/1
-        bin_pos = np.zeros((beats_measure,), dtype=int)
-        bin_pos[onsets_pos] = 1
-
-        # save coded measure in piece
-        piece_measures[ind_m] = bin_pos
+    num_measures = summary['measure_offset'].shape[0]
+    # matrix of measures in the piece
+    piece_measures = np.zeros((num_measures, beats_measure), dtype=np.uint8)
 
-    return piece_measures
+    # measure and position in the grid of each onset
+    note_measure, positions, off_grid = _grid_positions(summary, signature, beat_subdivisions)
+    piece_measures[note_measure, positions] = 1
+
+    return piece_measures, off_grid
+
+
+def _encode_onsets(summary, signature='4/4', beat_subdivisions=2):
+    """Encode the onsets of a summarized piece as the positions of the onsets of each measure
+    (with no matrix of 0s and 1s).
+
+    Parameters
+    ----------
+    summary : dict
+        summary of the piece (as given by _summarize_part)
+    signature : str
+        string that defines the time signature
+    beat_subdivisions : int
+        number of subdivisions per beat
+
+    Returns
+    -------
+    positions : np.ndarray
+        positions of the onsets of all the measures (in increasing order in each measure)
+    measure_offsets : np.ndarray
+        array (num_measures + 1) such that the positions of the onsets of measure i are
+        positions[measure_offsets[i]:measure_offsets[i+1]]
+    off_grid : int
+        number of onsets that are not in the grid (they are not encoded)
+    """
+
+    # beats subdivisions per measure
+    beats_measure = _beats_measure(signature, beat_subdivisions)
+
+    # number of measures
+    num_measures = summary['measure_offset'].shape[0]
+
+    # measure and position in the grid of each onset
+    note_measure, positions, off_grid = _grid_positions(summary, signature, beat_subdivisions)
+
+    # onsets sorted by measure and position, counting once the notes at the same position
+    onsets = np.unique(note_measure * beats_measure + positions)
+    measure_offsets = np.searchsorted(onsets // beats_measure, np.arange(num_measures + 1))
+
+    return onsets % beats_measure, measure_offsets.astype(np.int64), off_grid
+
+
+def _grid_positions(summary, signature='4/4', beat_subdivisions=2):
+    """Measure and position in the grid of the onsets of a summarized piece.
+
+    Parameters
+    ----------
+    summary : dict
+        summary of the piece (as given by _summarize_part)
+    signature : str
+        string that defines the time signature
+    beat_subdivisions : int
+        number of subdivisions per beat
+
+    Returns
+    -------
+    note_measure : np.ndarray
+        measure of each onset in the grid
+    positions : np.ndarray
+        position in the grid of each onset in the grid
+    off_grid : int
+        number of onsets that are not in the grid
+    """
+
+    # beats subdivisions per measure
+    beats_measure = _beats_measure(signature, beat_subdivisions)
+    # subdivisions per quarter note
+    _, ts_den, _ = util.parse_signature(signature)
+    quarter_subdivisions = Fraction(beat_subdivisions * ts_den, 4)
+
+    # onset positions in the grid from the offsets in the measures, as fractions
+    # (offset_num / offset_den) * (numerator / denominator)
+    positions_num = summary['note_offset_num'] * quarter_subdivisions.numerator
+    positions_den = summary['note_offset_den'] * quarter_subdivisions.denominator
+
+    # only the onsets at integer positions are in the grid
+    on_grid = positions_num % positions_den == 0
+    off_grid = int(on_grid.size - np.count_nonzero(on_grid))
+
+    # positions beyond the end of the measure wrap around (as note.beat)
+    positions = (positions_num[on_grid] // positions_den[on_grid]) % beats_measure
+
+    return summary['note_measure'][on_grid], positions, off_grid
 
 
 #def single_time_signature(piece):
@@ -508,6 +2094,8 @@ def single_time_signature(piece):
 
     """
 
+    import music21
+
     # get time signatures in the piece
     time_signatures = [ts.ratioString for ts in
                        piece.recurse().getElementsByClass(music21.meter.TimeSignature)]
@@ -524,39 +2112,517 @@ def single_time_signature(piece):
     return time_signature
 
 
-def load_encoded_dataset(filename):
-    """Load encoded dataset from file using serialization.
+def load_encoded_dataset(filename, mmap_mode='r', verify=False):
+    """Load encoded dataset from file.
+
+    The dataset is stored in a directory (see save_encoded_dataset) and its matrix of measures is
+    memory-mapped, so that several processes loading the same dataset share a single copy of
+    the data. Pickle files (.pkl) of previous versions can also be loaded.
 
     Parameters
     ----------
     filename : str
-        file name of the encoded dataset (as a pkl file)
+        path of the encoded dataset (a directory, or a pkl file)
+    mmap_mode : str or None
+        memory-map mode for the matrix of measures ('r' by default, None to load it in memory)
+    verify : bool
+        whether to check the content checksum (this reads the whole matrix of measures)
 
     Returns
     -------
-    dataset : list
-        list of dictionaries, each one corresponds to a piece
+    dataset : EncodedDataset
+        encoded dataset, iterating over it gives a dictionary for each piece
 
 
     """
-    # load dataset
-    dataset = pickle.load(open(filename, "rb"))
 
+    # load dataset from pickle file (previous versions)
+    if not os.path.isdir(filename):
+        with open(filename, "rb") as pickle_file:
+            dataset = pickle.load(pickle_file)
+
+        # store all the measures in a single matrix
+        if not isinstance(dataset, EncodedDataset):
+            dataset = EncodedDataset.from_pieces(dataset)
+
+        return dataset
+
+    # load metadata
+    with open(os.path.join(filename, _METADATA_FILE), "r", encoding="utf-8") as metadata_file:
+        metadata = json.load(metadata_file)
+
+    # check format and version
+    if metadata.get("format") != _FORMAT_NAME:
+        raise ValueError("Not an encoded dataset: " + str(filename))
+    if metadata["version"] > _FORMAT_VERSION:
+        raise ValueError("Encoded dataset version %d not supported (up to version %d)." %
+                         (metadata["version"], _FORMAT_VERSION))
+
+    # load (memory-mapped) matrix of measures and offsets of the pieces
+    measures = np.load(os.path.join(filename, _MEASURES_FILE), mmap_mode=mmap_mode)
+    offsets = np.load(os.path.join(filename, _OFFSETS_FILE))
+
+    # check content
+    if verify and _checksum(measures, offsets) != metadata["checksum"]:
+        raise ValueError("Checksum mismatch, the encoded dataset is corrupted: " + str(filename))
+
+    dataset = EncodedDataset(measures, offsets, metadata["datasets"], metadata["titles"],
+                             metadata["paths"], metadata["ind_pieces"], metadata["ind_scores"],
+                             signature=metadata["signature"],
+                             beat_subdivisions=metadata["beat_subdivisions"])
 
     return dataset
 
 
-def save_encoded_dataset(dataset, filename):
-    """Save encoded dataset to a file using serialization.
+def save_encoded_dataset(dataset, filename, signature=None, beat_subdivisions=None):
+    """Save encoded dataset to a directory.
+
+    The directory contains the matrix of measures and the offsets of the pieces as .npy files,
+    and a json file with the metadata of the pieces, the encoding parameters, the format version
+    and a checksum of the content.
 
     Parameters
     ----------
-    dataset : list
-        list of dictionaries, each one corresponds to a piece
+    dataset : EncodedDataset or list
+        encoded dataset or list of dictionaries, each one corresponds to a piece
+
+    filename : str
+        path of the directory to save the encoded dataset
+
+    signature : str, optional
+        time signature of the encoded pieces (by default the one of the dataset)
+
+    beat_subdivisions : int, optional
+        number of (equal) subdivisions of each beat (by default the one of the dataset)
+
+    """
+
+    # store all the measures in a single matrix
+    if not isinstance(dataset, EncodedDataset):
+        dataset = EncodedDataset.from_pieces(dataset)
+
+    # encoding parameters
+    if signature is None:
+        signature = dataset.signature
+    if beat_subdivisions is None:
+        beat_subdivisions = dataset.beat_subdivisions
+
+    # create directory
+    os.makedirs(filename, exist_ok=True)
+
+    # save matrix of measures and offsets of the pieces
+    measures = np.ascontiguousarray(dataset.measures, dtype=np.uint8)
+    np.save(os.path.join(filename, _MEASURES_FILE), measures)
+    np.save(os.path.join(filename, _OFFSETS_FILE), dataset.offsets)
+
+    # metadata (saved last, so an incomplete directory is not a valid dataset)
+    metadata = {"format": _FORMAT_NAME, "version": _FORMAT_VERSION,
+                "signature": signature, "beat_subdivisions": beat_subdivisions,
+                "num_pieces": dataset.num_pieces, "num_measures": dataset.num_measures,
+                "beats_measure": dataset.beats_measure,
+                "checksum": _checksum(measures, dataset.offsets),
+                "datasets": dataset.datasets, "titles": dataset.titles,
+                "paths": [str(path) for path in dataset.paths],
+                "ind_pieces": dataset.ind_pieces.tolist(),
+                "ind_scores": dataset.ind_scores.tolist()}
+
+    with open(os.path.join(filename, _METADATA_FILE), "w", encoding="utf-8") as metadata_file:
+        json.dump(metadata, metadata_file, ensure_ascii=False)
+
+
+class DatasetWriter:
+    """Class to write an encoded dataset to disk (in the format of save_encoded_dataset) piece
+    by piece, so that the dataset does not need to be kept in memory (e.g. to save the pieces
+    given by iter_encode_dataset).
+
+    The measures are appended to a temporary file, and the dataset is completed when the
+    writer is closed (it can be used as a context manager). If an exception is raised in the
+    context, the dataset is discarded instead, so that an interrupted encoding does not leave
+    a valid dataset with only some of the pieces.
+
+    Attributes
+    ----------
+    filename : str
+        path of the directory to save the encoded dataset
+    signature : str or None
+        time signature of the encoded pieces
+    beat_subdivisions : int or None
+        number of (equal) subdivisions of each beat
+    num_pieces : int
+        number of pieces written so far
+    num_measures : int
+        number of measures written so far
+
+    Methods
+    -------
+    append(piece)
+        Write a piece
+    close()
+        Complete the encoded dataset
+    abort()
+        Discard the encoded dataset
+
+    Examples
+    --------
+    >>> with DatasetWriter('tango_44_2', '4/4', 2) as writer:
+    ...     for piece in iter_encode_dataset('../data/tango_songbook/', signature='4/4'):
+    ...         writer.append(piece)
+
+    """
+
+    def __init__(self, filename, signature=None, beat_subdivisions=None):
+
+        self.filename = filename
+        self.signature = signature
+        self.beat_subdivisions = beat_subdivisions
+
+        # beats subdivisions per measure (given by the first piece if not known)
+        self.beats_measure = None
+        if signature is not None and beat_subdivisions is not None:
+            self.beats_measure = _beats_measure(signature, beat_subdivisions)
+
+        # metadata of each piece
+        self.datasets = []
+        self.titles = []
+        self.paths = []
+        self.ind_pieces = []
+        self.ind_scores = []
+        # offsets of the pieces in the matrix of measures
+        self.offsets = [0]
+
+        # files written when completing the dataset, and whether it is complete
+        self._written_files = []
+        self._complete = False
+
+        # create directory and temporary file of measures
+        os.makedirs(filename, exist_ok=True)
+        self._measures_file = open(os.path.join(filename, _MEASURES_FILE + '.tmp'), 'wb')
+
+
+    @property
+    def num_pieces(self):
+        """Number of pieces written so far"""
+        return len(self.offsets) - 1
+
+
+    @property
+    def num_measures(self):
+        """Number of measures written so far"""
+        return self.offsets[-1]
+
+
+    def append(self, piece):
+        """Write a piece.
+
+        Parameters
+        ----------
+        piece : dict
+            dictionary of an encoded piece
+        """
+
+        # number of beat subdivisions per measure
+        if self.beats_measure is None and len(piece['measures']) > 0:
+            self.beats_measure = len(piece['measures'][0])
+
+        # append the measures
+        measures = np.asarray(piece['measures'], dtype=np.uint8).reshape(-1, self.beats_measure)
+        self._measures_file.write(np.ascontiguousarray(measures).tobytes())
+        self.offsets.append(self.offsets[-1] + measures.shape[0])
+
+        # metadata of the piece
+        self.datasets.append(piece['dataset'])
+        self.titles.append(piece['title'])
+        self.paths.append(str(piece['path']))
+        self.ind_pieces.append(int(piece['ind_piece']))
+        self.ind_scores.append(int(piece['ind_score']))
+
+
+    def close(self):
+        """Complete the encoded dataset (saving the matrix of measures, offsets and metadata).
+        """
+
+        if self._measures_file is None:
+            return
+
+        self._measures_file.close()
+        self._measures_file = None
+
+        temp_filename = os.path.join(self.filename, _MEASURES_FILE + '.tmp')
+        measures_filename = os.path.join(self.filename, _MEASURES_FILE)
+        beats_measure = self.beats_measure if self.beats_measure is not None else 0
+
+        # save matrix of measures as a .npy file, copying the temporary file by chunks
+        self._written_files.append(measures_filename)
+        with open(measures_filename, 'wb') as measures_file:
+            np.lib.format.write_array_header_1_0(
+                measures_file, {'descr': np.lib.format.dtype_to_descr(np.dtype(np.uint8)),
+                                'fortran_order': False,
+                                'shape': (self.num_measures, beats_measure)})
+            with open(temp_filename, 'rb') as temp_file:
+                shutil.copyfileobj(temp_file, measures_file)
+        os.remove(temp_filename)
+
+        # save offsets of the pieces
+        offsets = np.array(self.offsets, dtype=np.int64)
+        self._written_files.append(os.path.join(self.filename, _OFFSETS_FILE))
+        np.save(os.path.join(self.filename, _OFFSETS_FILE), offsets)
+
+        # checksum of the content (reading the measures by chunks)
+        measures = np.load(measures_filename, mmap_mode='r') if self.num_measures > 0 else \
+            np.zeros((0, beats_measure), dtype=np.uint8)
+        checksum = _checksum(measures, offsets)
+        del measures
+
+        # metadata (saved last, so an incomplete directory is not a valid dataset)
+        metadata = {"format": _FORMAT_NAME, "version": _FORMAT_VERSION,
+                    "signature": self.signature, "beat_subdivisions": self.beat_subdivisions,
+                    "num_pieces": self.num_pieces, "num_measures": self.num_measures,
+                    "beats_measure": beats_measure, "checksum": checksum,
+                    "datasets": self.datasets, "titles": self.titles, "paths": self.paths,
+                    "ind_pieces": self.ind_pieces, "ind_scores": self.ind_scores}
+
+        self._written_files.append(os.path.join(self.filename, _METADATA_FILE))
+        with open(os.path.join(self.filename, _METADATA_FILE), "w",
+                  encoding="utf-8") as metadata_file:
+            json.dump(metadata, metadata_file, ensure_ascii=False)
+
+        self._complete = True
+
+
+    def abort(self):
+        """Discard the encoded dataset, removing the temporary file and any file written when
+        completing it (a complete dataset is kept).
+        """
+
+        if self._complete:
+            return
+
+        if self._measures_file is not None:
+            self._measures_file.close()
+            self._measures_file = None
+
+        # remove the temporary file of measures and the partial files of the dataset
+        for filename in [os.path.join(self.filename, _MEASURES_FILE + '.tmp')] + \
+                self._written_files:
+            if os.path.exists(filename):
+                os.remove(filename)
+        self._written_files = []
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # complete the dataset, or discard it if an exception was raised
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
 
+
+def convert_encoded_dataset(pkl_filename, filename, signature=None, beat_subdivisions=None):
+    """Convert an encoded dataset saved as a pickle file (previous versions) to a directory.
+
+    Parameters
+    ----------
+    pkl_filename : str
+        file name of the encoded dataset (as a pkl file)
     filename : str
-        path and file name to save the encoded dataset
+        path of the directory to save the encoded dataset
+    signature : str, optional
+        time signature of the encoded pieces
+    beat_subdivisions : int, optional
+        number of (equal) subdivisions of each beat
+
+    Returns
+    -------
+    dataset : EncodedDataset
+        the loaded (memory-mapped) dataset
+    """
+
+    # load the pickle file and save it in the new format
+    save_encoded_dataset(load_encoded_dataset(pkl_filename), filename,
+                         signature=signature, beat_subdivisions=beat_subdivisions)
+
+    return load_encoded_dataset(filename)
+
+
+def _checksum(measures, offsets):
+    """Checksum of the content of an encoded dataset.
+
+    Parameters
+    ----------
+    measures : np.ndarray
+        matrix of measures
+    offsets : np.ndarray
+        offsets of the pieces
+
+    Returns
+    -------
+    checksum : str
+        sha256 hexadecimal digest of the measures and offsets
+    """
+
+    digest = hashlib.sha256()
+    # shape of the matrix
+    digest.update(np.asarray(measures.shape, dtype=np.int64).tobytes())
+    # measures, by chunks of rows (to avoid copying a memory-mapped matrix)
+    chunk = 1 << 16
+    for ind in range(0, measures.shape[0], chunk):
+        digest.update(np.ascontiguousarray(measures[ind:ind+chunk], dtype=np.uint8).tobytes())
+    # offsets of the pieces
+    digest.update(np.asarray(offsets, dtype=np.int64).tobytes())
+
+    return "sha256:" + digest.hexdigest()
+
+
+def _beats_measure(signature, beat_subdivisions):
+    """Number of beat subdivisions per measure for a time signature.
+
+    Parameters
+    ----------
+    signature : str
+        string that defines the time signature
+    beat_subdivisions : int
+        number of subdivisions per beat
+
+    Returns
+    -------
+    beats_measure : int
+        number of beat subdivisions per measure
+    """
+
+    # convert time signature into numerator denominator
+    ts_num, _, _ = util.parse_signature(signature)
+
+    # beats subdivisions per measure
+    return ts_num * beat_subdivisions
+
+
+def _same_meter(signature, time_signature):
+    """Check if a time signature (possibly with the grouping of the beats, e.g. 3+2/4)
+    corresponds to the time signature of a piece.
+
+    Parameters
+    ----------
+    signature : str
+        string that defines the time signature
+    time_signature : str or None
+        time signature of the piece
+
+    Returns
+    -------
+    same_meter : bool
+        True if both have the same number of beats per measure and note value of the beats
+        (False if the time signature of the piece is not valid, e.g. a composite meter)
+
+    Examples
+    --------
+    >>> _same_meter('3+2/4', '5/4')
+    True
+    >>> _same_meter('5/8', '3/8+2/8')
+    False
+    """
+
+    if time_signature is None:
+        return False
+
+    try:
+        piece_signature = util.parse_signature(time_signature)
+    except ValueError:
+        # composite meters (e.g. 3/8+2/8) are not encoded
+        return False
+
+    return util.parse_signature(signature)[:2] == piece_signature[:2]
+
+
+def _configurations(configurations):
+    """List of (signature, beat_subdivisions) of the given configurations, without repetitions.
+
+    Parameters
+    ----------
+    configurations : list of tuples
+        list of (signature, beat_subdivisions)
+
+    Returns
+    -------
+    configurations : list of tuples
+        list of (str, int) in the given order
 
+    Raises
+    ------
+    ValueError
+        If no configuration is given, or a signature is not valid
     """
 
-    pickle.dump(dataset, open(filename, "wb"))
+    checked = []
+    for signature, beat_subdivisions in configurations:
+        configuration = (str(signature), int(beat_subdivisions))
+        # check the signature (and subdivisions) are valid
+        _beats_measure(*configuration)
+        if configuration not in checked:
+            checked.append(configuration)
+
+    if not checked:
+        raise ValueError("No configuration (signature, beat_subdivisions) was given.")
+
+    return checked
+
+
+def _check_parser(parser):
+    """Check that the parser of the music files is valid.
+
+    Parameters
+    ----------
+    parser : str
+        parser of the music files
+
+    Raises
+    ------
+    ValueError
+        If the parser is not one of 'music21', 'native' or 'compare'
+    """
+
+    if parser not in _PARSERS:
+        raise ValueError("Unknown parser %r, it must be one of %s." % (parser, _PARSERS))
+
+
+def _quarantine(quarantine):
+    """Manifest of quarantined files given by its path (or the manifest).
+
+    Parameters
+    ----------
+    quarantine : str, Quarantine or None
+        path of the manifest, or the manifest itself
+
+    Returns
+    -------
+    quarantine : Quarantine or None
+        the manifest, None if not given
+    """
+
+    if quarantine is None or isinstance(quarantine, ingest.Quarantine):
+        return quarantine
+
+    return ingest.Quarantine(quarantine)
+
+
+def _parse_cache(cache):
+    """Cache of parsed files given by a directory (or a cache).
+
+    Parameters
+    ----------
+    cache : str, ParseCache or None
+        directory of the cache, or the cache itself
+
+    Returns
+    -------
+    cache : ParseCache or None
+        the cache, None if not given
+    """
+
+    if cache is None or isinstance(cache, ParseCache):
+        return cache
+
+    return ParseCache(cache)
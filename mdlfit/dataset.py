@@ -0,0 +1,916 @@
+# encoding: utf-8
+# pylint: disable=C0103
+"""
+Dataset
+=======
+
+Encoded datasets
+----------------
+
+.. autosummary::
+    :toctree: generated/
+
+    EncodedDataset
+    PackedDataset
+    SparseDataset
+    pack_measures
+    unpack_measures
+    sparse_measures
+    dense_measures
+
+"""
+
+import abc
+import numpy as np
+
+__all__ = ['BaseDataset', 'EncodedDataset', 'PackedDataset', 'SparseDataset', 'pack_measures',
+           'unpack_measures', 'sparse_measures', 'dense_measures']
+
+# maximum number of positions of a packed measure (the bits of a uint64)
+MAX_PACKED_POSITIONS = 64
+
+
+class BaseDataset(abc.ABC):
+    """Class to represent a generic encoded dataset: the metadata of the pieces, delimited by
+    an array of offsets over the measures, whatever the way the measures are stored. Indexing
+    or iterating the dataset gives a dictionary for each piece, as in a list of pieces, with
+    the measures given by piece_measures.
+
+    Attributes
+    ----------
+    offsets : np.ndarray
+        array (num_pieces + 1) such that the measures of piece i are the measures from
+        offsets[i] to offsets[i+1]
+    datasets : list
+        name of the dataset of each piece
+    titles : list
+        title of each piece
+    paths : list
+        path of the file of each piece
+    ind_pieces : np.ndarray
+        index of each piece in the corpus
+    ind_scores : np.ndarray
+        index of the score of each piece in its file (opus)
+    signature : str or None
+        time signature of the encoded pieces
+    beat_subdivisions : int or None
+        number of (equal) subdivisions of each beat
+
+    Methods
+    -------
+    piece_measures(ind)
+        Measures of a piece (abstract, defined by each dataset)
+    select(indexes)
+        Dataset with the given pieces (abstract, defined by each dataset)
+
+    """
+
+    def __init__(self, offsets, datasets, titles, paths, ind_pieces, ind_scores,
+                 signature=None, beat_subdivisions=None):
+
+        # offsets of the pieces in the measures
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+        # metadata of each piece
+        self.datasets = list(datasets)
+        self.titles = list(titles)
+        self.paths = list(paths)
+        self.ind_pieces = np.asarray(ind_pieces, dtype=np.int64)
+        self.ind_scores = np.asarray(ind_scores, dtype=np.int64)
+
+        # encoding parameters
+        self.signature = signature
+        self.beat_subdivisions = beat_subdivisions
+
+
+    @property
+    def num_pieces(self):
+        """Number of pieces in the dataset"""
+        return self.offsets.shape[0] - 1
+
+
+    @abc.abstractmethod
+    def piece_measures(self, ind):
+        """Measures of a piece, as stored by the dataset.
+
+        Parameters
+        ----------
+        ind : int
+            index of the piece in the dataset
+        """
+
+
+    @abc.abstractmethod
+    def select(self, indexes):
+        """Dataset of the same kind with the given pieces.
+
+        Parameters
+        ----------
+        indexes : list or np.ndarray
+            indexes of the pieces to select
+        """
+
+
+    def _piece_metadata(self, indexes=None):
+        """Metadata of the given pieces, in the order of the arguments of the constructor.
+
+        Parameters
+        ----------
+        indexes : np.ndarray, optional
+            indexes of the pieces (all the pieces if not given)
+
+        Returns
+        -------
+        metadata : tuple
+            datasets, titles, paths, ind_pieces and ind_scores of the pieces
+        """
+
+        if indexes is None:
+            return self.datasets, self.titles, self.paths, self.ind_pieces, self.ind_scores
+
+        return ([self.datasets[ind] for ind in indexes],
+                [self.titles[ind] for ind in indexes],
+                [self.paths[ind] for ind in indexes],
+                self.ind_pieces[indexes], self.ind_scores[indexes])
+
+
+    def _select_pieces(self, indexes):
+        """Measures, offsets and metadata of the given pieces, to select them (see select).
+
+        Parameters
+        ----------
+        indexes : list or np.ndarray
+            indexes of the pieces to select
+
+        Returns
+        -------
+        rows : np.ndarray
+            indexes of the measures of the selected pieces
+        offsets : np.ndarray
+            offsets of the selected pieces in their measures
+        metadata : tuple
+            metadata of the selected pieces (see _piece_metadata)
+        """
+
+        indexes = np.asarray(indexes, dtype=np.int64).reshape(-1)
+
+        # rows of the selected measures and offsets of the pieces in them
+        rows, offsets = _select_rows(self.offsets, indexes)
+
+        return rows, offsets, self._piece_metadata(indexes)
+
+
+    def __len__(self):
+        return self.num_pieces
+
+
+    def __getitem__(self, ind):
+
+        # a slice gives another dataset of the same kind
+        if isinstance(ind, slice):
+            return self.select(np.arange(self.num_pieces)[ind])
+
+        # allow negative indexes as in a list
+        if ind < 0:
+            ind += self.num_pieces
+        if not 0 <= ind < self.num_pieces:
+            raise IndexError("Piece index out of range.")
+
+        return {"dataset": self.datasets[ind], "ind_piece": int(self.ind_pieces[ind]),
+                "title": self.titles[ind], "path": self.paths[ind],
+                "ind_score": int(self.ind_scores[ind]), "measures": self.piece_measures(ind)}
+
+
+    def __iter__(self):
+        for ind in range(self.num_pieces):
+            yield self[ind]
+
+
+class EncodedDataset(BaseDataset):
+    """Class to represent an encoded dataset. The measures of all the pieces are stored in a single
+    matrix of 0s and 1s, one row per measure, and the pieces are delimited by an array of offsets.
+    Indexing or iterating the dataset gives a dictionary for each piece, as in a list of pieces.
+
+    Attributes
+    ----------
+    measures : np.ndarray
+        matrix (num_measures x beats_measure) of uint8 with a 1 for a note onset and 0 otherwise
+    offsets : np.ndarray
+        array (num_pieces + 1) such that measures of piece i are measures[offsets[i]:offsets[i+1]]
+    datasets : list
+        name of the dataset of each piece
+    titles : list
+        title of each piece
+    paths : list
+        path of the file of each piece
+    ind_pieces : np.ndarray
+        index of each piece in the corpus
+    ind_scores : np.ndarray
+        index of the score of each piece in its file (opus)
+    signature : str or None
+        time signature of the encoded pieces
+    beat_subdivisions : int or None
+        number of (equal) subdivisions of each beat
+
+    Methods
+    -------
+    from_pieces(pieces, signature, beat_subdivisions)
+        Create an encoded dataset from a list of pieces
+    select(indexes)
+        Encoded dataset with the given pieces
+    piece_measures(ind)
+        Measures of a piece
+    to_pieces()
+        List of pieces, each one as a dictionary
+    pack()
+        Packed dataset with the same pieces
+    to_sparse()
+        Sparse dataset with the same pieces
+
+    """
+
+    def __init__(self, measures, offsets, datasets, titles, paths, ind_pieces, ind_scores,
+                 signature=None, beat_subdivisions=None):
+
+        # matrix of measures
+        self.measures = measures
+
+        # offsets and metadata of the pieces
+        super().__init__(offsets, datasets, titles, paths, ind_pieces, ind_scores,
+                         signature=signature, beat_subdivisions=beat_subdivisions)
+
+
+    @classmethod
+    def from_pieces(cls, pieces, signature=None, beat_subdivisions=None, beats_measure=None):
+        """Create an encoded dataset from a list of pieces.
+
+        Parameters
+        ----------
+        pieces : list
+            list of dictionaries, each one corresponds to a piece
+        signature : str, optional
+            time signature of the encoded pieces
+        beat_subdivisions : int, optional
+            number of (equal) subdivisions of each beat
+        beats_measure : int, optional
+            number of beat subdivisions per measure (only needed if there are no measures)
+
+        Returns
+        -------
+        dataset : EncodedDataset
+            the encoded dataset
+        """
+
+        # the list of pieces may be given by a generator
+        pieces = list(pieces)
+
+        # number of beat subdivisions per measure
+        if beats_measure is None:
+            beats_measure = next((len(piece['measures'][0]) for piece in pieces
+                                  if len(piece['measures']) > 0), 0)
+
+        # measures of each piece as a matrix
+        piece_matrices = [np.asarray(piece['measures'], dtype=np.uint8).reshape(-1, beats_measure)
+                          for piece in pieces]
+
+        # offsets of the pieces in the matrix of measures
+        offsets = np.zeros((len(pieces) + 1,), dtype=np.int64)
+        offsets[1:] = np.cumsum([matrix.shape[0] for matrix in piece_matrices])
+
+        # a single matrix for all the measures
+        if piece_matrices:
+            measures = np.concatenate(piece_matrices)
+        else:
+            measures = np.zeros((0, beats_measure), dtype=np.uint8)
+
+        return cls(measures, offsets,
+                   [piece['dataset'] for piece in pieces],
+                   [piece['title'] for piece in pieces],
+                   [piece['path'] for piece in pieces],
+                   [piece['ind_piece'] for piece in pieces],
+                   [piece['ind_score'] for piece in pieces],
+                   signature=signature, beat_subdivisions=beat_subdivisions)
+
+
+    @property
+    def num_measures(self):
+        """Total number of measures in the dataset"""
+        return self.measures.shape[0]
+
+
+    @property
+    def beats_measure(self):
+        """Number of beat subdivisions per measure"""
+        return self.measures.shape[1]
+
+
+    def piece_measures(self, ind):
+        """Measures of a piece.
+
+        Parameters
+        ----------
+        ind : int
+            index of the piece in the dataset
+
+        Returns
+        -------
+        measures : np.ndarray
+            matrix (num_measures x beats_measure) of the piece (a view, not a copy)
+        """
+
+        return self.measures[self.offsets[ind]:self.offsets[ind+1]]
+
+
+    def select(self, indexes):
+        """Encoded dataset with the given pieces.
+
+        Parameters
+        ----------
+        indexes : list or np.ndarray
+            indexes of the pieces to select
+
+        Returns
+        -------
+        dataset : EncodedDataset
+            the encoded dataset with the selected pieces
+        """
+
+        # rows of the selected measures and offsets of the pieces in the new matrix
+        rows, offsets, metadata = self._select_pieces(indexes)
+
+        return EncodedDataset(self.measures[rows], offsets, *metadata,
+                              signature=self.signature,
+                              beat_subdivisions=self.beat_subdivisions)
+
+
+    def to_pieces(self):
+        """List of pieces, each one as a dictionary with a list of measures (as numpy arrays).
+
+        Returns
+        -------
+        pieces : list
+            list of dictionaries, each one corresponds to a piece
+        """
+
+        pieces = []
+        for piece in self:
+            piece['measures'] = list(piece['measures'])
+            pieces.append(piece)
+
+        return pieces
+
+
+    def pack(self):
+        """Packed dataset with the same pieces, each measure as a uint64 (see pack_measures).
+
+        Returns
+        -------
+        dataset : PackedDataset
+            the packed dataset
+        """
+
+        return PackedDataset(pack_measures(self.measures), self.offsets, self.beats_measure,
+                             *self._piece_metadata(), signature=self.signature,
+                             beat_subdivisions=self.beat_subdivisions)
+
+
+    def to_sparse(self):
+        """Sparse dataset with the same pieces, with the positions of the onsets of each
+        measure (see sparse_measures).
+
+        Returns
+        -------
+        dataset : SparseDataset
+            the sparse dataset
+        """
+
+        positions, measure_offsets = sparse_measures(self.measures)
+
+        return SparseDataset(positions, measure_offsets, self.offsets, self.beats_measure,
+                             *self._piece_metadata(), signature=self.signature,
+                             beat_subdivisions=self.beat_subdivisions)
+
+
+    def __repr__(self):
+        return ("EncodedDataset(num_pieces=%d, num_measures=%d, beats_measure=%d)" %
+                (self.num_pieces, self.num_measures, self.beats_measure))
+
+
+class PackedDataset(BaseDataset):
+    """Class to represent an encoded dataset with each measure packed in a uint64, the bit i
+    being 1 for a note onset at position i of the measure (see pack_measures), so that it
+    takes 64 times less memory than the matrix of an EncodedDataset (8 times less than the
+    uint8 matrix). The models are fitted from the packed measures directly, counting the bits
+    of the whole dataset at once. Indexing or iterating the dataset gives a dictionary for
+    each piece, with its packed measures.
+
+    Attributes
+    ----------
+    measures : np.ndarray
+        array (num_measures) of uint64 with the packed measures
+    offsets : np.ndarray
+        array (num_pieces + 1) such that measures of piece i are measures[offsets[i]:offsets[i+1]]
+    beats_measure : int
+        number of beat subdivisions per measure (64 at most)
+    datasets : list
+        name of the dataset of each piece
+    titles : list
+        title of each piece
+    paths : list
+        path of the file of each piece
+    ind_pieces : np.ndarray
+        index of each piece in the corpus
+    ind_scores : np.ndarray
+        index of the score of each piece in its file (opus)
+    signature : str or None
+        time signature of the encoded pieces
+    beat_subdivisions : int or None
+        number of (equal) subdivisions of each beat
+
+    Methods
+    -------
+    from_pieces(pieces, signature, beat_subdivisions)
+        Create a packed dataset from a list of pieces
+    select(indexes)
+        Packed dataset with the given pieces
+    piece_measures(ind)
+        Packed measures of a piece
+    unpack()
+        Encoded dataset with the same pieces
+
+    """
+
+    def __init__(self, measures, offsets, beats_measure, datasets, titles, paths, ind_pieces,
+                 ind_scores, signature=None, beat_subdivisions=None):
+
+        if beats_measure > MAX_PACKED_POSITIONS:
+            raise ValueError("Measures of %d positions can not be packed in a uint64."
+                             % beats_measure)
+
+        # packed measures
+        self.measures = np.asarray(measures, dtype=np.uint64)
+        # beats subdivisions per measure
+        self.beats_measure = int(beats_measure)
+
+        # offsets and metadata of the pieces
+        super().__init__(offsets, datasets, titles, paths, ind_pieces, ind_scores,
+                         signature=signature, beat_subdivisions=beat_subdivisions)
+
+
+    @classmethod
+    def from_pieces(cls, pieces, signature=None, beat_subdivisions=None, beats_measure=None):
+        """Create a packed dataset from a list of pieces (with their measures not packed).
+
+        Parameters
+        ----------
+        pieces : list
+            list of dictionaries, each one corresponds to a piece
+        signature : str, optional
+            time signature of the encoded pieces
+        beat_subdivisions : int, optional
+            number of (equal) subdivisions of each beat
+        beats_measure : int, optional
+            number of beat subdivisions per measure (only needed if there are no measures)
+
+        Returns
+        -------
+        dataset : PackedDataset
+            the packed dataset
+        """
+
+        return EncodedDataset.from_pieces(pieces, signature, beat_subdivisions,
+                                          beats_measure).pack()
+
+
+    @property
+    def num_measures(self):
+        """Total number of measures in the dataset"""
+        return self.measures.shape[0]
+
+
+    def piece_measures(self, ind):
+        """Packed measures of a piece.
+
+        Parameters
+        ----------
+        ind : int
+            index of the piece in the dataset
+
+        Returns
+        -------
+        measures : np.ndarray
+            array (num_measures) of uint64 of the piece (a view, not a copy)
+        """
+
+        return self.measures[self.offsets[ind]:self.offsets[ind+1]]
+
+
+    def select(self, indexes):
+        """Packed dataset with the given pieces.
+
+        Parameters
+        ----------
+        indexes : list or np.ndarray
+            indexes of the pieces to select
+
+        Returns
+        -------
+        dataset : PackedDataset
+            the packed dataset with the selected pieces
+        """
+
+        # selected measures and offsets of the pieces in the new array
+        rows, offsets, metadata = self._select_pieces(indexes)
+
+        return PackedDataset(self.measures[rows], offsets, self.beats_measure, *metadata,
+                             signature=self.signature,
+                             beat_subdivisions=self.beat_subdivisions)
+
+
+    def unpack(self):
+        """Encoded dataset with the same pieces (see unpack_measures).
+
+        Returns
+        -------
+        dataset : EncodedDataset
+            the encoded dataset
+        """
+
+        return EncodedDataset(unpack_measures(self.measures, self.beats_measure), self.offsets,
+                              *self._piece_metadata(), signature=self.signature,
+                              beat_subdivisions=self.beat_subdivisions)
+
+
+    def __repr__(self):
+        return ("PackedDataset(num_pieces=%d, num_measures=%d, beats_measure=%d)" %
+                (self.num_pieces, self.num_measures, self.beats_measure))
+
+
+class SparseDataset(BaseDataset):
+    """Class to represent an encoded dataset by the positions of the onsets of each measure,
+    as a compressed sparse row (CSR) matrix: the positions of the onsets of all the measures
+    in a single array, delimited by an array of offsets of the measures, and the pieces
+    delimited by an array of offsets in the measures. Its size is given by the number of
+    onsets rather than by the resolution of the grid, and so is the time to fit the models
+    from it. Indexing or iterating the dataset gives a dictionary for each piece, with the
+    positions of the onsets of each measure.
+
+    Attributes
+    ----------
+    positions : np.ndarray
+        positions of the onsets of all the measures (in increasing order in each measure)
+    measure_offsets : np.ndarray
+        array (num_measures + 1) such that the positions of the onsets of measure i are
+        positions[measure_offsets[i]:measure_offsets[i+1]]
+    offsets : np.ndarray
+        array (num_pieces + 1) such that the measures of piece i are the measures from
+        offsets[i] to offsets[i+1]
+    beats_measure : int
+        number of beat subdivisions per measure
+    datasets : list
+        name of the dataset of each piece
+    titles : list
+        title of each piece
+    paths : list
+        path of the file of each piece
+    ind_pieces : np.ndarray
+        index of each piece in the corpus
+    ind_scores : np.ndarray
+        index of the score of each piece in its file (opus)
+    signature : str or None
+        time signature of the encoded pieces
+    beat_subdivisions : int or None
+        number of (equal) subdivisions of each beat
+
+    Methods
+    -------
+    from_pieces(pieces, signature, beat_subdivisions)
+        Create a sparse dataset from a list of pieces
+    select(indexes)
+        Sparse dataset with the given pieces
+    piece_measures(ind)
+        Positions of the onsets of each measure of a piece
+    to_encoded()
+        Encoded dataset with the same pieces
+
+    """
+
+    def __init__(self, positions, measure_offsets, offsets, beats_measure, datasets, titles,
+                 paths, ind_pieces, ind_scores, signature=None, beat_subdivisions=None):
+
+        # positions of the onsets and offsets of the measures in them
+        self.positions = np.asarray(positions, dtype=np.int64)
+        self.measure_offsets = np.asarray(measure_offsets, dtype=np.int64)
+        # beats subdivisions per measure
+        self.beats_measure = int(beats_measure)
+
+        # offsets and metadata of the pieces
+        super().__init__(offsets, datasets, titles, paths, ind_pieces, ind_scores,
+                         signature=signature, beat_subdivisions=beat_subdivisions)
+
+
+    @classmethod
+    def from_pieces(cls, pieces, signature=None, beat_subdivisions=None, beats_measure=None):
+        """Create a sparse dataset from a list of pieces, with their measures as a matrix of
+        0s and 1s, or as a tuple (positions, measure_offsets) (see dataio.encode_piece). The
+        pieces are converted one by one, so that they can be given by a generator (e.g.
+        dataio.iter_encode_dataset) with no matrix for all the measures.
+
+        Parameters
+        ----------
+        pieces : list
+            list of dictionaries, each one corresponds to a piece
+        signature : str, optional
+            time signature of the encoded pieces
+        beat_subdivisions : int, optional
+            number of (equal) subdivisions of each beat
+        beats_measure : int, optional
+            number of beat subdivisions per measure (needed for sparse measures, or if there
+            are no measures)
+
+        Returns
+        -------
+        dataset : SparseDataset
+            the sparse dataset
+        """
+
+        # positions and number of measures of each piece, and metadata of the pieces
+        piece_positions, piece_offsets, lengths = [], [], []
+        metadata = {key: [] for key in ('dataset', 'title', 'path', 'ind_piece', 'ind_score')}
+
+        for piece in pieces:
+            if isinstance(piece['measures'], tuple):
+                positions, measure_offsets = piece['measures']
+            else:
+                matrix = np.asarray(piece['measures'], dtype=np.uint8)
+                if beats_measure is None and matrix.ndim == 2:
+                    beats_measure = matrix.shape[1]
+                positions, measure_offsets = sparse_measures(matrix.reshape(
+                    -1, beats_measure or 1))
+            # positions and offsets of the measures in the piece
+            piece_positions.append(np.asarray(positions, dtype=np.int64))
+            piece_offsets.append(np.asarray(measure_offsets[1:], dtype=np.int64))
+            lengths.append(len(measure_offsets) - 1)
+            for key, values in metadata.items():
+                values.append(piece[key])
+
+        if beats_measure is None:
+            beats_measure = 0
+
+        # offsets of the measures of each piece after the onsets of the previous pieces
+        num_onsets = np.cumsum([0] + [len(positions) for positions in piece_positions])
+        measure_offsets = np.concatenate([[0]] + [offsets + start for offsets, start
+                                                  in zip(piece_offsets, num_onsets[:-1])])
+        offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+
+        return cls(np.concatenate([np.zeros((0,), dtype=np.int64)] + piece_positions),
+                   measure_offsets, offsets, beats_measure, metadata['dataset'],
+                   metadata['title'], metadata['path'], metadata['ind_piece'],
+                   metadata['ind_score'], signature=signature,
+                   beat_subdivisions=beat_subdivisions)
+
+
+    @property
+    def num_measures(self):
+        """Total number of measures in the dataset"""
+        return self.measure_offsets.shape[0] - 1
+
+
+    @property
+    def num_onsets(self):
+        """Total number of onsets in the dataset"""
+        return self.positions.shape[0]
+
+
+    def piece_measures(self, ind):
+        """Positions of the onsets of each measure of a piece.
+
+        Parameters
+        ----------
+        ind : int
+            index of the piece in the dataset
+
+        Returns
+        -------
+        positions : np.ndarray
+            positions of the onsets of the measures of the piece (a view, not a copy)
+        measure_offsets : np.ndarray
+            offsets of the measures of the piece in its positions
+        """
+
+        measure_offsets = self.measure_offsets[self.offsets[ind]:self.offsets[ind+1] + 1]
+
+        return (self.positions[measure_offsets[0]:measure_offsets[-1]],
+                measure_offsets - measure_offsets[0])
+
+
+    def select(self, indexes):
+        """Sparse dataset with the given pieces.
+
+        Parameters
+        ----------
+        indexes : list or np.ndarray
+            indexes of the pieces to select
+
+        Returns
+        -------
+        dataset : SparseDataset
+            the sparse dataset with the selected pieces
+        """
+
+        # selected measures and offsets of the pieces in the new measures
+        rows, offsets, metadata = self._select_pieces(indexes)
+        # selected onsets and offsets of the measures in the new onsets
+        onsets, measure_offsets = _select_rows(self.measure_offsets, rows)
+
+        return SparseDataset(self.positions[onsets], measure_offsets, offsets,
+                             self.beats_measure, *metadata, signature=self.signature,
+                             beat_subdivisions=self.beat_subdivisions)
+
+
+    def to_encoded(self):
+        """Encoded dataset with the same pieces (see dense_measures).
+
+        Returns
+        -------
+        dataset : EncodedDataset
+            the encoded dataset
+        """
+
+        return EncodedDataset(dense_measures(self.positions, self.measure_offsets,
+                                             self.beats_measure),
+                              self.offsets, *self._piece_metadata(),
+                              signature=self.signature,
+                              beat_subdivisions=self.beat_subdivisions)
+
+
+    def __repr__(self):
+        return ("SparseDataset(num_pieces=%d, num_measures=%d, beats_measure=%d, "
+                "num_onsets=%d)" % (self.num_pieces, self.num_measures, self.beats_measure,
+                                    self.num_onsets))
+
+
+def pack_measures(measures):
+    """Pack each measure (a row of 0s and 1s) in a uint64, the bit i (from the least
+    significant) being the position i of the measure.
+
+    Parameters
+    ----------
+    measures : np.ndarray or list
+        matrix (num_measures x beats_measure) with a 1 for a note onset and 0 otherwise,
+        with 64 positions at most
+
+    Returns
+    -------
+    packed : np.ndarray
+        array (num_measures) of uint64 with the packed measures
+
+    Examples
+    --------
+    >>> pack_measures([[1, 0, 1, 0], [0, 1, 1, 1]])
+    array([ 5, 14], dtype=uint64)
+    """
+
+    measures = np.asarray(measures)
+    if measures.ndim != 2:
+        measures = measures.reshape(measures.shape[0], -1)
+    if measures.shape[1] > MAX_PACKED_POSITIONS:
+        raise ValueError("Measures of %d positions can not be packed in a uint64."
+                         % measures.shape[1])
+
+    # bits of each measure in bytes (the first position in the least significant bit)
+    packed_bytes = np.zeros((measures.shape[0], 8), dtype=np.uint8)
+    bits = np.packbits(measures != 0, axis=1, bitorder='little')
+    packed_bytes[:, :bits.shape[1]] = bits
+
+    # the 8 bytes of each measure as a little-endian uint64
+    return packed_bytes.view('<u8').reshape(-1).astype(np.uint64)
+
+
+def unpack_measures(packed, beats_measure):
+    """Measures (rows of 0s and 1s) from their packed form (see pack_measures).
+
+    Parameters
+    ----------
+    packed : np.ndarray or list
+        array (num_measures) of uint64 with the packed measures
+    beats_measure : int
+        number of beat subdivisions per measure
+
+    Returns
+    -------
+    measures : np.ndarray
+        matrix (num_measures x beats_measure) of uint8 with a 1 for a note onset and 0
+        otherwise
+
+    Examples
+    --------
+    >>> unpack_measures([5, 14], 4)
+    array([[1, 0, 1, 0],
+           [0, 1, 1, 1]], dtype=uint8)
+    """
+
+    # the 8 bytes of each measure (the first position in the least significant bit)
+    packed_bytes = np.asarray(packed, dtype=np.uint64).astype('<u8').view(np.uint8)
+
+    return np.unpackbits(packed_bytes.reshape(-1, 8), axis=1, count=beats_measure,
+                         bitorder='little')
+
+
+def sparse_measures(measures):
+    """Positions of the onsets of each measure (i.e. the compressed sparse rows of the matrix).
+
+    Parameters
+    ----------
+    measures : np.ndarray or list
+        matrix (num_measures x beats_measure) with a 1 for a note onset and 0 otherwise
+
+    Returns
+    -------
+    positions : np.ndarray
+        positions of the onsets of all the measures (in increasing order in each measure)
+    measure_offsets : np.ndarray
+        array (num_measures + 1) such that the positions of the onsets of measure i are
+        positions[measure_offsets[i]:measure_offsets[i+1]]
+
+    Examples
+    --------
+    >>> sparse_measures([[1, 0, 1, 0], [0, 1, 1, 1]])
+    (array([0, 2, 1, 2, 3]), array([0, 2, 5]))
+    """
+
+    measures = np.asarray(measures)
+
+    # measure and position of each onset (in row-major order)
+    rows, positions = np.nonzero(measures)
+    measure_offsets = np.zeros((measures.shape[0] + 1,), dtype=np.int64)
+    measure_offsets[1:] = np.cumsum(np.bincount(rows, minlength=measures.shape[0]))
+
+    return positions.astype(np.int64), measure_offsets
+
+
+def dense_measures(positions, measure_offsets, beats_measure):
+    """Measures (rows of 0s and 1s) from the positions of their onsets (see sparse_measures).
+
+    Parameters
+    ----------
+    positions : np.ndarray or list
+        positions of the onsets of all the measures
+    measure_offsets : np.ndarray or list
+        array (num_measures + 1) of the offsets of the measures in the positions
+    beats_measure : int
+        number of beat subdivisions per measure
+
+    Returns
+    -------
+    measures : np.ndarray
+        matrix (num_measures x beats_measure) of uint8 with a 1 for a note onset and 0
+        otherwise
+
+    Examples
+    --------
+    >>> dense_measures([0, 2, 1, 2, 3], [0, 2, 5], 4)
+    array([[1, 0, 1, 0],
+           [0, 1, 1, 1]], dtype=uint8)
+    """
+
+    measure_offsets = np.asarray(measure_offsets, dtype=np.int64)
+    num_measures = measure_offsets.shape[0] - 1
+
+    measures = np.zeros((num_measures, beats_measure), dtype=np.uint8)
+    measures[np.repeat(np.arange(num_measures), np.diff(measure_offsets)),
+             np.asarray(positions, dtype=np.int64)] = 1
+
+    return measures
+
+
+def _select_rows(offsets, indexes):
+    """Rows of the measures of the given pieces, and offsets of the pieces in the selection.
+
+    Parameters
+    ----------
+    offsets : np.ndarray
+        offsets of the pieces in the measures
+    indexes : np.ndarray
+        indexes of the pieces to select
+
+    Returns
+    -------
+    rows : np.ndarray
+        rows of the measures of the selected pieces
+    offsets : np.ndarray
+        offsets of the selected pieces in the selected measures
+    """
+
+    # number of measures of each selected piece
+    lengths = offsets[indexes + 1] - offsets[indexes]
+
+    # offsets of the pieces in the new matrix of measures
+    new_offsets = np.zeros((indexes.shape[0] + 1,), dtype=np.int64)
+    new_offsets[1:] = np.cumsum(lengths)
+
+    # rows of the selected measures
+    rows = (np.arange(new_offsets[-1]) - np.repeat(new_offsets[:-1], lengths) +
+            np.repeat(offsets[indexes], lengths))
+
+    return rows, new_offsets
@@ -0,0 +1,553 @@
+# encoding: utf-8
+# pylint: disable=C0103
+"""
+Ingest
+======
+
+Fault-isolated processing of music files
+----------------------------------------
+
+.. autosummary::
+    :toctree: generated/
+
+    map_isolated
+    Quarantine
+    IngestStats
+    format_event
+
+"""
+
+import os
+import json
+import time
+import multiprocessing
+import multiprocessing.connection
+import numpy as np
+
+__all__ = ['map_isolated', 'Quarantine', 'IngestStats', 'format_event', 'OUTCOMES']
+
+# outcomes of the scores of a file: encoded, not encoded because the time signature is not
+# the given one or there are several, or encoded but removed as a duplicate of a previous one
+OUTCOMES = ('accepted', 'wrong_meter', 'multiple_meters', 'duplicate')
+
+# times of the processed files
+_TIME_FIELDS = ('parse_time', 'encode_time', 'elapsed')
+
+
+def map_isolated(function, items, n_jobs=1, timeout=None, max_memory=None):
+    """Apply a function to each item in isolated worker processes, so that an item that
+    raises, hangs or takes too much memory does not stop the processing of the others.
+    The outcomes are yielded in the same order as the items.
+
+    Parameters
+    ----------
+    function : callable
+        function called as function(item) (it must be picklable, e.g. a module-level
+        function or a partial of one)
+    items : list
+        list of items to process
+    n_jobs : int or None
+        number of worker processes (None or -1 to use all the CPUs)
+    timeout : float, optional
+        maximum time (in seconds) to process an item, the worker is terminated (and
+        replaced) when it is exceeded
+    max_memory : int, optional
+        maximum size (in bytes) of the address space of each worker (only in Unix systems)
+
+    Returns
+    -------
+    outcomes : generator
+        tuple (result, error, elapsed) for each item, with the result of the function (None
+        if it failed), the error (str, None if it did not fail) and the elapsed time (in
+        seconds)
+    """
+
+    if not items:
+        return
+
+    # number of processes
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count()
+    n_jobs = max(1, min(n_jobs, len(items)))
+
+    # items left (by their index), and outcomes not yet given
+    pending = list(range(len(items)))[::-1]
+    outcomes = {}
+    next_index = 0
+
+    workers = [_Worker(function, max_memory) for _ in range(n_jobs)]
+
+    try:
+        while next_index < len(items):
+            # give an item to each idle worker
+            for worker in workers:
+                if worker.index is None and pending:
+                    index = pending.pop()
+                    worker.submit(index, items[index])
+
+            # wait for an outcome (or until the first timeout)
+            busy = [worker for worker in workers if worker.index is not None]
+            wait_time = None
+            if timeout is not None:
+                wait_time = max(0.0, min(worker.start for worker in busy) + timeout
+                                - time.perf_counter())
+            multiprocessing.connection.wait([worker.connection for worker in busy] +
+                                            [worker.process.sentinel for worker in busy],
+                                            wait_time)
+
+            for ind_worker, worker in enumerate(workers):
+                if worker.index is None:
+                    continue
+                index = worker.index
+                elapsed = time.perf_counter() - worker.start
+
+                if worker.connection.poll():
+                    # the worker has finished the item (or it has died while sending it)
+                    try:
+                        outcomes[index] = worker.connection.recv()
+                        worker.index = None
+                        continue
+                    except (EOFError, OSError):
+                        error = "Worker terminated (exit code %s)." % worker.process.exitcode
+                elif not worker.process.is_alive():
+                    # the worker has died (e.g. killed by the system)
+                    error = "Worker terminated (exit code %s)." % worker.process.exitcode
+                elif timeout is not None and elapsed >= timeout:
+                    error = "Timeout after %.1fs." % elapsed
+                else:
+                    continue
+
+                # replace the worker
+                outcomes[index] = (None, error, elapsed)
+                worker.terminate()
+                workers[ind_worker] = _Worker(function, max_memory)
+
+            # outcomes in the order of the items
+            while next_index in outcomes:
+                yield outcomes.pop(next_index)
+                next_index += 1
+    finally:
+        for worker in workers:
+            worker.close()
+
+
+class _Worker:
+    """Worker process that applies a function to one item at a time."""
+
+    def __init__(self, function, max_memory=None):
+
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_work,
+                                               args=(child_connection, function, max_memory),
+                                               daemon=True)
+        self.process.start()
+        child_connection.close()
+        # index of the item being processed (None if idle) and start time
+        self.index = None
+        self.start = None
+
+
+    def submit(self, index, item):
+        """Process an item"""
+        self.index = index
+        self.start = time.perf_counter()
+        self.connection.send(item)
+
+
+    def terminate(self):
+        """Stop the process (whatever it is doing)"""
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+    def close(self):
+        """Stop the process when it is idle"""
+        if self.index is None and self.process.is_alive():
+            try:
+                self.connection.send(None)
+                self.process.join(1)
+            except OSError:
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+def _work(connection, function, max_memory=None):
+    """Loop of a worker process: apply the function to each item received, sending back the
+    outcome (result, error, elapsed)."""
+
+    # limit the memory of the process
+    if max_memory is not None:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+
+    while True:
+        try:
+            item = connection.recv()
+        except (EOFError, OSError):
+            break
+        if item is None:
+            break
+
+        start = time.perf_counter()
+        try:
+            outcome = (function(item), None)
+        except MemoryError:
+            outcome = (None, "MemoryError: memory limit exceeded.")
+        except Exception as error:  # pylint: disable=broad-except
+            outcome = (None, "%s: %s" % (type(error).__name__, error))
+
+        try:
+            connection.send(outcome + (time.perf_counter() - start,))
+        except Exception as error:  # pylint: disable=broad-except
+            # the result cannot be sent (e.g. it cannot be pickled)
+            connection.send((None, "%s: %s" % (type(error).__name__, error),
+                             time.perf_counter() - start))
+
+
+class Quarantine:
+    """Class to represent a manifest of quarantined music files, the files that could not be
+    processed (they raised an exception, took too long or too much memory).
+
+    The quarantined files are skipped in later runs, unless retry is True or the file has
+    changed (its size or modification time). The files that are processed on a retry are
+    removed from the manifest.
+
+    Attributes
+    ----------
+    filename : str
+        path of the manifest (a json file)
+    retry : bool
+        whether to process the quarantined files again
+    entries : dict
+        dictionary by path of the quarantined files, with the error, the elapsed time (in
+        seconds), and the size and modification time of the file
+
+    Methods
+    -------
+    is_quarantined(path)
+        Check if a file is quarantined (and it has to be skipped)
+    add(path, error, elapsed)
+        Quarantine a file
+    remove(path)
+        Remove a file from the quarantine
+    save()
+        Save the manifest
+
+    """
+
+    def __init__(self, filename, retry=False):
+
+        # path of the manifest and whether to retry the files
+        self.filename = filename
+        self.retry = retry
+
+        # entries of the manifest
+        try:
+            with open(filename) as manifest_file:
+                self.entries = json.load(manifest_file)
+        except (OSError, ValueError):
+            # missing (or incomplete) manifest
+            self.entries = {}
+
+
+    def is_quarantined(self, path):
+        """Check if a file is quarantined (and it has to be skipped).
+
+        Parameters
+        ----------
+        path : str
+            path of the file
+
+        Returns
+        -------
+        quarantined : bool
+            True if the file is in the manifest, it has not changed and retry is False
+        """
+
+        entry = self.entries.get(os.path.abspath(path))
+        if entry is None or self.retry:
+            return False
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return True
+
+        return entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns
+
+
+    def add(self, path, error, elapsed):
+        """Quarantine a file.
+
+        Parameters
+        ----------
+        path : str
+            path of the file
+        error : str
+            error given by the file
+        elapsed : float
+            time taken before the error (in seconds)
+        """
+
+        try:
+            stat = os.stat(path)
+            size, mtime = stat.st_size, stat.st_mtime_ns
+        except OSError:
+            size, mtime = None, None
+
+        self.entries[os.path.abspath(path)] = {'error': error, 'elapsed': elapsed,
+                                               'size': size, 'mtime': mtime}
+
+
+    def remove(self, path):
+        """Remove a file from the quarantine (if it is in it).
+
+        Parameters
+        ----------
+        path : str
+            path of the file
+        """
+
+        self.entries.pop(os.path.abspath(path), None)
+
+
+    def save(self):
+        """Save the manifest.
+        """
+
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        os.makedirs(directory, exist_ok=True)
+
+        # write to a temporary file and rename it, so that the manifest is complete
+        temp_filename = self.filename + '.%d.tmp' % os.getpid()
+        with open(temp_filename, 'w') as manifest_file:
+            json.dump(self.entries, manifest_file, indent=1, sort_keys=True)
+        os.replace(temp_filename, self.filename)
+
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    def __repr__(self):
+        return "Quarantine(filename=%r, retry=%r)" % (self.filename, self.retry)
+
+
+class IngestStats:
+    """Class to represent the statistics of the processing of the files of a dataset, given by
+    the events of the files (see format_event). It can be used as the callback of the encoding
+    functions (e.g. encode_dataset(..., callback=stats.add)).
+
+    Attributes
+    ----------
+    files : int
+        number of files
+    processed : int
+        number of files processed (parsed, or read from the cache)
+    skipped : int
+        number of files skipped by their meters (known with no need to open them)
+    quarantined : int
+        number of files skipped because they are quarantined
+    failures : list
+        list of (path, error, elapsed) of the files that failed
+    scores : int
+        number of scores in the files
+    outcomes : dict
+        number of scores with each outcome (see OUTCOMES)
+    off_grid : int
+        number of onsets out of the grid in the encoded scores
+    times : dict
+        list of the times (in seconds) of the processed files, by field ('parse_time',
+        'encode_time' and 'elapsed')
+    elapsed : float
+        total time (in seconds)
+
+    Methods
+    -------
+    add(event)
+        Add the event of a file
+    stop()
+        Set the total time
+    percentiles(field, q)
+        Percentiles of the times of the processed files
+    report()
+        Text with the totals, the throughput and the failures
+
+    """
+
+    def __init__(self):
+
+        # counts of files and scores
+        self.files = 0
+        self.processed = 0
+        self.skipped = 0
+        self.quarantined = 0
+        self.failures = []
+        self.scores = 0
+        self.outcomes = {outcome: 0 for outcome in OUTCOMES}
+        self.off_grid = 0
+
+        # times of the processed files
+        self.times = {field: [] for field in _TIME_FIELDS}
+
+        # start time and total time
+        self._start = time.perf_counter()
+        self.elapsed = 0.0
+
+
+    def add(self, event):
+        """Add the event of a file.
+
+        Parameters
+        ----------
+        event : dict
+            event of the file (see format_event)
+        """
+
+        self.files += 1
+        if event['status'] == 'processed':
+            self.processed += 1
+            for field in _TIME_FIELDS:
+                self.times[field].append(event[field])
+        elif event['status'] == 'skipped':
+            self.skipped += 1
+        elif event['status'] == 'quarantined':
+            self.quarantined += 1
+        else:
+            self.failures.append((event['path'], event['error'], event['elapsed']))
+
+        self.scores += len(event['outcomes'])
+        for outcome in event['outcomes']:
+            self.outcomes[outcome] += 1
+        self.off_grid += event['off_grid']
+
+
+    def stop(self):
+        """Set the total time (since the statistics were created)."""
+        self.elapsed = time.perf_counter() - self._start
+
+
+    @property
+    def files_per_second(self):
+        """Number of files per second."""
+        return self.files / self.elapsed if self.elapsed > 0 else 0.0
+
+
+    def percentiles(self, field='elapsed', q=(50, 90, 99)):
+        """Percentiles of the times of the processed files.
+
+        Parameters
+        ----------
+        field : str
+            time to consider ('parse_time', 'encode_time' or 'elapsed')
+        q : tuple
+            percentiles to compute (between 0 and 100)
+
+        Returns
+        -------
+        percentiles : dict
+            time (in seconds) of each percentile, 0 if no file has been processed
+        """
+
+        if not self.times[field]:
+            return {percentile: 0.0 for percentile in q}
+
+        return dict(zip(q, np.percentile(self.times[field], q).tolist()))
+
+
+    def report(self):
+        """Text with the totals, the throughput, the percentiles of the times and the failures.
+
+        Returns
+        -------
+        report : str
+            number of files processed, skipped and failed, throughput, outcomes of the scores,
+            percentiles of the times and failures
+        """
+
+        lines = ['%d files (%d scores) in %.1fs, %.1f files/s: %d processed, %d skipped by '
+                 'their meters, %d quarantined, %d failed'
+                 % (self.files, self.scores, self.elapsed, self.files_per_second,
+                    self.processed, self.skipped, self.quarantined, len(self.failures))]
+        lines.append('scores: ' + ', '.join('%d %s' % (self.outcomes[outcome],
+                                                       outcome.replace('_', ' '))
+                                            for outcome in OUTCOMES) +
+                     ', %d onsets out of grid' % self.off_grid)
+        for field in _TIME_FIELDS:
+            percentiles = self.percentiles(field)
+            lines.append('%s (s): total %.2f, ' % (field.replace('_', ' '),
+                                                   sum(self.times[field])) +
+                         ', '.join('p%d %.3f' % item for item in percentiles.items()))
+        for path, error, elapsed in self.failures:
+            lines.append('  failed after %.1fs: %s (%s)' % (elapsed, path, error))
+
+        return '\n'.join(lines)
+
+
+    def __repr__(self):
+        return ("IngestStats(files=%d, processed=%d, skipped=%d, quarantined=%d, failed=%d)"
+                % (self.files, self.processed, self.skipped, self.quarantined,
+                   len(self.failures)))
+
+
+def format_event(event):
+    """Line describing the event of a file.
+
+    The event of a file is a dictionary with the keys:
+
+    - 'ind_file': index of the file in the dataset
+    - 'path': path of the file
+    - 'status': 'processed', 'skipped' (by its meters, known with no need to open it),
+      'quarantined' or 'failed'
+    - 'error': error of the file (None if it has not failed)
+    - 'parse_time': time (in seconds) to parse the file (or read it from the cache)
+    - 'encode_time': time (in seconds) to encode its scores
+    - 'elapsed': total time (in seconds) to process the file
+    - 'outcomes': outcome of each score of the file (see OUTCOMES)
+    - 'off_grid': number of onsets out of the grid in the encoded scores
+    - 'music21_time' and 'native_time': time (in seconds) taken by each parser, only if
+      they are compared (parser 'compare')
+
+    Parameters
+    ----------
+    event : dict
+        event of a file
+
+    Returns
+    -------
+    line : str
+        index, path, status, outcomes of the scores and times of the file
+    """
+
+    line = '%d %s: %s' % (event['ind_file'], event['path'], event['status'])
+
+    if event['status'] == 'failed':
+        return line + ' after %.1fs (%s)' % (event['elapsed'], event['error'])
+
+    # number of scores with each outcome
+    counts = [(outcome, event['outcomes'].count(outcome)) for outcome in OUTCOMES]
+    line += ''.join(', %d %s' % (count, outcome.replace('_', ' '))
+                    for outcome, count in counts if count)
+    if event['off_grid']:
+        line += ', %d onsets out of grid' % event['off_grid']
+    if event['status'] == 'processed':
+        line += ' (parse %.3fs, encode %.3fs)' % (event['parse_time'], event['encode_time'])
+    if 'music21_time' in event:
+        line += ', music21 %.3fs, native %.3fs (%s)' % (
+            event['music21_time'], event['native_time'],
+            _speedup(event['music21_time'], event['native_time']))
+
+    return line
+
+
+def _speedup(slow_time, fast_time):
+    """Ratio of two times as text (e.g. 12.1x), with no division by a zero time"""
+
+    if fast_time > 0:
+        return '%.1fx' % (slow_time / fast_time)
+
+    return 'n/a'
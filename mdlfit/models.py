@@ -15,14 +15,29 @@ Defining, fitting and applying models
     RefinedPosition
     Hierarchical
     RefinedHierarchical
+    Statistics
+    FitResult
+    CrossValidationResult
+    fit_all
+    fit_parallel
+    cross_validate
 
 """
 
+import os
+import copy
+import json
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import numpy as np
 from . import util
+from .dataset import EncodedDataset
+from .dataset import PackedDataset
+from .dataset import SparseDataset
 
 __all__ = ['Model', 'Bernoulli', 'Position', 'RefinedPosition',
-           'Hierarchical', 'RefinedHierarchical', 'createModel']
+           'Hierarchical', 'RefinedHierarchical', 'Statistics', 'FitResult', 'createModel',
+           'CrossValidationResult', 'fit_all', 'fit_parallel', 'cross_validate']
 
 def createModel(model_string, dataset, signature, beat_subdivisions, d=None):
     """ Function to create a model of any kind.
@@ -32,8 +47,9 @@ def createModel(model_string, dataset, signature, beat_subdivisions, d=None):
     model_string : str
         name of the model to create (Bernoulli, Position, RefinedPosition, Hierarchical,
         RefinedHierarchical)
-    dataset : list
-        list of dictionaries, each one corresponds to a piece
+    dataset : list, EncodedDataset, PackedDataset or SparseDataset
+        list of dictionaries, each one corresponds to a piece (or an encoded dataset, whose
+        packed measures are fitted counting their bits)
     signature : str
         string denoting the time signature to consider.
         Only pieces with that time signature (exclusively) will be encoded.
@@ -69,6 +85,246 @@ def createModel(model_string, dataset, signature, beat_subdivisions, d=None):
     return model
 
 
+def fit_all(dataset, signature, beat_subdivisions, precisions=None):
+    """ Function to fit all the models at once, for several precision values.
+
+    The dataset is visited only once, counting the onsets by position, anchor type and
+    onset, and the statistics of every model are obtained from these counts.
+
+    Parameters
+    ----------
+    dataset : list, EncodedDataset, PackedDataset or SparseDataset
+        list of dictionaries, each one corresponds to a piece (or an encoded dataset, whose
+        packed measures are fitted counting their bits)
+    signature : str
+        string denoting the time signature to consider.
+    beat_subdivisions : int
+        number of (equal) subdivisions of each beat.
+    precisions : list, optional
+        precision values (by default powers of two from 2 to 4096)
+
+    Returns
+    -------
+    result : FitResult
+        description length of each model for each precision value, and optimal precisions
+
+    """
+
+    # determine the metric grid (levels and neighbours of each position)
+    grid = util.metric_grid(signature, beat_subdivisions)
+
+    # count the onsets of the dataset by position, anchor type and onset
+    cube = _contingency_cube(dataset, grid)
+
+    # statistics of each model
+    statistics = _cube_statistics(cube, grid, dataset[0]['dataset'], len(dataset))
+
+    return FitResult.from_statistics(statistics, precisions)
+
+
+def fit_parallel(dataset, signature, beat_subdivisions, n_jobs=None, precisions=None):
+    """ Function to fit all the models at once (as fit_all), splitting the dataset into
+    shards of consecutive pieces fitted in separate processes.
+
+    The statistics of each shard are added up to give the statistics of the whole dataset
+    (see Statistics.merge), which are exactly the ones given by fit_all since no anchor
+    crosses the boundary between two pieces.
+
+    Parameters
+    ----------
+    dataset : list, EncodedDataset, PackedDataset or SparseDataset
+        list of dictionaries, each one corresponds to a piece (or an encoded dataset)
+    signature : str
+        string denoting the time signature to consider.
+    beat_subdivisions : int
+        number of (equal) subdivisions of each beat.
+    n_jobs : int or None
+        number of worker processes (1 to fit the dataset serially, None or -1 to use all
+        the CPUs), the dataset is split into as many shards with a similar number of measures
+    precisions : list, optional
+        precision values (by default powers of two from 2 to 4096)
+
+    Returns
+    -------
+    result : FitResult
+        description length of each model for each precision value, and optimal precisions
+
+    Examples
+    --------
+    >>> result = fit_parallel(dataset, '2/4', 2, n_jobs=4)
+    >>> result.show()
+    """
+
+    # number of processes
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count()
+
+    # shards of consecutive pieces (with some pieces each)
+    bounds = _shard_bounds(dataset, n_jobs)
+    shards = [_dataset_shard(dataset, start, stop)
+              for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+    # statistics of each model for each shard
+    if n_jobs == 1 or len(shards) == 1:
+        shard_statistics = [_shard_statistics(shard, signature, beat_subdivisions)
+                            for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(shards))) as executor:
+            shard_statistics = list(executor.map(_shard_statistics, shards, repeat(signature),
+                                                 repeat(beat_subdivisions)))
+
+    # statistics of the whole dataset, named as the first piece (as in fit_all)
+    statistics = {}
+    for model_name in shard_statistics[0]:
+        statistics[model_name] = Statistics.merge([shard[model_name]
+                                                   for shard in shard_statistics])
+        statistics[model_name].dataset_name = dataset[0]['dataset']
+
+    return FitResult.from_statistics(statistics, precisions)
+
+
+def _dataset_beats_measure(dataset):
+    """Number of beat subdivisions per measure of the pieces of a dataset"""
+
+    if isinstance(dataset, (PackedDataset, SparseDataset)):
+        return dataset.beats_measure
+    if isinstance(dataset, EncodedDataset):
+        return dataset.measures.shape[1]
+
+    return dataset[0]['measures'][0].shape[0]
+
+
+def _shard_bounds(dataset, num_shards):
+    """Index of the first piece of each shard (and number of pieces), so that the shards have
+    a similar number of measures (or of pieces, for a list of pieces)"""
+
+    if isinstance(dataset, (EncodedDataset, PackedDataset, SparseDataset)):
+        # split the measures evenly, at the closest boundary between pieces
+        measures = np.linspace(0, dataset.num_measures, num_shards + 1)
+        bounds = np.searchsorted(dataset.offsets, measures)
+    else:
+        bounds = np.linspace(0, len(dataset), num_shards + 1).round().astype(int)
+    bounds[0], bounds[-1] = 0, len(dataset)
+
+    return np.maximum.accumulate(np.minimum(bounds, len(dataset)))
+
+
+def _dataset_shard(dataset, start, stop):
+    """Pieces from start to stop (excluded) of a dataset, of the same kind"""
+
+    if isinstance(dataset, (EncodedDataset, PackedDataset, SparseDataset)):
+        return dataset.select(np.arange(start, stop))
+
+    return list(dataset[start:stop])
+
+
+def _shard_statistics(dataset, signature, beat_subdivisions):
+    """Statistics of every model for a shard of a dataset (run in a worker process)"""
+
+    grid = util.metric_grid(signature, beat_subdivisions)
+
+    return _cube_statistics(_contingency_cube(dataset, grid), grid, dataset[0]['dataset'],
+                            len(dataset))
+
+
+def cross_validate(dataset, signature, beat_subdivisions, folds=None, d=None, smoothing=0):
+    """ Function to compute the cross-validated description length of all the models, i.e.
+    the code length of the pieces of each fold with the models fitted from the rest of the
+    pieces (leave-one-out by default).
+
+    The dataset is visited only once, counting the onsets of each piece by position, anchor
+    type and onset. The counts of each fold are added up from the ones of its pieces, and
+    the counts of the rest of the pieces are given by subtracting them from the totals (no
+    anchor crosses the boundary between two pieces), so that no model is fitted for each
+    fold: the parameters and the code lengths of every fold are computed at once for each
+    model.
+
+    Parameters
+    ----------
+    dataset : list, EncodedDataset, PackedDataset or SparseDataset
+        list of dictionaries, each one corresponds to a piece (or an encoded dataset)
+    signature : str
+        string denoting the time signature to consider.
+    beat_subdivisions : int
+        number of (equal) subdivisions of each beat.
+    folds : int, list or None
+        number of folds of consecutive pieces (with a similar number of pieces), or fold of
+        each piece (e.g. shuffled), None to leave out each piece (leave-one-out)
+    d : int, optional
+        Precision parameter of the fitted models (by default the relative frequencies are
+        not quantized, as for the default precision)
+    smoothing : float
+        number of onsets and of locations with no onset added to the counts of each parameter
+        of the fitted models (additive smoothing), so that the onsets (or the locations with
+        no onset) of the held-out pieces that are never seen in the rest of the pieces have
+        a finite code length (0 to use the fitted models as they are)
+
+    Returns
+    -------
+    result : CrossValidationResult
+        code length of the held-out pieces of each fold for each model
+
+    Examples
+    --------
+    >>> result = cross_validate(dataset, '2/4', 2, folds=10, smoothing=0.5)
+    >>> result.show()
+    """
+
+    # determine the metric grid (levels and neighbours of each position)
+    grid = util.metric_grid(signature, beat_subdivisions)
+    num_pieces = len(dataset)
+
+    # fold of each piece
+    if folds is None:
+        folds = np.arange(num_pieces)
+    elif np.ndim(folds) == 0:
+        folds = np.arange(num_pieces) * int(folds) // max(num_pieces, 1)
+    folds = np.asarray(folds, dtype=np.intp)
+    if folds.shape != (num_pieces,) or (num_pieces and folds.min() < 0):
+        raise ValueError("A fold (non negative) must be given for each of the %d pieces."
+                         % num_pieces)
+    num_folds = int(folds.max()) + 1 if num_pieces else 0
+
+    # counts of each piece, added up for each fold, and for the whole dataset
+    piece_cubes = _piece_cubes(dataset, grid).reshape(num_pieces, -1)
+    fold_cubes = np.zeros((num_folds, piece_cubes.shape[1]), dtype=np.int64)
+    np.add.at(fold_cubes, folds, piece_cubes)
+    fold_cubes = fold_cubes.reshape((num_folds,) + (grid.beats_measure, 4, 2))
+    total_cube = fold_cubes.sum(axis=0)
+    statistics = _cube_statistics(total_cube, grid, dataset[0]['dataset'], num_pieces)
+
+    code_lengths = []
+    for model_name, model_statistics in statistics.items():
+        model_class = globals()[model_name]
+        # counts of the held-out pieces of each fold, and of the rest of the pieces
+        held_out = _cube_counts(fold_cubes, grid, model_statistics)
+        fitted = model_statistics.counts - held_out
+
+        # number of onsets and of locations for each parameter (num_parameters x num_folds)
+        onsets, trials = _batch_parameters(model_class, model_statistics, fitted)
+        test_onsets, test_trials = _batch_parameters(model_class, model_statistics, held_out)
+
+        # parameters fitted from the rest of the pieces (as the models, with smoothing)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = np.where(trials + 2*smoothing > 0,
+                              (onsets + smoothing) / (trials + 2*smoothing), 0)
+        if d is not None:
+            ratios = util.optimal_value(d, ratios, trials, onsets)
+
+        # code length of the held-out pieces (no bits for the outcomes that are not given)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bits = -(np.where(test_onsets > 0, test_onsets * np.log2(ratios), 0) +
+                     np.where(test_trials > test_onsets,
+                              (test_trials - test_onsets) * np.log2(1 - ratios), 0))
+        code_lengths.append(bits.sum(axis=0))
+
+    # number of measures of the held-out pieces of each fold
+    fold_measures = fold_cubes[:, 0].sum(axis=(1, 2))
+
+    return CrossValidationResult(list(statistics.keys()), folds, np.array(code_lengths),
+                                 fold_measures)
+
+
 class Model:
     """Class to represent a generic model
 
@@ -85,6 +341,22 @@ class Model:
     -------
     fit(dataset)
         Fit model parameters from dataset
+    estimate()
+        Estimate model parameters from counts
+    set_precision(d)
+        Set precision parameter and compute description length
+    with_precision(d)
+        Copy of the model with another precision parameter
+    dl_for(d_array)
+        Description length for several precision values
+    statistics()
+        Sufficient statistics of the fitted model
+    from_statistics(statistics, d)
+        Create a model from sufficient statistics
+    add_pieces(pieces)
+        Update the model with the counts of some pieces
+    remove_pieces(pieces)
+        Update the model removing the counts of some pieces
     description_length()
         Compute description length
     show()
@@ -102,14 +374,190 @@ class Model:
         self.dataset_name = dataset[0]['dataset']
 
         # beats subdivisions per measure
-        self.beats_measure = dataset[0]['measures'][0].shape[0]
+        self.beats_measure = _dataset_beats_measure(dataset)
 
-        # determine the metric levels
-        self.levels = util.metric_levels(signature, beat_subdivisions)
+        # encoding parameters
+        self.signature = signature
+        self.beat_subdivisions = beat_subdivisions
+
+        # determine the metric grid (levels and neighbours of each position)
+        self.grid = util.metric_grid(signature, beat_subdivisions)
+        self.levels = list(self.grid.levels)
+
+        # check the dataset is encoded with the same grid
+        if self.beats_measure != self.grid.beats_measure:
+            raise ValueError("Measures of %d positions do not correspond to %s with %d "
+                             "subdivisions per beat." % (self.beats_measure, signature,
+                                                          beat_subdivisions))
 
         # fit the model using dataset
         self.fit(dataset)
 
+        # set the precision parameter d and compute description length
+        self.set_precision(d)
+
+
+    @classmethod
+    def from_statistics(cls, statistics, d=None):
+        """Create a model from sufficient statistics, without fitting a dataset
+
+        Parameters
+        ----------
+        statistics : Statistics
+            sufficient statistics of a model of the same class
+        d : int, optional
+            Precision parameter
+
+        Returns
+        -------
+        model : Model
+            a model of this class
+        """
+
+        # check statistics correspond to this kind of model
+        if statistics.model != cls.__name__:
+            raise ValueError("Statistics of a " + statistics.model + " model can not be used "
+                             "to create a " + cls.__name__ + " model.")
+
+        # create the model without calling the constructor (i.e. without fitting)
+        model = cls.__new__(cls)
+
+        # dataset information
+        model.dataset_name = statistics.dataset_name
+        model.beats_measure = statistics.beats_measure
+        model.levels = list(statistics.levels)
+
+        # encoding parameters and metric grid (if known)
+        model.signature = statistics.signature
+        model.beat_subdivisions = statistics.beat_subdivisions
+        model.grid = None
+        if statistics.signature is not None:
+            model.grid = util.metric_grid(statistics.signature, statistics.beat_subdivisions)
+
+        # counts used by the model, and parameters estimated from them
+        model._set_counts(statistics)
+
+        # set the precision parameter d and compute description length
+        model.set_precision(d)
+
+        return model
+
+
+    def _set_counts(self, statistics):
+        """Set the counts of the model from its statistics and estimate its parameters
+
+        Parameters
+        ----------
+        statistics : Statistics
+            sufficient statistics of a model of the same class
+        """
+
+        # number of pieces
+        self.num_pieces = statistics.num_pieces
+
+        # number of beat position (i.e. 0s and 1s) and of measures
+        self.n = statistics.n
+        self.len_measures = statistics.n / statistics.beats_measure
+
+        # counts used by the model (copied to avoid sharing them)
+        if statistics.n1 is not None:
+            self.n1 = copy.deepcopy(statistics.n1)
+        if statistics.onsets is not None:
+            self.onsets = copy.deepcopy(statistics.onsets)
+        if statistics.anchors is not None:
+            self.anchors = copy.deepcopy(statistics.anchors)
+
+        # estimate parameters from counts
+        self.estimate()
+
+
+    def add_pieces(self, pieces):
+        """Update the model with the counts of some pieces, as if they were fitted with the
+        rest of the dataset, and compute its parameters and description length again (for
+        the same precision, or for the default precision of the new number of positions).
+        Only the given pieces are visited, and the model is the same as if fitted from the
+        whole dataset, since no anchor crosses the boundary between two pieces (the downbeat
+        of the measure after the last one of a piece is not an anchor).
+
+        Parameters
+        ----------
+        pieces : list, EncodedDataset, PackedDataset or SparseDataset
+            list of dictionaries, each one corresponds to a piece (or an encoded dataset)
+        """
+
+        self._update(pieces, remove=False)
+
+
+    def remove_pieces(self, pieces):
+        """Update the model removing the counts of some pieces of the fitted dataset, and
+        compute its parameters and description length again (as add_pieces). The pieces are
+        not looked up in the dataset, they must have been fitted (or added) before.
+
+        Parameters
+        ----------
+        pieces : list, EncodedDataset, PackedDataset or SparseDataset
+            list of dictionaries, each one corresponds to a piece (or an encoded dataset)
+        """
+
+        self._update(pieces, remove=True)
+
+
+    def _update(self, pieces, remove=False):
+        """Add (or remove) the counts of some pieces to the model (see add_pieces)"""
+
+        if len(pieces) == 0:
+            return
+
+        # the pieces are counted with the metric grid of the model
+        if self.grid is None:
+            raise ValueError("The model has no time signature, the pieces can not be counted.")
+        if _dataset_beats_measure(pieces) != self.beats_measure:
+            raise ValueError("Measures of %d positions do not correspond to %s with %d "
+                             "subdivisions per beat." % (_dataset_beats_measure(pieces),
+                                                          self.signature,
+                                                          self.beat_subdivisions))
+
+        # statistics of the pieces for this model
+        cube = _contingency_cube(pieces, self.grid)
+        change = _cube_statistics(cube, self.grid, self.dataset_name,
+                                  len(pieces))[self.__class__.__name__]
+
+        # counts of the updated dataset
+        if remove:
+            self._set_counts(self.statistics() - change)
+        else:
+            self._set_counts(self.statistics() + change)
+
+        # description length for the same precision (or the new default one)
+        self.set_precision(None if self.default_precision else self.d)
+
+
+    def statistics(self):
+        """Sufficient statistics of the fitted model
+
+        Returns
+        -------
+        statistics : Statistics
+            counts from which the model can be rebuilt for any precision
+        """
+
+        return Statistics(self.__class__.__name__, self.dataset_name, self.num_pieces,
+                          self.beats_measure, self.levels, self.n,
+                          n1=copy.deepcopy(getattr(self, 'n1', None)),
+                          onsets=copy.deepcopy(getattr(self, 'onsets', None)),
+                          anchors=copy.deepcopy(getattr(self, 'anchors', None)),
+                          signature=self.signature, beat_subdivisions=self.beat_subdivisions)
+
+
+    def set_precision(self, d=None):
+        """Set the precision parameter and compute description length
+
+        Parameters
+        ----------
+        d : int, optional
+            Precision parameter (default sqrt(n) with n total number of beat positions)
+        """
+
         # set the precision parameter d
         if d is None:
             self.d = np.sqrt(self.n)
@@ -122,6 +570,111 @@ class Model:
         self.description_length()
 
 
+    def with_precision(self, d=None):
+        """Copy of the model using another precision parameter (the dataset is not fitted again)
+
+        Parameters
+        ----------
+        d : int, optional
+            Precision parameter
+
+        Returns
+        -------
+        model : Model
+            a model of the same class with the given precision
+        """
+
+        return self.from_statistics(self.statistics(), d=d)
+
+
+    def dl_for(self, d_array):
+        """Compute description length for several precision values (using the counts only)
+
+        Parameters
+        ----------
+        d_array : list or np.ndarray
+            precision values
+
+        Returns
+        -------
+        dls : np.ndarray
+            description length per measure for each precision value
+        """
+
+        # number of onsets and of locations for each parameter
+        onsets, trials = self._parameters()
+        # relative frequencies
+        ratios = self._ratios(onsets, trials)
+
+        # optimal discrete value of the parameters for all the precision values at once
+        d_ratios = util.optimal_value(np.asarray(d_array)[:, np.newaxis], ratios, trials, onsets)
+
+        # description length for each precision value
+        dls = np.zeros((len(d_array),))
+        for ind_d, d in enumerate(d_array):
+            dls[ind_d] = self._dl(list(d_ratios[ind_d]), onsets, trials, d)
+
+        return dls
+
+
+    def estimate(self):
+        """Estimate model parameters as relative frequencies of onsets
+        """
+
+        # number of onsets and of locations for each parameter
+        onsets, trials = self._parameters()
+        # save relative frequencies
+        self._set_ratios(self._ratios(onsets, trials))
+
+
+    def _parameters(self):
+        """Number of onsets and number of locations for each model parameter
+
+        Returns
+        -------
+        onsets : list
+            number of onsets (i.e. 1s) for each parameter
+        trials : list
+            number of locations (i.e. 0s and 1s) for each parameter
+        """
+
+        return [], []
+
+
+    def _set_ratios(self, ratios):
+        """Save model parameters
+
+        Parameters
+        ----------
+        ratios : list
+            value of each parameter, in the same order as given by _parameters()
+        """
+
+
+    @staticmethod
+    def _ratios(onsets, trials):
+        """Relative frequencies of onsets (zero if there are no locations)
+        """
+
+        return [n1/n if n != 0 else 0 for (n1, n) in zip(onsets, trials)]
+
+
+    def _dl(self, ratios, onsets, trials, d):
+        """Description length per measure for the given parameter values and precision
+        """
+
+        # dataset description length
+        dataset_dl = 0
+        for (e, n) in zip(ratios, trials):
+            dataset_dl += - n * (e * util.log2(e) + (1-e) * util.log2(1-e))
+
+        # model description length
+        model_dl = (len(ratios) + 1) * np.log2(d)
+
+        # total description length per measure
+        return (dataset_dl + model_dl) / self.len_measures
+
+
     def fit(self, dataset):
         """Fit model parameters from dataset
         
@@ -134,10 +687,14 @@ class Model:
         # total number of beat position (i.e. 0s and 1s)
         n = 0
 
-        # for each piece in the dataset
-        for piece in dataset:
-            # add total number of 0s and 1s in piece
-            n += len(piece['measures']) * self.beats_measure
+        if isinstance(dataset, (EncodedDataset, PackedDataset, SparseDataset)):
+            # all the measures are in a single matrix (or array of packed or sparse measures)
+            n = dataset.num_measures * self.beats_measure
+        else:
+            # for each piece in the dataset
+            for piece in dataset:
+                # add total number of 0s and 1s in piece
+                n += len(piece['measures']) * self.beats_measure
 
         # save number of beat position (i.e. 0s and 1s)
         self.n = n
@@ -149,7 +706,21 @@ class Model:
         """Compute description length
         """
 
-        self.dl = 0
+        # number of onsets and of locations for each parameter
+        onsets, trials = self._parameters()
+        # relative frequencies
+        ratios = self._ratios(onsets, trials)
+
+        # if not default precision then compute the optimal
+        # discrete value of the parameters given the precision
+        if not self.default_precision:
+            ratios = list(util.optimal_value(self.d, ratios, trials, onsets))
+
+        # save parameters
+        self._set_ratios(ratios)
+
+        # total description length per measure
+        self.dl = self._dl(ratios, onsets, trials, self.d)
 
 
     def show(self, colwidth=50):
@@ -230,40 +801,41 @@ class Bernoulli(Model):
 
         super().fit(dataset)
 
-        # number of onsets (i.e. 1s)
-        n1 = 0
+        # number of onsets (i.e. 1s), adding up the onsets at each position
+        self.n1 = int(np.sum(_column_sums(dataset, self.beats_measure)))
+        # save proportion
+        self.estimate()
 
-        # for each piece in the dataset
-        for piece in dataset:
-            # for each measure in piece
-            for measure in piece['measures']:
-                # add the number of 1s in measure
-                n1 += np.sum(measure)
 
-        # save number of onset (i.e. 1s)
-        self.n1 = n1
-        # save proportion
-        self.p = n1/self.n
+    def _parameters(self):
+        """Number of onsets and number of locations for each model parameter
+        """
 
+        return [self.n1], [self.n]
 
 
-    def description_length(self):
-        """Compute description length
+    def _set_ratios(self, ratios):
+        """Save model parameters
         """
 
-        # if not default precision then compute the optimal
-        # discrete value of the parameters given the precision
-        if not self.default_precision:
-            self.p = util.optimal_value(self.d, self.p, self.n, self.n1)
+        # proportion of 1s
+        self.p = ratios[0]
+
+
+    def _dl(self, ratios, onsets, trials, d):
+        """Description length per measure for the given parameter values and precision
+        """
 
+        # proportion of 1s
+        p = ratios[0]
 
         # dataset description length
-        dataset_dl = - (self.n1 * util.log2(self.p) + (self.n - self.n1) * util.log2(1-self.p))
+        dataset_dl = - (onsets[0] * util.log2(p) + (trials[0] - onsets[0]) * util.log2(1-p))
         # model description length
-        model_dl = 2 * np.log2(self.d)
+        model_dl = 2 * np.log2(d)
 
         # total description length per measure
-        self.dl = (dataset_dl + model_dl) / self.len_measures
+        return (dataset_dl + model_dl) / self.len_measures
 
 
     def show(self, colwidth=50):
@@ -324,43 +896,32 @@ class Position(Model):
         super().fit(dataset)
 
         # number of onsets on each metrical position
-        self.onsets = self.levels[0]*[0]
-        for piece in dataset:
-            for k in range(self.beats_measure):
-                # sum onsets in each metrical level for all measures in piece
-                self.onsets[self.levels[k]-1] += sum([measure[k] == 1
-                                                      for measure in piece['measures']])
+        column_sums = _column_sums(dataset, self.beats_measure)
+        # sum onsets in each metrical level
+        onsets = np.zeros((self.grid.num_levels,), dtype=np.int64)
+        np.add.at(onsets, self.grid.level_index, column_sums)
+        self.onsets = onsets.tolist()
 
         # get rate instead of absolute quantity
-        self.ratios = [self.onsets[i]/(self.len_measures * self.levels.count(i+1))
-                       for i in range(len(self.onsets))]
-
+        self.estimate()
 
 
-    def description_length(self):
-        """Compute description length
+    def _parameters(self):
+        """Number of onsets and number of locations for each model parameter
         """
 
-        # if not default precision then compute the optimal
-        # discrete value of the parameters given the precision
-        if not self.default_precision:
-            # for each parameter
-            for ind in range(len(self.ratios)):
-                self.ratios[ind] = util.optimal_value(self.d, self.ratios[ind],
-                                                      self.len_measures * self.levels.count(ind+1),
-                                                      self.onsets[ind])
+        # each metrical level is observed once per measure for each of its positions
+        trials = [self.len_measures * self.levels.count(i+1) for i in range(len(self.onsets))]
 
-        # dataset description length
-        dataset_dl = - (self.len_measures *
-                        sum([self.ratios[x-1]*util.log2(self.ratios[x-1]) +
-                             (1-self.ratios[x-1])*util.log2(1-self.ratios[x-1])
-                             for x in self.levels]))
+        return self.onsets, trials
 
-        # model description length
-        model_dl = (len(self.ratios) + 1) * np.log2(self.d)
 
-        # total description length per measure
-        self.dl = (dataset_dl + model_dl) / self.len_measures
+    def _set_ratios(self, ratios):
+        """Save model parameters
+        """
+
+        # onset ratio of each metrical level
+        self.ratios = list(ratios)
 
 
     def show(self, colwidth=50):
@@ -420,38 +981,28 @@ class RefinedPosition(Model):
         super().fit(dataset)
 
         # number of onsets on each metrical position
-        self.onsets = self.beats_measure*[0]
-        for piece in dataset:
-            for k in range(self.beats_measure):
-                # sum onsets in each metrical position for all measures in piece
-                self.onsets[k] += sum([measure[k] == 1 for measure in piece['measures']])
+        self.onsets = _column_sums(dataset, self.beats_measure).tolist()
 
         # get rate instead of absolute quantity
-        self.ratios = [i/self.len_measures for i in self.onsets]
-
+        self.estimate()
 
 
-    def description_length(self):
-        """Compute description length
+    def _parameters(self):
+        """Number of onsets and number of locations for each model parameter
         """
 
-        # if not default precision then compute the optimal
-        # discrete value of the parameters given the precision
-        if not self.default_precision:
-            # for each parameter
-            for ind in range(len(self.ratios)):
-                self.ratios[ind] = util.optimal_value(self.d, self.ratios[ind],
-                                                      self.len_measures,
-                                                      self.onsets[ind])
+        # each position is observed once per measure
+        trials = self.beats_measure * [self.len_measures]
 
-        # dataset description length
-        dataset_dl = - (self.len_measures *
-                        sum([x*util.log2(x) + (1-x)*util.log2(1-x) for x in self.ratios]))
-        # model description length
-        model_dl = (self.beats_measure +1)*np.log2(self.d)
+        return self.onsets, trials
 
-        # total description length per measure
-        self.dl = (dataset_dl + model_dl) / self.len_measures
+
+    def _set_ratios(self, ratios):
+        """Save model parameters
+        """
+
+        # onset ratio of each metrical position
+        self.ratios = list(ratios)
 
 
     def show(self, colwidth=80):
@@ -512,153 +1063,38 @@ class Hierarchical(Model):
 
         super().fit(dataset)
 
-        # number of onsets of each anchor type, and downbeat
-        self.onsets = {'pre': (self.levels[0] -1)*[0],
-                       'pos': (self.levels[0] -1)*[0],
-                       'un': (self.levels[0] -1)*[0],
-                       'bi': (self.levels[0] -1)*[0],
-                       'db': [0]}
-
-        # number of instances of each anchor type, and downbeat
-        self.anchors = {'pre': (self.levels[0] -1)*[0],
-                        'pos': (self.levels[0] -1)*[0],
-                        'un': (self.levels[0] -1)*[0],
-                        'bi': (self.levels[0] -1)*[0],
-                        'db': [0]}
-
-        # save location of previous and next neighbour
-        neighbours = self.beats_measure*[[0, 0]]
-        for ind in range(self.beats_measure):
-            if ind == 0:
-                # first level has no neighbours
-                neighbours[ind] = [-1, -1]
-            elif ind == self.levels.index(self.levels[0]-1):
-                # second level has only one neighbour in the measure (and another in next measure)
-                neighbours[ind] = [0, self.beats_measure]
-            else:
-                # for the rest find the position of the nearest neighbours
-                ind_dist = np.where(np.array(self.levels[ind::-1]) > self.levels[ind])
-                ind_back = ind - ind_dist[0][0]
-                ind_next = ind + ind_dist[0][0]
-                neighbours[ind] = [ind_back, ind_next]
-
-        for piece in dataset:
-            # for each measure in piece
-            for ind_m in range(len(piece['measures'])):
-                # current measure
-                measure = piece['measures'][ind_m]
-                # extend the current measure to include next downbeat
-                # check if measure is the last one
-                if ind_m == len(piece['measures']) -1:
-                    # extend with an empty measure
-                    measure = np.append(measure, 0)
-                else:
-                    next_measure = piece['measures'][ind_m+1]
-                    measure = np.append(measure, next_measure[0])
-                # for each position in measure
-                # first position, no anchor type
-                self.anchors['db'][0] += 1
-                is_onset = measure[0] == 1
-                if is_onset:
-                    self.onsets['db'][0] += 1
-                for pos in range(1, self.beats_measure):
-                    # check if there is an onset in pos
-                    is_onset = measure[pos] == 1
-                    # check if there are onsets at the neighbours
-                    ons_neigh = [0, 0]
-                    if measure[neighbours[pos][0]] == 1:
-                        ons_neigh[0] = 1
-                    if measure[neighbours[pos][1]] == 1:
-                        ons_neigh[1] = 1
-                    # check and save the anchor type
-                    # un-anchored location
-                    if ons_neigh == [0, 0]:
-                        self.anchors['un'][self.levels[pos]-1] += 1
-                        if is_onset:
-                            self.onsets['un'][self.levels[pos]-1] += 1
-                    # bi-anchored location
-                    if ons_neigh == [1, 1]:
-                        self.anchors['bi'][self.levels[pos]-1] += 1
-                        if is_onset:
-                            self.onsets['bi'][self.levels[pos]-1] += 1
-                    # pre-anchored location
-                    if ons_neigh == [1, 0]:
-                        self.anchors['pre'][self.levels[pos]-1] += 1
-                        if is_onset:
-                            self.onsets['pre'][self.levels[pos]-1] += 1
-                    # pos-anchored location
-                    if ons_neigh == [0, 1]:
-                        self.anchors['pos'][self.levels[pos]-1] += 1
-                        if is_onset:
-                            self.onsets['pos'][self.levels[pos]-1] += 1
+        # parameters of each anchor type are given by the metric level of the position
+        groups = self.grid.level_index
 
+        # number of onsets and of instances of each anchor type, and downbeat
+        self.onsets, self.anchors = _count_anchors(dataset, self.grid, groups,
+                                                   self.grid.num_levels - 1)
 
         # get rates instead of absolute quantity
-        # inicialization
-        self.ratios = {'pre': (self.levels[0] -1)*[0],
-                       'pos': (self.levels[0] -1)*[0],
-                       'un': (self.levels[0] -1)*[0],
-                       'bi': (self.levels[0] -1)*[0],
-                       'db': [0]}
-        # get rates for lower levels
-        for lev in range(self.levels[0] -1):
-            # check if number of anchors is not zero for each anchor type
-            # pre-anchored location
-            if self.anchors['pre'][lev] != 0:
-                #calculate ratio
-                self.ratios['pre'][lev] = self.onsets['pre'][lev]/self.anchors['pre'][lev]
-            # post-anchored location
-            if self.anchors['pos'][lev] != 0:
-                #calculate ratio
-                self.ratios['pos'][lev] = self.onsets['pos'][lev]/self.anchors['pos'][lev]
-            # un-anchored location
-            if self.anchors['un'][lev] != 0:
-                #calculate ratio
-                self.ratios['un'][lev] = self.onsets['un'][lev]/self.anchors['un'][lev]
-            # bi-anchored location
-            if self.anchors['bi'][lev] != 0:
-                #calculate ratio
-                self.ratios['bi'][lev] = self.onsets['bi'][lev]/self.anchors['bi'][lev]
-        # get rates for highest level
-        # check if number of anchors is not zero
-        if self.anchors['db'][0] != 0:
-            self.ratios['db'][0] = self.onsets['db'][0]/self.anchors['db'][0]
-        #self.ratios = [self.onsets[i]/(self.len_measures * self.levels.count(i+1))
-        #               for i in range(len(self.onsets))]
+        self.estimate()
 
 
-
-    def description_length(self):
-        """Compute description length
+    def _parameters(self):
+        """Number of onsets and number of locations for each model parameter
         """
 
-        # if not default precision then compute the optimal
-        # discrete value of the parameters given the precision
-        if not self.default_precision:
-            # for each parameter
-            for key in self.ratios:
-                for ind, e in enumerate(self.ratios[key]):
-                    self.ratios[key][ind] = util.optimal_value(self.d,
-                                                               self.ratios[key][ind],
-                                                               self.anchors[key][ind],
-                                                               self.onsets[key][ind])
-
-        # initialization
-        dataset_dl = 0
-        # number of model parameters
-        num_el = 0
-        # dataset description length
-        for key in self.ratios:
-            for ind, e in enumerate(self.ratios[key]):
-                num_el += 1
-                dataset_dl += - self.anchors[key][ind] * (e * util.log2(e) +
-                                                          (1-e) * util.log2(1-e))
+        # parameters of each anchor type (and downbeat) one after the other
+        onsets = [e for key in self.anchors for e in self.onsets[key]]
+        trials = [e for key in self.anchors for e in self.anchors[key]]
 
-        # model description length
-        model_dl = (num_el + 1) * np.log2(self.d)
+        return onsets, trials
 
-        # total description length per measure
-        self.dl = (dataset_dl + model_dl) / self.len_measures
+
+    def _set_ratios(self, ratios):
+        """Save model parameters
+        """
+
+        # ratios per anchor type (and downbeat), in the same order as the anchors
+        self.ratios = {}
+        ind = 0
+        for key in self.anchors:
+            self.ratios[key] = list(ratios[ind:ind + len(self.anchors[key])])
+            ind += len(self.anchors[key])
 
 
     def show(self, colwidth=80):
@@ -725,152 +1161,38 @@ class RefinedHierarchical(Model):
 
         super().fit(dataset)
 
-        # number of onsets of each anchor type, and downbeat
-        self.onsets = {'pre': (self.beats_measure -1)*[0],
-                       'pos': (self.beats_measure -1)*[0],
-                       'un': (self.beats_measure -1)*[0],
-                       'bi': (self.beats_measure -1)*[0],
-                       'db': [0]}
-
-        # number of instances of each anchor type, and downbeat
-        self.anchors = {'pre': (self.beats_measure -1)*[0],
-                        'pos': (self.beats_measure -1)*[0],
-                        'un': (self.beats_measure -1)*[0],
-                        'bi': (self.beats_measure -1)*[0],
-                        'db': [0]}
-
-        # save location of previous and next neighbour
-        neighbours = self.beats_measure*[[0, 0]]
-        for ind in range(self.beats_measure):
-            if ind == 0:
-                # first level has no neighbours
-                neighbours[ind] = [-1, -1]
-            elif ind == self.levels.index(self.levels[0]-1):
-                # second level has only one neighbour in the measure (and another in next measure)
-                neighbours[ind] = [0, self.beats_measure]
-            else:
-                # for the rest find the position of the nearest neighbours
-                ind_dist = np.where(np.array(self.levels[ind::-1]) > self.levels[ind])
-                ind_back = ind - ind_dist[0][0]
-                ind_next = ind + ind_dist[0][0]
-                neighbours[ind] = [ind_back, ind_next]
+        # parameters of each anchor type are given by the position in the measure
+        groups = [pos - 1 for pos in range(self.beats_measure)]
 
-        for piece in dataset:
-            # for each measure in piece
-            for ind_m in range(len(piece['measures'])):
-                # current measure
-                measure = piece['measures'][ind_m]
-                # extend the current measure to include next downbeat
-                # check if measure is the last one
-                if ind_m == len(piece['measures']) -1:
-                    # extend with an empty measure
-                    measure = np.append(measure, 0)
-                else:
-                    next_measure = piece['measures'][ind_m+1]
-                    measure = np.append(measure, next_measure[0])
-                # for each position in measure
-                # first position, no anchor type
-                self.anchors['db'][0] += 1
-                is_onset = measure[0] == 1
-                if is_onset:
-                    self.onsets['db'][0] += 1
-                for pos in range(1, self.beats_measure):
-                    # check if there is an onset in pos
-                    is_onset = measure[pos] == 1
-                    # check if there are onsets at the neighbours
-                    ons_neigh = [0, 0]
-                    if measure[neighbours[pos][0]] == 1:
-                        ons_neigh[0] = 1
-                    if measure[neighbours[pos][1]] == 1:
-                        ons_neigh[1] = 1
-                    # check and save the anchor type
-                    # un-anchored location
-                    if ons_neigh == [0, 0]:
-                        self.anchors['un'][pos - 1] += 1
-                        if is_onset:
-                            self.onsets['un'][pos - 1] += 1
-                    # bi-anchored location
-                    if ons_neigh == [1, 1]:
-                        self.anchors['bi'][pos - 1] += 1
-                        if is_onset:
-                            self.onsets['bi'][pos - 1] += 1
-                    # pre-anchored location
-                    if ons_neigh == [1, 0]:
-                        self.anchors['pre'][pos - 1] += 1
-                        if is_onset:
-                            self.onsets['pre'][pos - 1] += 1
-                    # pos-anchored location
-                    if ons_neigh == [0, 1]:
-                        self.anchors['pos'][pos - 1] += 1
-                        if is_onset:
-                            self.onsets['pos'][pos - 1] += 1
+        # number of onsets and of instances of each anchor type, and downbeat
+        self.onsets, self.anchors = _count_anchors(dataset, self.grid, groups,
+                                                   self.beats_measure - 1)
 
         # get rates instead of absolute quantity
-        # inicialization
-        self.ratios = {'pre': (self.beats_measure -1)*[0],
-                       'pos': (self.beats_measure -1)*[0],
-                       'un': (self.beats_measure -1)*[0],
-                       'bi': (self.beats_measure -1)*[0],
-                       'db': [0]}
-        # get rates for lower levels
-        for pos in range(1, self.beats_measure):
-            # check if number of anchors is not zero for each anchor type
-            # pre-anchored location
-            if self.anchors['pre'][pos - 1] != 0:
-                #calculate ratio
-                self.ratios['pre'][pos - 1] = self.onsets['pre'][pos - 1]/self.anchors['pre'][pos - 1]
-            # post-anchored location
-            if self.anchors['pos'][pos - 1] != 0:
-                #calculate ratio
-                self.ratios['pos'][pos - 1] = self.onsets['pos'][pos - 1]/self.anchors['pos'][pos - 1]
-            # un-anchored location
-            if self.anchors['un'][pos - 1] != 0:
-                #calculate ratio
-                self.ratios['un'][pos - 1] = self.onsets['un'][pos - 1]/self.anchors['un'][pos - 1]
-            # bi-anchored location
-            if self.anchors['bi'][pos - 1] != 0:
-                #calculate ratio
-                self.ratios['bi'][pos - 1] = self.onsets['bi'][pos - 1]/self.anchors['bi'][pos - 1]
-        # get rates for highest level
-        # check if number of anchors is not zero
-        if self.anchors['db'][0] != 0:
-            self.ratios['db'][0] = self.onsets['db'][0]/self.anchors['db'][0]
-        #self.ratios = [self.onsets[i]/(self.len_measures * self.levels.count(i+1))
-        #               for i in range(len(self.onsets))]
-
+        self.estimate()
 
 
-    def description_length(self):
-        """Compute description length
+    def _parameters(self):
+        """Number of onsets and number of locations for each model parameter
         """
 
-        # if not default precision then compute the optimal
-        # discrete value of the parameters given the precision
-        if not self.default_precision:
-            # for each parameter
-            for key in self.ratios:
-                for ind, e in enumerate(self.ratios[key]):
-                    self.ratios[key][ind] = util.optimal_value(self.d,
-                                                               self.ratios[key][ind],
-                                                               self.anchors[key][ind],
-                                                               self.onsets[key][ind])
-
-        # initialization
-        dataset_dl = 0
-        # number of model parameters
-        num_el = 0
-        # dataset description length
-        for key in self.ratios:
-            for ind, e in enumerate(self.ratios[key]):
-                num_el += 1
-                dataset_dl += - self.anchors[key][ind] * (e * util.log2(e) +
-                                                          (1-e) * util.log2(1-e))
+        # parameters of each anchor type (and downbeat) one after the other
+        onsets = [e for key in self.anchors for e in self.onsets[key]]
+        trials = [e for key in self.anchors for e in self.anchors[key]]
 
-        # model description length
-        model_dl = (num_el + 1) * np.log2(self.d)
+        return onsets, trials
 
-        # total description length per measure
-        self.dl = (dataset_dl + model_dl) / self.len_measures
+
+    def _set_ratios(self, ratios):
+        """Save model parameters
+        """
+
+        # ratios per anchor type (and downbeat), in the same order as the anchors
+        self.ratios = {}
+        ind = 0
+        for key in self.anchors:
+            self.ratios[key] = list(ratios[ind:ind + len(self.anchors[key])])
+            ind += len(self.anchors[key])
 
 
     def show(self, colwidth=80):
@@ -890,3 +1212,1069 @@ class RefinedHierarchical(Model):
         print("Ratios per anchor type and level: ".ljust(colwidth))
         for k, v in self.ratios.items():
             print((str(v) + ": " + "{:3s}".format(str(k))).rjust(colwidth))
+
+
+
+class Statistics:
+    """Class to represent the sufficient statistics of a fitted model, i.e. the counts
+    from which the parameters and the description length of the model can be computed
+    for any precision value without visiting the dataset again.
+
+    The counts are kept in a single array of integers, laid out by field (and by anchor type
+    for the hierarchical models), so that the statistics of several parts of a dataset (e.g.
+    fitted in separate processes, or in separate machines that save them to files) are merged
+    by adding them (statistics + other, or Statistics.merge) into the statistics of the whole
+    dataset.
+
+    Attributes
+    ----------
+    model : str
+        Name of the model class the statistics belong to
+    dataset_name : str
+        Name of the dataset
+    num_pieces : int
+        Number of pieces of the dataset
+    beats_measure : int
+        Number of beat subdivisions per measure
+    levels : list
+        List containing the maximum metric level at each position
+    n : int
+        Total number of beat positions (i.e. 0s and 1s)
+    n1 : int or None
+        Total number of onsets (only for models using it)
+    onsets : list, dict or None
+        Number of onsets per parameter (only for models using it)
+    anchors : dict or None
+        Number of locations per anchor type (only for hierarchical models)
+    signature : str or None
+        Time signature of the dataset
+    beat_subdivisions : int or None
+        Number of (equal) subdivisions of each beat
+    counts : np.ndarray
+        all the counts (n, n1, onsets and anchors) one after the other, as int64
+    layout : list
+        field, key (anchor type, or None) and length (None for a single count) of each part
+        of the counts, in order
+
+    Methods
+    -------
+    merge(statistics)
+        Statistics of the union of the datasets of several statistics
+    save(filename)
+        Save the statistics to a file
+    load(filename)
+        Load statistics from a file
+
+    """
+
+    def __init__(self, model, dataset_name, num_pieces, beats_measure, levels, n,
+                 n1=None, onsets=None, anchors=None, signature=None, beat_subdivisions=None):
+
+        self.model = model
+        self.dataset_name = dataset_name
+        self.num_pieces = num_pieces
+        self.beats_measure = beats_measure
+        self.levels = list(levels)
+        self.signature = signature
+        self.beat_subdivisions = beat_subdivisions
+
+        # counts of each field (and anchor type) one after the other
+        self.layout = []
+        parts = []
+        for field, value in (('n', n), ('n1', n1), ('onsets', onsets), ('anchors', anchors)):
+            if value is None:
+                continue
+            for key, part in (value.items() if isinstance(value, dict) else [(None, value)]):
+                part = np.asarray(part, dtype=np.int64)
+                self.layout.append((field, key, None if part.ndim == 0 else part.shape[0]))
+                parts.append(part.reshape(-1))
+        self.counts = np.concatenate(parts)
+
+
+    @property
+    def n(self):
+        """Total number of beat positions (i.e. 0s and 1s)"""
+        return self._field('n')
+
+
+    @property
+    def n1(self):
+        """Total number of onsets (only for models using it)"""
+        return self._field('n1')
+
+
+    @property
+    def onsets(self):
+        """Number of onsets per parameter (only for models using it)"""
+        return self._field('onsets')
+
+
+    @property
+    def anchors(self):
+        """Number of locations per anchor type (only for hierarchical models)"""
+        return self._field('anchors')
+
+
+    def _field(self, field):
+        """Counts of a field as int, list or dictionary of lists (None if not used)"""
+
+        value = None
+        ind = 0
+        for part_field, key, length in self.layout:
+            size = 1 if length is None else length
+            if part_field == field:
+                part = self.counts[ind:ind + size]
+                part = int(part[0]) if length is None else part.tolist()
+                if key is None:
+                    value = part
+                else:
+                    value = {} if value is None else value
+                    value[key] = part
+            ind += size
+
+        return value
+
+
+    def __add__(self, other):
+
+        # allow sum() of a list of statistics
+        if isinstance(other, int) and other == 0:
+            return copy.deepcopy(self)
+
+        if not isinstance(other, Statistics):
+            return NotImplemented
+        self._check_compatible(other)
+
+        merged = copy.deepcopy(self)
+        merged.counts = self.counts + other.counts
+        merged.num_pieces = self.num_pieces + other.num_pieces
+        # name of both datasets if they differ
+        if other.dataset_name != self.dataset_name:
+            merged.dataset_name = self.dataset_name + '+' + other.dataset_name
+
+        return merged
+
+
+    def __radd__(self, other):
+        return self.__add__(other)
+
+
+    def __sub__(self, other):
+
+        if not isinstance(other, Statistics):
+            return NotImplemented
+        self._check_compatible(other)
+
+        difference = copy.deepcopy(self)
+        difference.counts = self.counts - other.counts
+        difference.num_pieces = self.num_pieces - other.num_pieces
+
+        # the subtracted counts must be part of these ones
+        if difference.num_pieces < 0 or np.any(difference.counts < 0):
+            raise ValueError("Statistics of %d pieces are not part of statistics of %d pieces "
+                             "(counts would be negative)." % (other.num_pieces,
+                                                              self.num_pieces))
+
+        return difference
+
+
+    def _check_compatible(self, other):
+        """Check two statistics are of the same model and grid (so that they can be added)"""
+
+        for attribute in ('model', 'beats_measure', 'levels', 'signature', 'beat_subdivisions',
+                          'layout'):
+            if getattr(self, attribute) != getattr(other, attribute):
+                raise ValueError("Statistics with different %s can not be merged (%r and %r)."
+                                 % (attribute, getattr(self, attribute),
+                                    getattr(other, attribute)))
+
+
+    @staticmethod
+    def merge(statistics):
+        """Statistics of the union of the datasets of several statistics (of the same model
+        and grid), adding up their counts.
+
+        Parameters
+        ----------
+        statistics : list
+            statistics of each dataset
+
+        Returns
+        -------
+        merged : Statistics
+            statistics of the union of the datasets
+        """
+
+        statistics = list(statistics)
+        if not statistics:
+            raise ValueError("There are no statistics to merge.")
+
+        merged = copy.deepcopy(statistics[0])
+        for other in statistics[1:]:
+            merged = merged + other
+
+        return merged
+
+
+    def save(self, filename):
+        """Save the statistics to a file (npz file with the counts and the metadata as json).
+
+        Parameters
+        ----------
+        filename : str or file
+            path (or open binary file) of the file
+        """
+
+        metadata = {'model': self.model, 'dataset_name': self.dataset_name,
+                    'num_pieces': int(self.num_pieces), 'beats_measure': int(self.beats_measure),
+                    'levels': [int(level) for level in self.levels],
+                    'signature': self.signature,
+                    'beat_subdivisions': (None if self.beat_subdivisions is None
+                                          else int(self.beat_subdivisions)),
+                    'layout': self.layout}
+
+        np.savez(filename, counts=self.counts, metadata=np.array(json.dumps(metadata)))
+
+
+    @classmethod
+    def load(cls, filename):
+        """Load statistics from a file (saved by save).
+
+        Parameters
+        ----------
+        filename : str or file
+            path (or open binary file) of the file
+
+        Returns
+        -------
+        statistics : Statistics
+            the statistics saved in the file
+        """
+
+        with np.load(filename, allow_pickle=False) as arrays:
+            metadata = json.loads(str(arrays['metadata']))
+            counts = arrays['counts']
+
+        # create the statistics without laying out the counts again
+        statistics = cls.__new__(cls)
+        for attribute in ('model', 'dataset_name', 'num_pieces', 'beats_measure', 'levels',
+                          'signature', 'beat_subdivisions'):
+            setattr(statistics, attribute, metadata[attribute])
+        statistics.layout = [tuple(part) for part in metadata['layout']]
+        statistics.counts = counts.astype(np.int64)
+
+        return statistics
+
+
+    def __repr__(self):
+        return ("Statistics(model=%r, dataset_name=%r, num_pieces=%d, beats_measure=%d, n=%d)"
+                % (self.model, self.dataset_name, self.num_pieces, self.beats_measure, self.n))
+
+
+
+class FitResult:
+    """Class to represent the result of fitting all the models for several precision values.
+
+    Attributes
+    ----------
+    model_names : list
+        Names of the models
+    precisions : np.ndarray
+        Precision values
+    dls : np.ndarray
+        Description length per measure (num_models x num_precisions) of each model
+        for each precision value
+    optimal_precisions : dict
+        Precision value giving the minimum description length of each model
+    optimal_dls : dict
+        Minimum description length of each model
+    statistics : dict
+        Sufficient statistics of each model
+
+    Methods
+    -------
+    from_statistics(statistics, precisions)
+        Fit result from the statistics of each model
+    model(model_name, d)
+        Create a model for the given precision
+    optimal_model(model_name)
+        Create a model for its optimal precision
+    show()
+        Show description lengths
+
+    """
+
+    def __init__(self, statistics, precisions, dls):
+
+        self.statistics = statistics
+        self.model_names = list(statistics.keys())
+        self.precisions = np.asarray(precisions)
+        self.dls = np.asarray(dls)
+
+        # find the precision giving the minimum description length for each model
+        self.optimal_precisions = {}
+        self.optimal_dls = {}
+        if self.precisions.shape[0] > 0:
+            for ind, model_name in enumerate(self.model_names):
+                argmin = np.argmin(self.dls[ind])
+                self.optimal_precisions[model_name] = self.precisions[argmin]
+                self.optimal_dls[model_name] = self.dls[ind, argmin]
+
+
+    @classmethod
+    def from_statistics(cls, statistics, precisions=None):
+        """Fit result from the statistics of each model (e.g. merged from the statistics of
+        several parts of a dataset), without visiting the dataset.
+
+        Parameters
+        ----------
+        statistics : dict
+            statistics of each model, by model name
+        precisions : list, optional
+            precision values (by default powers of two from 2 to 4096)
+
+        Returns
+        -------
+        result : FitResult
+            description length of each model for each precision value
+        """
+
+        # precision grid of values
+        if precisions is None:
+            precisions = [2**k for k in range(1, 13)]
+
+        # description length of each model for each precision value
+        dls = np.array([globals()[model_statistics.model].from_statistics(
+            model_statistics).dl_for(precisions) for model_statistics in statistics.values()])
+
+        return cls(statistics, precisions, dls)
+
+
+    def model(self, model_name, d=None):
+        """Create a model from its statistics, without fitting the dataset again
+
+        Parameters
+        ----------
+        model_name : str
+            name of the model
+        d : int, optional
+            Precision parameter
+
+        Returns
+        -------
+        model : Model
+            a model of the type specified
+        """
+
+        statistics = self.statistics[model_name]
+        model_class = globals()[statistics.model]
+
+        return model_class.from_statistics(statistics, d=d)
+
+
+    def optimal_model(self, model_name):
+        """Create a model for the precision giving the minimum description length
+
+        Parameters
+        ----------
+        model_name : str
+            name of the model
+
+        Returns
+        -------
+        model : Model
+            a model of the type specified
+        """
+
+        return self.model(model_name, d=self.optimal_precisions[model_name])
+
+
+    def show(self, colwidth=80):
+        """Show description lengths
+        """
+
+        print("Description length per measure (bits)".center(colwidth))
+        print()
+        print("d".ljust(22) + "".join("{:>11d}".format(int(d)) for d in self.precisions))
+        for ind, model_name in enumerate(self.model_names):
+            print(model_name.ljust(22) + "".join("{:>11.4f}".format(dl) for dl in self.dls[ind]))
+        print()
+        print("Optimal precision per model".center(colwidth))
+        print()
+        for model_name in self.optimal_precisions:
+            print(model_name.ljust(22) + "d = {:d}, dl = {:4.6f}".format(
+                int(self.optimal_precisions[model_name]), self.optimal_dls[model_name]))
+
+
+class CrossValidationResult:
+    """Class to represent the result of cross-validating all the models.
+
+    Attributes
+    ----------
+    model_names : list
+        Names of the models
+    folds : np.ndarray
+        Fold of each piece
+    code_lengths : np.ndarray
+        Code length in bits (num_models x num_folds) of the held-out pieces of each fold
+        with each model fitted from the rest of the pieces
+    fold_measures : np.ndarray
+        Number of measures of the held-out pieces of each fold
+    dls : dict
+        Cross-validated description length per measure of each model (code length of all
+        the held-out pieces per held-out measure)
+
+    Methods
+    -------
+    show()
+        Show cross-validated description lengths
+
+    """
+
+    def __init__(self, model_names, folds, code_lengths, fold_measures):
+
+        self.model_names = list(model_names)
+        self.folds = np.asarray(folds)
+        self.code_lengths = np.asarray(code_lengths)
+        self.fold_measures = np.asarray(fold_measures)
+
+        # description length per held-out measure of each model
+        num_measures = self.fold_measures.sum()
+        self.dls = {}
+        for ind, model_name in enumerate(self.model_names):
+            self.dls[model_name] = (self.code_lengths[ind].sum() / num_measures
+                                    if num_measures else 0.0)
+
+
+    @property
+    def num_folds(self):
+        """Number of folds"""
+        return self.code_lengths.shape[1]
+
+
+    def show(self, colwidth=80):
+        """Show cross-validated description lengths
+        """
+
+        print("Cross-validated description length per measure (bits)".center(colwidth))
+        print()
+        print("Number of folds: ".ljust(colwidth - len(str(self.num_folds))) +
+              str(self.num_folds))
+        for model_name in self.model_names:
+            print(model_name.ljust(22) + "{:4.6f}".format(self.dls[model_name]))
+
+
+def _cube_statistics(cube, grid, dataset_name, num_pieces):
+    """Statistics of every model from the contingency cube of a dataset.
+
+    Parameters
+    ----------
+    cube : np.ndarray
+        number of locations for each position, anchor type and onset
+    grid : util.MetricGrid
+        metric grid of the dataset
+    dataset_name : str
+        Name of the dataset
+    num_pieces : int
+        Number of pieces of the dataset
+
+    Returns
+    -------
+    statistics : dict
+        statistics of each model, by model name
+    """
+
+    beats_measure = grid.beats_measure
+
+    # total number of beat positions (i.e. 0s and 1s)
+    n = int(cube.sum())
+    # number of onsets on each metrical position
+    column_sums = cube[:, :, 1].sum(axis=1)
+    # number of onsets on each metrical level
+    level_sums = np.zeros((grid.num_levels,), dtype=np.int64)
+    np.add.at(level_sums, grid.level_index, column_sums)
+
+    # onsets and anchors per level, and per position
+    hierarchical = _count_anchors(None, grid, grid.level_index, grid.num_levels - 1,
+                                  cube=cube)
+    refined = _count_anchors(None, grid, [pos - 1 for pos in range(beats_measure)],
+                             beats_measure - 1, cube=cube)
+
+    def statistics(model, **counts):
+        return Statistics(model, dataset_name, num_pieces, beats_measure, grid.levels, n,
+                          signature=grid.signature, beat_subdivisions=grid.beat_subdivisions,
+                          **counts)
+
+    return {'Bernoulli': statistics('Bernoulli', n1=int(column_sums.sum())),
+            'Position': statistics('Position', onsets=level_sums.tolist()),
+            'RefinedPosition': statistics('RefinedPosition', onsets=column_sums.tolist()),
+            'Hierarchical': statistics('Hierarchical', onsets=hierarchical[0],
+                                       anchors=hierarchical[1]),
+            'RefinedHierarchical': statistics('RefinedHierarchical', onsets=refined[0],
+                                              anchors=refined[1])}
+
+
+def _cube_counts(cubes, grid, statistics):
+    """Counts of a model for several contingency cubes at once, laid out as its statistics
+    (the counts given by _cube_statistics for each cube).
+
+    Parameters
+    ----------
+    cubes : np.ndarray
+        contingency cubes (num_cubes x beats_measure x 4 x 2)
+    grid : util.MetricGrid
+        metric grid of the dataset
+    statistics : Statistics
+        statistics of the model (giving its name and the layout of its counts)
+
+    Returns
+    -------
+    counts : np.ndarray
+        counts (num_cubes x num_counts) of the model for each cube
+    """
+
+    num_cubes, beats_measure = cubes.shape[0], grid.beats_measure
+
+    def one_hot(groups, num_groups):
+        """Matrix (num_positions x num_groups) with the group of each position"""
+        return (np.asarray(groups)[:, np.newaxis] == np.arange(num_groups)).astype(np.int64)
+
+    # number of onsets on each metrical position
+    column_sums = cubes[:, :, :, 1].sum(axis=2)
+    blocks = {('n', None): cubes.sum(axis=(1, 2, 3)),
+              ('n1', None): column_sums.sum(axis=1)}
+
+    if statistics.model == 'Position':
+        blocks['onsets', None] = column_sums @ one_hot(grid.level_index, grid.num_levels)
+    elif statistics.model == 'RefinedPosition':
+        blocks['onsets', None] = column_sums
+    elif statistics.model in ('Hierarchical', 'RefinedHierarchical'):
+        # group of each position (but the downbeat), as in the fit of the model
+        if statistics.model == 'Hierarchical':
+            groups = one_hot(np.asarray(grid.level_index)[1:], grid.num_levels - 1)
+        else:
+            groups = one_hot(np.arange(beats_measure - 1), beats_measure - 1)
+        # add up the positions of each group, by anchor type (un, pos, pre, bi)
+        for anchor_type, key in enumerate(('un', 'pos', 'pre', 'bi')):
+            blocks['onsets', key] = cubes[:, 1:, anchor_type, 1] @ groups
+            blocks['anchors', key] = cubes[:, 1:, anchor_type].sum(axis=2) @ groups
+        # downbeat, no anchor type
+        blocks['onsets', 'db'] = cubes[:, 0, :, 1].sum(axis=1)
+        blocks['anchors', 'db'] = cubes[:, 0].sum(axis=(1, 2))
+
+    return np.concatenate([blocks[field, key].reshape(num_cubes, -1)
+                           for field, key, _ in statistics.layout], axis=1)
+
+
+def _batch_parameters(model_class, statistics, counts):
+    """Number of onsets and of locations for each parameter of a model (as _parameters),
+    for several sets of counts at once.
+
+    Parameters
+    ----------
+    model_class : type
+        class of the model
+    statistics : Statistics
+        statistics of the model (giving the layout of its counts)
+    counts : np.ndarray
+        counts (num_sets x num_counts) laid out as the statistics
+
+    Returns
+    -------
+    onsets : np.ndarray
+        number of onsets (num_parameters x num_sets) for each parameter
+    trials : np.ndarray
+        number of locations (num_parameters x num_sets) for each parameter
+    """
+
+    # model whose counts are arrays (one value per set), so that its parameters are too
+    model = model_class.__new__(model_class)
+    model.beats_measure = statistics.beats_measure
+    model.levels = list(statistics.levels)
+
+    ind = 0
+    for field, key, length in statistics.layout:
+        size = 1 if length is None else length
+        part = counts[:, ind] if length is None else counts[:, ind:ind + size].T
+        if key is None:
+            setattr(model, field, part)
+        else:
+            if not hasattr(model, field):
+                setattr(model, field, {})
+            getattr(model, field)[key] = part
+        ind += size
+    model.len_measures = model.n / model.beats_measure
+
+    onsets, trials = model._parameters()
+
+    return (np.asarray(onsets, dtype=np.float64).reshape(-1, counts.shape[0]),
+            np.asarray(trials, dtype=np.float64).reshape(-1, counts.shape[0]))
+
+
+def _measure_blocks(dataset, beats_measure, chunk_measures=65536):
+    """Blocks of measures of a dataset, each one with the downbeat of the next measure.
+
+    The measures of an encoded dataset are given by chunks of its matrix of measures,
+    those of a list (or a stream) of pieces are given piece by piece.
+
+    Parameters
+    ----------
+    dataset : EncodedDataset or list of dictionaries
+        the encoded pieces
+    beats_measure : int
+        Number of beat subdivisions per measure
+    chunk_measures : int
+        maximum number of measures of a block of an encoded dataset
+
+    Yields
+    ------
+    measures : np.ndarray
+        boolean matrix (num_measures x beats_measure), True for a note onset
+    next_downbeats : np.ndarray
+        boolean array (num_measures), True for an onset in the downbeat of the next measure
+        (False for the last measure of a piece)
+    """
+
+    if isinstance(dataset, EncodedDataset):
+        num_measures = dataset.num_measures
+        # downbeat of the next measure, shifting the first column of the whole matrix
+        next_downbeats = np.zeros((num_measures,), dtype=bool)
+        next_downbeats[:-1] = dataset.measures[1:, 0] == 1
+        # the last measure of each (non empty) piece has no next measure
+        ends = dataset.offsets[1:][dataset.offsets[1:] > dataset.offsets[:-1]] - 1
+        next_downbeats[ends] = False
+        for ind in range(0, num_measures, chunk_measures):
+            yield (dataset.measures[ind:ind+chunk_measures] == 1,
+                   next_downbeats[ind:ind+chunk_measures])
+    else:
+        for piece in dataset:
+            measures = np.asarray(piece['measures']).reshape(-1, beats_measure) == 1
+            # downbeat of the next measure of the piece
+            next_downbeats = np.zeros((measures.shape[0],), dtype=bool)
+            next_downbeats[:-1] = measures[1:, 0]
+            yield measures, next_downbeats
+
+
+def _column_sums(dataset, beats_measure):
+    """Number of onsets at each position in the measure, for all the measures of a dataset.
+
+    Parameters
+    ----------
+    dataset : EncodedDataset or list of dictionaries
+        the encoded pieces
+    beats_measure : int
+        Number of beat subdivisions per measure
+
+    Returns
+    -------
+    column_sums : np.ndarray
+        number of onsets at each position
+    """
+
+    column_sums = np.zeros((beats_measure,), dtype=np.int64)
+
+    if isinstance(dataset, PackedDataset):
+        # count the bits of the packed measures
+        for measures, _ in _packed_blocks(dataset):
+            column_sums += _bit_counts(measures, beats_measure)
+        return column_sums
+
+    if isinstance(dataset, SparseDataset):
+        # count the positions of the onsets
+        return np.bincount(dataset.positions, minlength=beats_measure).astype(np.int64)
+
+    for measures, _ in _measure_blocks(dataset, beats_measure):
+        column_sums += np.count_nonzero(measures, axis=0)
+
+    return column_sums
+
+
+def _contingency_cube(dataset, grid):
+    """Count the onsets of a dataset by position, anchor type and onset.
+
+    Each position (but the downbeat) is classified according to the onsets at its
+    neighbours as un-anchored (none), pos-anchored (only next), pre-anchored (only
+    previous) or bi-anchored (both), in that order, as a 2-bit code. The downbeat has
+    no neighbours and is counted as un-anchored. All the models are marginals of this cube.
+
+    Parameters
+    ----------
+    dataset : EncodedDataset or list of dictionaries
+        the encoded pieces
+    grid : util.MetricGrid
+        metric grid of the dataset
+
+    Returns
+    -------
+    cube : np.ndarray
+        number of locations (beats_measure x 4 x 2) for each position, anchor type and
+        onset (0 or 1)
+    """
+
+    beats_measure = grid.beats_measure
+
+    # position of the neighbours of each position (but the downbeat)
+    back, forth = grid.back[1:], grid.forth[1:]
+
+    # index of the first bin of each position
+    offsets = 8*np.arange(beats_measure)
+
+    if isinstance(dataset, PackedDataset):
+        # anchor types with shifts and masks of the packed measures
+        return _packed_cube(dataset, grid)
+
+    if isinstance(dataset, SparseDataset):
+        # anchor types of the onsets, the rest of the locations from the totals
+        return _sparse_cube(dataset, grid)
+
+    cube = np.zeros((8*beats_measure,), dtype=np.int64)
+
+    for measures, next_downbeats in _measure_blocks(dataset, beats_measure):
+        # tally locations by position, anchor type and onset
+        bins = _cube_bins(measures, next_downbeats, back, forth, offsets)
+        cube += np.bincount(bins.ravel(), minlength=8*beats_measure)
+
+    return cube.reshape(beats_measure, 4, 2)
+
+
+def _cube_bins(measures, next_downbeats, back, forth, offsets):
+    """Bin of the contingency cube (8*position + 2*anchor type + onset) of each location of
+    a block of measures (see _contingency_cube)"""
+
+    beats_measure = measures.shape[1]
+
+    # extend the measures to include the next downbeat
+    extended = np.empty((measures.shape[0], beats_measure + 1), dtype=bool)
+    extended[:, :beats_measure] = measures
+    extended[:, beats_measure] = next_downbeats
+    # anchor type as a 2-bit code of the onsets at the previous and next neighbours
+    types = np.zeros(measures.shape, dtype=np.intp)
+    types[:, 1:] = 2*extended[:, back] + extended[:, forth].astype(np.intp)
+
+    return offsets + 2*types + measures
+
+
+def _piece_cubes(dataset, grid):
+    """Contingency cube of each piece of a dataset (see _contingency_cube).
+
+    Parameters
+    ----------
+    dataset : list, EncodedDataset, PackedDataset or SparseDataset
+        the encoded pieces (converted to an encoded dataset if they are not)
+    grid : util.MetricGrid
+        metric grid of the dataset
+
+    Returns
+    -------
+    cubes : np.ndarray
+        number of locations (num_pieces x beats_measure x 4 x 2) of each piece for each
+        position, anchor type and onset (0 or 1)
+    """
+
+    beats_measure = grid.beats_measure
+
+    # all the measures in a single matrix
+    if isinstance(dataset, PackedDataset):
+        dataset = dataset.unpack()
+    elif isinstance(dataset, SparseDataset):
+        dataset = dataset.to_encoded()
+    elif not isinstance(dataset, EncodedDataset):
+        dataset = EncodedDataset.from_pieces(dataset, beats_measure=beats_measure)
+
+    # piece of each measure
+    num_pieces = dataset.num_pieces
+    measure_pieces = np.repeat(np.arange(num_pieces), np.diff(dataset.offsets))
+
+    offsets = 8*np.arange(beats_measure)
+    cubes = np.zeros((num_pieces*8*beats_measure,), dtype=np.int64)
+
+    start = 0
+    for measures, next_downbeats in _measure_blocks(dataset, beats_measure):
+        # tally locations by piece, position, anchor type and onset
+        bins = _cube_bins(measures, next_downbeats, grid.back[1:], grid.forth[1:], offsets)
+        pieces = measure_pieces[start:start + measures.shape[0], np.newaxis]
+        cubes += np.bincount((8*beats_measure*pieces + bins).ravel(),
+                             minlength=cubes.shape[0])
+        start += measures.shape[0]
+
+    return cubes.reshape(num_pieces, beats_measure, 4, 2)
+
+
+def _packed_blocks(dataset, chunk_measures=65536):
+    """Blocks of packed measures of a dataset, each one with the downbeat of the next measure
+    (as _measure_blocks).
+
+    Parameters
+    ----------
+    dataset : PackedDataset
+        the packed pieces
+    chunk_measures : int
+        maximum number of measures of a block
+
+    Yields
+    ------
+    measures : np.ndarray
+        array (num_measures) of uint64 with the packed measures
+    next_downbeats : np.ndarray
+        boolean array (num_measures), True for an onset in the downbeat of the next measure
+        (False for the last measure of a piece)
+    """
+
+    num_measures = dataset.num_measures
+    # downbeat of the next measure, the first bit of the next packed measure
+    next_downbeats = np.zeros((num_measures,), dtype=bool)
+    next_downbeats[:-1] = (dataset.measures[1:] & np.uint64(1)) != 0
+    # the last measure of each (non empty) piece has no next measure
+    ends = dataset.offsets[1:][dataset.offsets[1:] > dataset.offsets[:-1]] - 1
+    next_downbeats[ends] = False
+    for ind in range(0, num_measures, chunk_measures):
+        yield (dataset.measures[ind:ind+chunk_measures],
+               next_downbeats[ind:ind+chunk_measures])
+
+
+def _bit_counts(measures, beats_measure):
+    """Number of 1s at each bit of an array of packed measures (i.e. onsets at each position).
+
+    The bits are counted byte by byte: the number of measures with each value of each byte
+    and the bits of each value give the counts of the 8 positions of the byte.
+
+    Parameters
+    ----------
+    measures : np.ndarray
+        array (num_measures) of uint64 with the packed measures
+    beats_measure : int
+        Number of beat subdivisions per measure
+
+    Returns
+    -------
+    bit_counts : np.ndarray
+        number of 1s at each position of the measure
+    """
+
+    # bytes of each measure, the first one with the first 8 positions
+    measure_bytes = measures.astype('<u8', copy=False).view(np.uint8).reshape(-1, 8)
+
+    bit_counts = np.zeros((64,), dtype=np.int64)
+    for ind_byte in range((beats_measure + 7) // 8):
+        # number of measures with each value of the byte
+        value_counts = np.bincount(measure_bytes[:, ind_byte], minlength=256)
+        bit_counts[8*ind_byte:8*ind_byte+8] = value_counts @ _BYTE_BITS
+
+    return bit_counts[:beats_measure]
+
+
+# bits of each byte value (256 x 8), the least significant first
+_BYTE_BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1,
+                           bitorder='little').astype(np.int64)
+
+
+def _packed_cube(dataset, grid):
+    """Count the onsets of a packed dataset by position, anchor type and onset
+    (as _contingency_cube).
+
+    The onsets at the previous (and next) neighbour of every position are moved to the bit of
+    the position with a shift and a mask for each distance to the neighbour, so that the
+    anchor types of all the positions of all the measures are given by three words per
+    measure: the measure and the onsets at the previous and next neighbours.
+
+    Parameters
+    ----------
+    dataset : PackedDataset
+        the packed pieces
+    grid : util.MetricGrid
+        metric grid of the dataset
+
+    Returns
+    -------
+    cube : np.ndarray
+        number of locations (beats_measure x 4 x 2) for each position, anchor type and
+        onset (0 or 1)
+    """
+
+    beats_measure = grid.beats_measure
+    positions = np.arange(1, beats_measure)
+
+    # masks of the positions (but the downbeat) by distance to their previous neighbour
+    back_masks = _distance_masks(positions - grid.back[1:], positions)
+    # and to their next neighbour in the measure, and positions anchored to the next downbeat
+    in_measure = grid.forth[1:] < beats_measure
+    forth_masks = _distance_masks(grid.forth[1:][in_measure] - positions[in_measure],
+                                  positions[in_measure])
+    next_downbeat_mask = _bit_mask(positions[~in_measure])
+
+    # all the positions of the measure
+    full_mask = _bit_mask(np.arange(beats_measure))
+
+    cube = np.zeros((beats_measure, 4, 2), dtype=np.int64)
+
+    for measures, next_downbeats in _packed_blocks(dataset):
+        # onsets at the previous neighbour of each position
+        back = np.zeros_like(measures)
+        for distance, mask in back_masks:
+            back |= (measures << distance) & mask
+        # onsets at the next neighbour of each position
+        forth = np.where(next_downbeats, next_downbeat_mask, np.uint64(0))
+        for distance, mask in forth_masks:
+            forth |= (measures >> distance) & mask
+
+        # tally locations by position, anchor type (2-bit code of the onsets at the previous
+        # and next neighbours) and onset, counting the bits of the words of each combination
+        for is_back in (0, 1):
+            back_word = back if is_back else ~back
+            for is_forth in (0, 1):
+                anchor_word = back_word & (forth if is_forth else ~forth) & full_mask
+                cube[:, 2*is_back + is_forth, 1] += _bit_counts(anchor_word & measures,
+                                                                beats_measure)
+                cube[:, 2*is_back + is_forth, 0] += _bit_counts(anchor_word & ~measures,
+                                                                beats_measure)
+
+    return cube
+
+
+def _distance_masks(distances, positions):
+    """Masks of the positions at each distance (as uint64), for shifts of the packed measures"""
+
+    return [(np.uint64(distance), _bit_mask(positions[distances == distance]))
+            for distance in np.unique(distances)]
+
+
+def _bit_mask(positions):
+    """Mask (uint64) with the bits of the given positions"""
+
+    return np.uint64(sum(1 << int(pos) for pos in positions))
+
+
+def _sparse_cube(dataset, grid):
+    """Count the onsets of a sparse dataset by position, anchor type and onset
+    (as _contingency_cube), in a time proportional to the number of onsets.
+
+    The onsets are grouped by position, each one as the sorted list of the measures with an
+    onset at it, so that the anchor type of the onsets at a position is found by looking up
+    their measures in the lists of its neighbours. The locations with no onset are not
+    visited: the number of locations of each anchor type at a position is given by the number
+    of onsets at its neighbours and of measures with onsets at both of them, and the ones with
+    an onset are subtracted.
+
+    Parameters
+    ----------
+    dataset : SparseDataset
+        the sparse pieces
+    grid : util.MetricGrid
+        metric grid of the dataset
+
+    Returns
+    -------
+    cube : np.ndarray
+        number of locations (beats_measure x 4 x 2) for each position, anchor type and
+        onset (0 or 1)
+    """
+
+    beats_measure = grid.beats_measure
+    num_measures = dataset.num_measures
+
+    # measure of each onset
+    positions = dataset.positions
+    onset_measures = np.repeat(np.arange(num_measures, dtype=np.int64),
+                               np.diff(dataset.measure_offsets))
+
+    # measures of the onsets grouped by position (a stable sort keeps them sorted, and it is
+    # a radix sort for small integers)
+    order = np.argsort(positions.astype(np.uint16) if beats_measure < 2**16 else positions,
+                       kind='stable')
+    starts = np.searchsorted(positions[order], np.arange(beats_measure + 1))
+    columns = [onset_measures[order[starts[pos]:starts[pos+1]]]
+               for pos in range(beats_measure)]
+
+    # measures with an onset in the downbeat of the next measure of the piece (the first
+    # measure of each piece has no previous measure), as position beats_measure
+    next_measures = columns[0][~np.isin(columns[0], dataset.offsets)] - 1
+    columns.append(next_measures)
+
+    # number of onsets at each position, and next downbeat
+    column_sums = np.array([column.shape[0] for column in columns], dtype=np.int64)
+
+    cube = np.zeros((beats_measure, 4, 2), dtype=np.int64)
+    # measures with onsets at both neighbours, for each pair of neighbours
+    pairs = {}
+
+    for pos in range(1, beats_measure):
+        back, forth = grid.back[pos], grid.forth[pos]
+        # anchor type of the onsets as a 2-bit code of the onsets at its neighbours
+        types = (2*_sorted_membership(columns[pos], columns[back]) +
+                 _sorted_membership(columns[pos], columns[forth]))
+        cube[pos, :, 1] = np.bincount(types, minlength=4)
+
+        if (back, forth) not in pairs:
+            pairs[back, forth] = np.count_nonzero(_sorted_membership(columns[back],
+                                                                     columns[forth]))
+        both = pairs[back, forth]
+
+        # locations of each anchor type (none, next, previous, both), from the totals
+        previous, following = column_sums[back], column_sums[forth]
+        totals = [num_measures - previous - following + both, following - both,
+                  previous - both, both]
+        cube[pos, :, 0] = totals - cube[pos, :, 1]
+
+    # the downbeat is counted as un-anchored
+    cube[0, 0, 1] = column_sums[0]
+    cube[0, 0, 0] = num_measures - column_sums[0]
+
+    return cube
+
+
+def _sorted_membership(values, sorted_values):
+    """Whether each value is in a sorted array (by binary search)"""
+
+    if sorted_values.shape[0] == 0:
+        return np.zeros(values.shape, dtype=bool)
+    found = np.minimum(np.searchsorted(sorted_values, values), sorted_values.shape[0] - 1)
+
+    return sorted_values[found] == values
+
+
+def _count_anchors(dataset, grid, groups, num_groups, cube=None):
+    """Count the number of onsets and of instances of each anchor type.
+
+    Parameters
+    ----------
+    dataset : EncodedDataset or list of dictionaries
+        the encoded pieces
+    grid : util.MetricGrid
+        metric grid of the dataset
+    groups : list
+        group of each position in the measure (the one of the downbeat is not used)
+    num_groups : int
+        number of groups per anchor type
+    cube : np.ndarray, optional
+        contingency cube of the dataset, if already computed (the dataset is not used)
+
+    Returns
+    -------
+    onsets : dict
+        number of onsets of each anchor type, and downbeat
+    anchors : dict
+        number of instances of each anchor type, and downbeat
+    """
+
+    if cube is None:
+        cube = _contingency_cube(dataset, grid)
+
+    # group of each position (but the downbeat)
+    groups = np.asarray(groups, dtype=np.intp)[1:]
+
+    # add up the positions of each group, by anchor type (un, pos, pre, bi)
+    onsets = np.zeros((num_groups, 4), dtype=np.int64)
+    anchors = np.zeros((num_groups, 4), dtype=np.int64)
+    np.add.at(onsets, groups, cube[1:, :, 1])
+    np.add.at(anchors, groups, cube[1:].sum(axis=2))
+    onsets = onsets.T.tolist()
+    anchors = anchors.T.tolist()
+
+    # downbeat, no anchor type
+    onsets_db = int(cube[0, :, 1].sum())
+    anchors_db = int(cube[0].sum())
+
+    return ({'pre': onsets[2], 'pos': onsets[1], 'un': onsets[0], 'bi': onsets[3],
+             'db': [onsets_db]},
+            {'pre': anchors[2], 'pos': anchors[1], 'un': anchors[0], 'bi': anchors[3],
+             'db': [anchors_db]})
@@ -0,0 +1,599 @@
+# encoding: utf-8
+# pylint: disable=C0103
+"""
+MusicXML
+========
+
+Native reader of MusicXML files
+-------------------------------
+
+.. autosummary::
+    :toctree: generated/
+
+    read_score
+    read_meters
+
+"""
+
+import os
+import functools
+import math
+import xml.etree.ElementTree as ET
+from fractions import Fraction
+
+__all__ = ['read_score', 'read_meters']
+
+# quarter length of each note type (MusicXML uses long instead of longa)
+_TYPE_QUARTER_LENGTH = {'maxima': Fraction(32), 'long': Fraction(16), 'longa': Fraction(16),
+                        'breve': Fraction(8), 'whole': Fraction(4), 'half': Fraction(2),
+                        'quarter': Fraction(1), 'eighth': Fraction(1, 2),
+                        '16th': Fraction(1, 4), '32nd': Fraction(1, 8), '32th': Fraction(1, 8),
+                        '64th': Fraction(1, 16), '128th': Fraction(1, 32),
+                        '256th': Fraction(1, 64), '512th': Fraction(1, 128),
+                        '1024th': Fraction(1, 256)}
+
+# semitones of each step above C
+_STEP_SEMITONES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+
+# name and alteration of each accidental (as music21 names them)
+_ACCIDENTALS = {'sharp': ('sharp', 1.0), 'flat': ('flat', -1.0), 'natural': ('natural', 0.0),
+                'double-sharp': ('double-sharp', 2.0), 'sharp-sharp': ('double-sharp', 2.0),
+                'double-flat': ('double-flat', -2.0), 'flat-flat': ('double-flat', -2.0),
+                'quarter-sharp': ('half-sharp', 0.5), 'quarter-flat': ('half-flat', -0.5),
+                'three-quarters-sharp': ('one-and-a-half-sharp', 1.5),
+                'three-quarters-flat': ('one-and-a-half-flat', -1.5),
+                'triple-sharp': ('triple-sharp', 3.0), 'triple-flat': ('triple-flat', -3.0)}
+
+# name of the accidental of each alteration
+_ALTER_NAMES = {alter: name for name, alter in _ACCIDENTALS.values()}
+
+# elements of a measure that are inserted in it (with no duration) at the current position
+_ATTRIBUTE_ELEMENTS = ('clef', 'key', 'time', 'staff-details', 'measure-style')
+
+
+def read_score(filename):
+    """Read the title, measures and notes of the first part of a MusicXML file, streaming the
+    file (only the first part is read) and computing the offsets of the notes as music21 does
+    when it parses the file.
+
+    Parameters
+    ----------
+    filename : str
+        path of the MusicXML (partwise, uncompressed) file
+
+    Returns
+    -------
+    score : dict
+        dictionary with the title (the name of the file if not given) and time signatures
+        (sorted list of str) of the score, the offset and duration of each measure, and the
+        measure, offset in the measure (including the padding of an incomplete measure),
+        duration and pitch of each note that is not in a chord (as Fractions and floats),
+        and the note sequence of the part (as given by dataio.note_sequence)
+
+    Raises
+    ------
+    ValueError
+        If the file has features not handled by the reader (e.g. several staves, composite
+        time signatures, unpitched notes), and music21 has to be used to read it
+    xml.etree.ElementTree.ParseError
+        If the file is not a valid xml file
+
+    Notes
+    -----
+    The offsets of the notes follow the note types (and dots and time modifications) as in
+    music21, <backup> and <forward> elements move the current position, the notes of a chord
+    are not included (but its duration is), and grace notes are included with no duration.
+    Incomplete measures at the beginning of the piece (or after an incomplete measure) are
+    padded as anacrusis if they have their own time signature (music21 takes the others as
+    complete measures).
+    """
+
+    reader = _PartReader()
+
+    # title of the score (from the work or the movement)
+    work_title = None
+    movement_title = None
+
+    # whether the first part has been read
+    part_read = False
+
+    for _, element in ET.iterparse(filename):
+        tag = element.tag
+
+        if tag == 'measure':
+            # measures are in a part in partwise files (and the other way around in timewise)
+            reader.read_measure(element)
+            # release the elements of the measure
+            element.clear()
+        elif tag == 'part':
+            if element.find('measure') is None and len(element):
+                raise ValueError("Timewise MusicXML files are not supported.")
+            part_read = True
+            # only the first part is read
+            break
+        elif tag == 'work-title' and work_title is None and element.text:
+            work_title = element.text
+        elif tag == 'movement-title' and movement_title is None and element.text:
+            movement_title = element.text
+        elif tag in ('defaults', 'credit', 'identification'):
+            # release the elements of the header
+            element.clear()
+        elif tag == 'score-timewise':
+            raise ValueError("Timewise MusicXML files are not supported.")
+
+    if not part_read:
+        raise ValueError("The file has no parts.")
+
+    # the name of the file is the movement title if no title is given (as in music21)
+    if movement_title is None:
+        movement_title = os.path.basename(filename)
+
+    score = reader.result()
+    score['title'] = work_title if work_title is not None else movement_title
+
+    return score
+
+
+def read_meters(filename):
+    """Read the time signatures of the first part of a MusicXML file from its <time> elements,
+    with no need to read its notes (e.g. to leave out the files not in a given meter).
+
+    Parameters
+    ----------
+    filename : str
+        path of the MusicXML (partwise, uncompressed) file
+
+    Returns
+    -------
+    meters : list
+        time signatures (sorted list of str) of the first part
+
+    Raises
+    ------
+    ValueError
+        If the file has time signatures not handled by the reader (as in read_score)
+    xml.etree.ElementTree.ParseError
+        If the file is not a valid xml file
+    """
+
+    meters = set()
+
+    for _, element in ET.iterparse(filename):
+        tag = element.tag
+
+        if tag == 'attributes':
+            times = element.findall('time')
+            # several time signatures at once (e.g. one per staff)
+            if len(times) > 1:
+                raise ValueError("Several time signatures at once are not supported.")
+            for time in times:
+                beats = time.findall('beats')
+                beat_types = time.findall('beat-type')
+                if (time.find('senza-misura') is not None or
+                        time.find('interchangeable') is not None or
+                        len(beats) != 1 or len(beat_types) != 1):
+                    raise ValueError("Composite time signatures are not supported.")
+                try:
+                    meters.add('%d/%d' % (int(beats[0].text), int(beat_types[0].text)))
+                except (TypeError, ValueError):
+                    raise ValueError("Time signature not supported.")
+        elif tag == 'measure':
+            # release the elements of the measure
+            element.clear()
+        elif tag == 'part':
+            if element.find('measure') is None and len(element):
+                raise ValueError("Timewise MusicXML files are not supported.")
+            # only the first part is read
+            break
+        elif tag == 'score-timewise':
+            raise ValueError("Timewise MusicXML files are not supported.")
+
+    return sorted(meters)
+
+
+class _PartReader:
+    """Class to read the measures of a part, one by one, keeping the state needed to place
+    them (divisions, last time signature and offset of the last measure).
+    """
+
+    def __init__(self):
+
+        # divisions per quarter note
+        self.divisions = None
+        # last time signature (beats, beat type)
+        self.time_signature = None
+        # time signatures found in the part
+        self.time_signatures = set()
+        # offset of the next measure, and whether the last measure was incomplete
+        self.measure_offset = Fraction(0)
+        self.last_measure_short = False
+        # ticks per quarter note (the offsets within a measure are whole numbers of ticks)
+        self.ticks = 1
+        self._tick_values = {}
+
+        # measures
+        self.measure_offsets = []
+        self.measure_durations = []
+        # notes
+        self.note_measure = []
+        self.note_offset = []
+        self.note_duration = []
+        self.note_pitch = []
+        self.note_sequence = []
+
+
+    def read_measure(self, measure):
+        """Read a measure, adding its notes and its offset and duration to the part.
+
+        Parameters
+        ----------
+        measure : xml.etree.ElementTree.Element
+            <measure> element
+        """
+
+        # divisions before the measure (to read it again if the ticks change)
+        divisions = self.divisions
+
+        while True:
+            try:
+                return self._read_measure(measure)
+            except _Rescale as rescale:
+                # finer ticks, so that all the durations are whole numbers of ticks
+                self.ticks = self.ticks * rescale.denominator // math.gcd(self.ticks,
+                                                                          rescale.denominator)
+                self._tick_values = {}
+                self.divisions = divisions
+
+
+    def _read_measure(self, measure):
+        """Read a measure (as read_measure), with offsets and durations in ticks."""
+
+        to_ticks = self._to_ticks
+        elements = list(measure)
+
+        # current position, highest end time of the notes, rests and chords,
+        # and highest position of the elements without duration (in ticks)
+        position = 0
+        highest = 0
+        highest_placed = 0
+        # whether the measure has notes, rests, chords or chord symbols
+        has_notes = False
+        # number of single notes, and start, element and duration of the rests
+        num_notes = 0
+        rests = []
+        # whether a rest is marked as a measure rest
+        measure_rest = False
+        # notes of a chord still to complete
+        chord_notes = []
+        # voices of the measure
+        voices = set()
+        # time signature at the beginning of the measure
+        measure_time_signature = None
+        # whether the position has moved backwards (so notes are not in order)
+        backward = False
+
+        # notes of the measure, as (offset, is not grace, voice, index, duration, pitch, sequence)
+        notes = []
+
+        for ind, element in enumerate(elements):
+            tag = element.tag
+
+            if tag == 'note':
+                has_notes = True
+                voice = element.findtext('voice')
+                voices.add(voice)
+
+                # the first note of a chord is known by the next element
+                next_chord = (ind + 1 < len(elements) and elements[ind + 1].tag == 'note' and
+                              elements[ind + 1].find('chord') is not None)
+                is_rest = element.find('rest') is not None
+
+                if element.find('chord') is not None or next_chord:
+                    if is_rest:
+                        raise ValueError("Rests in chords are not supported.")
+                    chord_notes.append(element)
+                else:
+                    duration = self._duration(element)
+                    duration_ticks = to_ticks(duration)
+                    if is_rest:
+                        rests.append((position, ind, element, duration_ticks))
+                        measure_rest = (measure_rest or
+                                        element.find('rest').get('measure') == 'yes')
+                    else:
+                        num_notes += 1
+                        pitch, sequence = self._pitch(element, duration)
+                        notes.append((position, element.find('grace') is None, voice, ind,
+                                      duration, pitch, sequence))
+                    position += duration_ticks
+                    if position > highest:
+                        highest = position
+
+                # the chord is complete (its duration is the one of its first note)
+                if chord_notes and not next_chord:
+                    position += to_ticks(self._duration(chord_notes[0]))
+                    if position > highest:
+                        highest = position
+                    chord_notes = []
+
+            elif tag == 'backup':
+                duration = element.findtext('duration')
+                if duration is not None:
+                    position -= to_ticks(self._divisions_duration(duration))
+                    backward = True
+                    if position < 0:
+                        raise ValueError("Negative offset in a measure.")
+
+            elif tag == 'forward':
+                position += to_ticks(self._divisions_duration(element.findtext('duration')))
+
+            elif tag in ('direction', 'harmony'):
+                has_notes = has_notes or tag == 'harmony'
+                offset = element.findtext('offset')
+                placed = position + (to_ticks(self._divisions_duration(offset)) if offset else 0)
+                if placed > highest_placed or placed < 0:
+                    highest_placed = max(highest_placed, placed)
+                    if placed < 0:
+                        raise ValueError("Negative offset in a measure.")
+
+            elif tag == 'attributes':
+                measure_time_signature = self._attributes(element, position,
+                                                          measure_time_signature)
+                if any(element.find(name) is not None for name in _ATTRIBUTE_ELEMENTS):
+                    highest_placed = max(highest_placed, position)
+
+            elif tag == 'barline':
+                if element.get('location') == 'middle':
+                    raise ValueError("Barlines in the middle of a measure are not supported.")
+
+        # elements without duration placed after the notes would extend the measure
+        if highest_placed > highest:
+            raise ValueError("Elements placed beyond the notes of a measure.")
+
+        # time signature of the measure (the last one if not given)
+        own_time_signature = measure_time_signature is not None
+        if measure_time_signature is None:
+            measure_time_signature = self.time_signature
+        if measure_time_signature is None:
+            raise ValueError("The first measure has no time signature.")
+        bar_duration = to_ticks(Fraction(4 * measure_time_signature[0],
+                                         measure_time_signature[1]))
+
+        # a single rest (with no notes) fills the whole measure
+        if (len(rests) == 1 and num_notes == 0) or measure_rest:
+            if len(voices) > 1:
+                raise ValueError("Measure rests in several voices are not supported.")
+            rest_position, _, rest, rest_duration = min(rests, key=lambda rest: rest[:2])
+            if rest_duration != bar_duration and _is_measure_rest(rest, rest_duration,
+                                                                  self.ticks):
+                # the end of the rest is the end of the measure
+                ends = [offset + to_ticks(duration) for offset, _, _, _, duration, _, _ in notes]
+                highest = max([rest_position + bar_duration] + ends)
+
+        # the measure is read, update the state of the part
+        self.time_signature = measure_time_signature
+
+        # padding of an incomplete measure, and offset to the next measure
+        padding = 0
+        measure_duration = highest
+        if highest >= bar_duration:
+            shift = highest
+        elif highest == 0 and not has_notes:
+            # an empty measure is filled with a rest
+            shift = bar_duration
+            measure_duration = bar_duration
+        else:
+            shift = highest
+            # music21 compares a measure without its own time signature against the
+            # best fitting one (i.e. the measure is complete), so only pads the others
+            if not own_time_signature and highest == 0:
+                raise ValueError("Measures with only grace notes are not supported.")
+            if self.measure_offset == 0:
+                # pickup measure
+                if own_time_signature:
+                    padding = bar_duration - highest
+            elif self.last_measure_short:
+                # pickup after an incomplete measure (e.g. after a repeat)
+                if own_time_signature:
+                    padding = bar_duration - highest
+                    self.last_measure_short = False
+            else:
+                self.last_measure_short = True
+
+        # measure index and its boundaries
+        ind_measure = len(self.measure_offsets)
+        self.measure_offsets.append(self.measure_offset)
+        self.measure_durations.append(Fraction(measure_duration, self.ticks))
+        self.measure_offset += Fraction(shift, self.ticks)
+
+        # notes in the order of the offsets (grace notes first)
+        if backward:
+            voice_order = {}
+            for note in notes:
+                voice_order.setdefault(note[2], len(voice_order))
+            notes.sort(key=lambda note: (note[0], note[1], voice_order[note[2]], note[3]))
+
+        for offset, _, _, _, duration, pitch, sequence in notes:
+            self.note_measure.append(ind_measure)
+            self.note_offset.append(Fraction(offset + padding, self.ticks))
+            self.note_duration.append(duration)
+            self.note_pitch.append(pitch)
+            self.note_sequence.append(sequence)
+
+
+    def _to_ticks(self, value):
+        """Number of ticks of a duration (raises _Rescale if it is not a whole number)."""
+
+        try:
+            return self._tick_values[value]
+        except KeyError:
+            pass
+
+        if self.ticks % value.denominator:
+            raise _Rescale(value.denominator)
+
+        ticks = value.numerator * (self.ticks // value.denominator)
+        self._tick_values[value] = ticks
+
+        return ticks
+
+
+    def result(self):
+        """Dictionary with the time signatures, measures and notes read."""
+
+        return {"time_signatures": sorted(self.time_signatures),
+                "measure_offset": self.measure_offsets,
+                "measure_duration": self.measure_durations,
+                "note_measure": self.note_measure,
+                "note_offset": self.note_offset,
+                "note_duration": self.note_duration,
+                "note_pitch": self.note_pitch,
+                "note_sequence": tuple(self.note_sequence)}
+
+
+    def _attributes(self, attributes, position, measure_time_signature):
+        """Read the divisions and time signature of an <attributes> element."""
+
+        divisions = attributes.findtext('divisions')
+        if divisions is not None:
+            self.divisions = Fraction(divisions.strip())
+            if self.divisions <= 0:
+                raise ValueError("Divisions must be positive.")
+
+        staves = attributes.findtext('staves')
+        if staves is not None and int(staves) > 1:
+            raise ValueError("Parts with several staves are not supported.")
+
+        for time in attributes.findall('time'):
+            beats = time.findall('beats')
+            beat_types = time.findall('beat-type')
+            if (time.find('senza-misura') is not None or time.find('interchangeable') is not None
+                    or len(beats) != 1 or len(beat_types) != 1):
+                raise ValueError("Composite time signatures are not supported.")
+            if position != 0:
+                raise ValueError("Time signatures in the middle of a measure are not supported.")
+            try:
+                time_signature = (int(beats[0].text), int(beat_types[0].text))
+            except (TypeError, ValueError):
+                raise ValueError("Time signature not supported.")
+            self.time_signatures.add('%d/%d' % time_signature)
+            measure_time_signature = time_signature
+
+        return measure_time_signature
+
+
+    def _divisions_duration(self, text):
+        """Duration in quarter notes of a number of divisions."""
+
+        if self.divisions is None:
+            raise ValueError("Duration given before the divisions.")
+
+        return _divisions_duration(text, self.divisions)
+
+
+    def _duration(self, note):
+        """Duration in quarter notes of a note (as music21 computes it)."""
+
+        # grace notes have no duration
+        if note.find('grace') is not None:
+            return Fraction(0)
+
+        note_type = note.findtext('type')
+        if note_type is None or not note_type.strip():
+            # duration from the number of divisions if the type is not given
+            return self._divisions_duration(note.findtext('duration'))
+
+        # duration from the type, dots and time modification
+        time_modification = note.find('time-modification')
+        if time_modification is None:
+            return _type_duration(note_type, len(note.findall('dot')))
+
+        return _type_duration(note_type, len(note.findall('dot')),
+                              time_modification.findtext('normal-notes'),
+                              time_modification.findtext('actual-notes'))
+
+
+    def _pitch(self, note, duration):
+        """Pitch space value of a note, and its description in the note sequence."""
+
+        pitch = note.find('pitch')
+        if pitch is None:
+            raise ValueError("Unpitched notes are not supported.")
+
+        step = pitch.findtext('step')
+        octave = pitch.findtext('octave')
+        if step is None or octave is None or step.strip() not in _STEP_SEMITONES:
+            raise ValueError("Pitch not supported.")
+        step = step.strip()
+        octave = int(octave)
+
+        # alteration and accidental
+        alter = pitch.findtext('alter')
+        alter = float(alter) if alter is not None and alter.strip() else None
+        accidental = note.findtext('accidental')
+        accidental = accidental.strip().lower() if accidental is not None else ''
+        if accidental:
+            try:
+                accidental_name, accidental_alter = _ACCIDENTALS[accidental]
+            except KeyError:
+                raise ValueError("Accidental not supported.")
+            if alter is None:
+                alter = accidental_alter
+        elif alter is not None:
+            try:
+                accidental_name = _ALTER_NAMES[alter]
+            except KeyError:
+                raise ValueError("Alteration not supported.")
+        else:
+            accidental_name = None
+
+        pitch_space = (octave + 1) * 12 + _STEP_SEMITONES[step] + (alter or 0.0)
+
+        return float(pitch_space), (duration, step, accidental_name, octave, 0.0)
+
+
+@functools.lru_cache(maxsize=256)
+def _type_duration(note_type, dots, normal_notes='1', actual_notes='1'):
+    """Duration in quarter notes of a note type, with dots and time modification."""
+
+    try:
+        duration = _TYPE_QUARTER_LENGTH[note_type.strip()]
+    except KeyError:
+        raise ValueError("Note type not supported.")
+    duration *= 2 - Fraction(1, 2 ** dots)
+
+    if normal_notes is None or actual_notes is None:
+        raise ValueError("Time modification not supported.")
+
+    return duration * Fraction(int(normal_notes), int(actual_notes))
+
+
+@functools.lru_cache(maxsize=256)
+def _divisions_duration(text, divisions):
+    """Duration in quarter notes of a number of divisions."""
+
+    try:
+        return Fraction(text.strip()) / divisions
+    except (AttributeError, ValueError):
+        raise ValueError("Duration not valid.")
+
+
+class _Rescale(Exception):
+    """Exception raised when a duration is not a whole number of ticks."""
+
+    def __init__(self, denominator):
+        super().__init__(denominator)
+        self.denominator = denominator
+
+
+def _is_measure_rest(rest, duration, ticks):
+    """Check if a rest is taken as a measure rest (a whole or breve with no dots)."""
+
+    if rest.find('time-modification') is not None or rest.find('dot') is not None:
+        return False
+
+    rest_type = rest.findtext('type')
+    if rest_type is not None and rest_type.strip():
+        return rest_type.strip() in ('whole', 'breve')
+
+    # type given by the duration
+    return duration in (4 * ticks, 8 * ticks)
@@ -12,16 +12,21 @@ Miscellaneous utility functions
 
     log2
     metric_levels
+    metric_grid
+    parse_signature
+    MetricGrid
     find_nearest_values
     compute_description_length
     optimal_value
 """
 
 
+import functools
 import warnings
 import numpy as np
 
-__all__ = ['log2', 'metric_levels', 'optimal_value']
+__all__ = ['log2', 'metric_levels', 'metric_grid', 'parse_signature', 'MetricGrid',
+           'optimal_value']
 
 
 def log2(value):
@@ -58,7 +63,8 @@ def metric_levels(signature, beat_subdivisions):
     Parameters
     ----------
     signature : str
-        string denoting the time signature to consider.
+        string denoting the time signature to consider (e.g. 4/4, 6/8, or 3+2/4
+        to give the grouping of the beats).
     beat_subdivisions : int
         number of (equal) subdivisions of each beat.
 
@@ -68,32 +74,237 @@ def metric_levels(signature, beat_subdivisions):
         list of the number of metric levels in which each subdivision position is present
 
     """
-    # time signature
-    if signature == '4/4':
-        # number of subdivision per beat
-        if beat_subdivisions == 2:
-            levels = [4, 1, 2, 1, 3, 1, 2, 1]
 
-        elif beat_subdivisions == 4:
-            levels = [5, 1, 2, 1, 3, 1, 2, 1, 4, 1, 2, 1, 3, 1, 2, 1]
+    return list(metric_grid(signature, beat_subdivisions).levels)
 
-        else:
-            warnings.warn("Number of subdivision per beat not implemented yet. ", RuntimeWarning)
-    elif signature == '2/4':
-        if beat_subdivisions == 2:
-            levels = [3, 1, 2, 1]
 
-        elif beat_subdivisions == 4:
-            levels = [4, 1, 2, 1, 3, 1, 2, 1]
+@functools.lru_cache(maxsize=32)
+def metric_grid(signature, beat_subdivisions):
+    """ Metric grid of a time signature and a number of subdivisions per beat.
+        The grids are built once and kept in a (least recently used) cache.
 
-        else:
-            warnings.warn("Number of subdivision per beat not implemented yet. ", RuntimeWarning)
+    Parameters
+    ----------
+    signature : str
+        string denoting the time signature to consider (e.g. 4/4, 6/8, or 3+2/4
+        to give the grouping of the beats).
+    beat_subdivisions : int
+        number of (equal) subdivisions of each beat.
+
+    Returns
+    -------
+    grid : MetricGrid
+        metric levels and neighbours of each subdivision position
+
+    """
+
+    return MetricGrid(signature, beat_subdivisions)
+
+
+def parse_signature(signature):
+    """ Parse a time signature, whose numerator may be given as a sum
+        of groups of beats (e.g. 2+2+3/8).
+
+    Parameters
+    ----------
+    signature : str
+        string denoting the time signature.
+
+    Returns
+    -------
+    numerator : int
+        number of beats per measure
+    denominator : int
+        note value of the beats
+    grouping : tuple or None
+        number of beats of each group, if given
+
+    """
+
+    try:
+        numerator, denominator = signature.split('/')
+        groups = tuple(int(group) for group in numerator.split('+'))
+        denominator = int(denominator)
+    except (AttributeError, ValueError):
+        raise ValueError("Time signature not valid: " + repr(signature))
+
+    if denominator <= 0 or min(groups) <= 0:
+        raise ValueError("Time signature not valid: " + repr(signature))
+
+    # the grouping is only given by an additive numerator
+    grouping = groups if len(groups) > 1 else None
+
+    return sum(groups), denominator, grouping
+
+
+class MetricGrid:
+    """Class to represent the metric grid of a time signature, i.e. the metric levels
+    of each subdivision position and the neighbours (anchors) of each position.
+
+    The measure is divided into groups of beats (two or three beats for compound meters,
+    one beat otherwise, or as given by an additive signature such as 3+2/4), the groups
+    and the subdivisions of the beats are divided by their prime factors, and the level of a
+    position is the number of these divisions in which it is present.
+
+    Attributes
+    ----------
+    signature : str
+        Time signature
+    beat_subdivisions : int
+        Number of (equal) subdivisions of each beat
+    numerator : int
+        Number of beats per measure
+    denominator : int
+        Note value of the beats
+    grouping : tuple
+        Number of beats of each group
+    beats_measure : int
+        Number of beat subdivisions per measure
+    levels : tuple
+        Maximum metric level at each position
+    num_levels : int
+        Number of metric levels (i.e. the level of the downbeat)
+    level_index : np.ndarray
+        Index of the metric level of each position (i.e. levels - 1)
+    back : np.ndarray
+        Position of the previous neighbour of each position (-1 for the downbeat)
+    forth : np.ndarray
+        Position of the next neighbour of each position, beats_measure being the downbeat
+        of the next measure (-1 for the downbeat)
+
+    """
+
+    def __init__(self, signature, beat_subdivisions):
+
+        # time signature
+        self.signature = signature
+        self.numerator, self.denominator, grouping = parse_signature(signature)
+
+        # number of subdivisions of each beat
+        if int(beat_subdivisions) != beat_subdivisions or beat_subdivisions < 1:
+            raise ValueError("Number of subdivision per beat not valid: " +
+                             repr(beat_subdivisions))
+        self.beat_subdivisions = int(beat_subdivisions)
+
+        # grouping of the beats
+        if grouping is None:
+            grouping = _default_grouping(self.numerator)
+        if grouping is None:
+            raise ValueError("Time signature " + signature + " needs a grouping of the beats "
+                             "(e.g. 3+2/4 or 2+2+3/8).")
+        self.grouping = grouping
+
+        # beats subdivisions per measure
+        self.beats_measure = self.numerator * self.beat_subdivisions
+
+        # metric levels
+        self.levels = _grid_levels(self.grouping, self.beat_subdivisions)
+        self.num_levels = self.levels[0]
+        self.level_index = _read_only(np.array(self.levels, dtype=np.intp) - 1)
+
+        # neighbours of each position
+        back, forth = _grid_neighbours(self.levels)
+        self.back = _read_only(back)
+        self.forth = _read_only(forth)
 
-    else:
-        warnings.warn("Time signature not implemented yet. ", RuntimeWarning)
 
+    def __repr__(self):
+        return "MetricGrid(signature=%r, beat_subdivisions=%d)" % (self.signature,
+                                                                   self.beat_subdivisions)
+
+
+def _default_grouping(numerator):
+    """Groups of three beats for compound meters, and one beat for simple meters
+    (None for irregular meters such as 5/4 or 7/8)
+    """
+
+    if numerator % 3 == 0 and numerator > 3:
+        # compound meter
+        return (numerator // 3) * (3,)
+    if set(_prime_factors(numerator)) <= {2, 3}:
+        # simple meter
+        return numerator * (1,)
+
+    return None
+
+
+def _prime_factors(value):
+    """Prime factors of an integer, in increasing order
+    """
+
+    factors = []
+    factor = 2
+    while value > 1:
+        while value % factor == 0:
+            factors.append(factor)
+            value //= factor
+        factor += 1
+
+    return factors
+
+
+def _grid_levels(grouping, beat_subdivisions):
+    """Metric level of each position of a measure divided into the given groups of beats
+    """
+
+    beats_measure = sum(grouping) * beat_subdivisions
+
+    # positions of each division of the measure, from top to bottom
+    divisions = [[0]]
+    # equal groups are divided by the prime factors of their number
+    if len(set(grouping)) == 1:
+        span = len(grouping)
+        for factor in _prime_factors(len(grouping)):
+            span //= factor
+            divisions.append(range(0, beats_measure, span * grouping[0] * beat_subdivisions))
+    # groups of beats
+    divisions.append(np.cumsum((0,) + grouping[:-1]) * beat_subdivisions)
+    # beats
+    divisions.append(range(0, beats_measure, beat_subdivisions))
+    # subdivisions of the beats
+    span = beat_subdivisions
+    for factor in _prime_factors(beat_subdivisions):
+        span //= factor
+        divisions.append(range(0, beats_measure, span))
+
+    # level of each position is the number of (different) divisions it is present in
+    levels = np.zeros((beats_measure,), dtype=np.intp)
+    previous = None
+    for division in divisions:
+        positions = set(int(pos) for pos in division)
+        if positions != previous:
+            levels[sorted(positions)] += 1
+        previous = positions
+
+    return tuple(int(level) for level in levels)
+
+
+def _grid_neighbours(levels):
+    """Nearest previous and next positions of a higher level for each position
+    """
+
+    beats_measure = len(levels)
+
+    back = np.full((beats_measure,), -1, dtype=np.intp)
+    forth = np.full((beats_measure,), -1, dtype=np.intp)
+    for pos in range(1, beats_measure):
+        # nearest previous position of a higher level (the downbeat at most)
+        back[pos] = max(ind for ind in range(pos) if levels[ind] > levels[pos])
+        # nearest next position of a higher level (the next downbeat at most)
+        forth[pos] = min([ind for ind in range(pos + 1, beats_measure)
+                          if levels[ind] > levels[pos]] + [beats_measure])
+
+    return back, forth
+
+
+def _read_only(array):
+    """Array that can not be modified (shared by the cached grids)
+    """
+
+    array.setflags(write=False)
+
+    return array
 
-    return levels
 
 def find_nearest_values(array, value):
     """Find indexes of the two nearest values of an array to a given value
@@ -148,42 +359,72 @@ def compute_description_length(val, n, n1):
 def optimal_value(d, val, n, n1):
     """Compute the optimal discrete value of the parameters given the precision
 
+    The discrete values are those of the grid np.linspace(0, 1, num=d+1). The two grid values
+    around each input value are found in closed form (from floor(val*d)), and the one giving a
+    smaller description length is chosen. The inputs can be arrays (broadcast together), so
+    that several parameters (and precision values) are quantized at once.
+
     Parameters
     ----------
-    d : float
+    d : int or np.ndarray
         precision value
-    val : float
+    val : float or np.ndarray
         input value
-    n : int
+    n : int or np.ndarray
         total number of elements
-    n1 : int
+    n1 : int or np.ndarray
         total number of ones
 
     Returns
     -------
-    d_val : float
+    d_val : float or np.ndarray
         returns discrete optimal value
 
     """
 
-    if val in (0, 1):
-        d_val = val
-    else:
-        # grid of parameter values
-        # grid = np.arange(0, 1, 1/d)
-        grid = np.linspace(0, 1, num=d+1)
-        # find the indexes of the nearest values in the grid
-        idx1, idx2 = find_nearest_values(grid, val)
-        # nearest values in the grid
-        val1 = grid[idx1]
-        val2 = grid[idx2]
-        # description length values
-        dl_val1 = compute_description_length(val1, n, n1)
-        dl_val2 = compute_description_length(val2, n, n1)
-        # check which parameter values gives a smaller description length
-        if dl_val1 < dl_val2:
-            d_val = val1
-        else:
-            d_val = val2
+    d, val, n, n1 = np.broadcast_arrays(np.asarray(d), np.asarray(val, dtype=np.float64),
+                                        np.asarray(n, dtype=np.float64),
+                                        np.asarray(n1, dtype=np.float64))
+
+    # candidate indexes of the nearest value in the grid, around floor(val*d)
+    ind = np.floor(val * d)[..., np.newaxis] + np.arange(-1, 3)
+    ind = np.clip(ind, 0, d[..., np.newaxis])
+    # index of nearest value in the grid (the first one if equally near, as argmin)
+    dist = np.abs(_grid_value(ind, d[..., np.newaxis]) - val[..., np.newaxis])
+    idx1 = np.take_along_axis(ind, np.argmin(dist, axis=-1)[..., np.newaxis], axis=-1)[..., 0]
+    val1 = _grid_value(idx1, d)
+    # check if value is bigger or smaller than nearest value
+    idx2 = np.clip(np.where(val1 >= val, idx1 - 1, idx1 + 1), 0, d)
+    val2 = _grid_value(idx2, d)
+
+    # description length values
+    dl_val1 = _description_length(val1, n, n1)
+    dl_val2 = _description_length(val2, n, n1)
+
+    # check which parameter values gives a smaller description length
+    d_val = np.where(dl_val1 < dl_val2, val1, val2)
+    # 0 and 1 are kept as they are
+    d_val = np.where((val == 0) | (val == 1), val, d_val)
+
+    # a single value is returned as a scalar
+    if d_val.ndim == 0:
+        d_val = d_val[()]
 
     return d_val
+
+
+def _grid_value(ind, d):
+    """Values of the grid np.linspace(0, 1, num=d+1) at the given indexes (computed as linspace)
+    """
+
+    return np.where(ind == d, 1.0, ind * (1.0 / d))
+
+
+def _description_length(val, n, n1):
+    """Description length for the given parameter values (as compute_description_length)
+    """
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dl_val = -(n1 * np.log2(val) + (n-n1) * np.log2(1-val))
+
+    return np.where((val == 0) | (val == 1), np.inf, dl_val)